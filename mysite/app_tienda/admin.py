@@ -1,17 +1,72 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import *
+from . import estados, resenas
 
 class LibroAdmin(admin.ModelAdmin):
     list_display = ('titulo', 'autor', 'categoria', 'precio', 'activo')
 
+class CampaniaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'tipo_descuento', 'valor', 'fecha_inicio', 'fecha_fin', 'estado', 'activo')
+    list_filter = ('estado', 'activo')
+    filter_horizontal = ('categorias', 'libros')
+    readonly_fields = ('estado', 'fecha_aplicada', 'fecha_revertida')
+
+def _accion_transicion(destino):
+    def accion(modeladmin, request, queryset):
+        cambiados = estados.transicionar_lote(queryset, destino, usuario=request.user)
+        omitidos = queryset.count() - cambiados
+        modeladmin.message_user(
+            request,
+            f"{cambiados} pedido(s) pasaron a {estados.ESTADOS[destino]}; "
+            f"{omitidos} se omitieron por no admitir la transición.",
+            messages.SUCCESS if not omitidos else messages.WARNING,
+        )
+    accion.__name__ = f'marcar_{destino}'
+    accion.short_description = f"Marcar como {estados.ESTADOS[destino].lower()}"
+    return accion
+
+class PedidoAdmin(admin.ModelAdmin):
+    list_display = ('numero_pedido', 'usuario', 'estado', 'total', 'pagado', 'fecha_creacion')
+    list_filter = ('estado', 'pagado')
+    search_fields = ('numero_pedido', 'usuario__email')
+    readonly_fields = ('estado', 'pagado', 'fecha_pago')
+    actions = [_accion_transicion(destino) for destino in ('procesando', 'completado', 'reembolsado', 'cancelado')]
+
+class ResenaAdmin(admin.ModelAdmin):
+    list_display = ('libro', 'usuario', 'calificacion', 'aprobada', 'fecha_creacion')
+    list_filter = ('aprobada', 'calificacion')
+    search_fields = ('libro__titulo', 'usuario__email')
+
+    actions = ['aprobar', 'rechazar']
+
+    @admin.action(description="Aprobar reseñas seleccionadas")
+    def aprobar(self, request, queryset):
+        self.message_user(request, f"{resenas.aprobar(queryset)} reseña(s) aprobadas.", messages.SUCCESS)
+
+    @admin.action(description="Rechazar (borrar) reseñas seleccionadas")
+    def rechazar(self, request, queryset):
+        self.message_user(request, f"{resenas.rechazar(queryset)} reseña(s) rechazadas.", messages.SUCCESS)
+
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'estado', 'prioridad', 'intentos', 'ejecutar_despues', 'trabajador', 'fecha_creacion')
+    list_filter = ('estado', 'prioridad', 'nombre')
+    readonly_fields = ('intentos', 'trabajador', 'bloqueada_hasta', 'ultimo_error', 'fecha_finalizacion')
+
 admin.site.register(Usuario)
 admin.site.register(Categoria)
 admin.site.register(Libro, LibroAdmin)
 admin.site.register(CarritoItem)
-admin.site.register(Pedido)
+admin.site.register(Pedido, PedidoAdmin)
 admin.site.register(DetallePedido)
 admin.site.register(EntregaDigital)
-admin.site.register(Resena)
+admin.site.register(Resena, ResenaAdmin)
 admin.site.register(Wishlist)
 admin.site.register(Cupon)
-admin.site.register(HistorialPedido)
\ No newline at end of file
+admin.site.register(HistorialPedido)
+admin.site.register(ResumenDiario)
+admin.site.register(VentaLibroDiaria)
+admin.site.register(PedidosEstadoDiario)
+admin.site.register(Campania, CampaniaAdmin)
+admin.site.register(Tarea, TareaAdmin)
+admin.site.register(PrecioObservado)
+admin.site.register(PuntoControl)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AppTiendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_tienda'
+
+    def ready(self):
+        from . import cache, db, resenas
+        from .middleware import admin_access_middleware
+        db.conectar_senales()
+        cache.conectar_senales()
+        resenas.conectar_senales()
+        admin_access_middleware.conectar_senales()
@@ -0,0 +1,132 @@
+"""
+Avisos de bajada de precio de los libros de la wishlist.
+
+El comando avisar_bajadas_precio compara el precio efectivo de cada libro con
+el de la ejecución anterior (PrecioObservado) y encola para cada usuario un
+único correo con todos los libros de su wishlist que han bajado. Los cambios
+de precio se detectan con sentencias por conjuntos y los avisos se generan por
+lotes de usuarios, con memoria acotada:
+
+1. preparar(): un UPDATE copia el precio efectivo actual a precio_nuevo y un
+   INSERT ... SELECT da de alta los libros nuevos (sin aviso la primera vez).
+2. avisar_lote(): toma los siguientes usuarios con alguna bajada en su
+   wishlist (JOIN Wishlist-Libro-PrecioObservado) y encola un correo por
+   usuario. El punto de control se guarda en la misma transacción que las
+   tareas, así que una ejecución interrumpida se reanuda sin repetir avisos.
+3. cerrar(): un UPDATE consolida precio_nuevo en precio.
+"""
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, DateTimeField, DecimalField, F, OuterRef, Subquery, Value, When
+from django.utils import timezone
+
+from .models import Libro, PrecioObservado, PuntoControl, Wishlist
+from .tareas import encolar_varias
+
+NOMBRE = 'avisar_bajadas_precio'
+
+
+def precio_efectivo(prefijo=''):
+    """Expresión equivalente a Libro.precio_actual()."""
+    return Case(
+        When(
+            **{f'{prefijo}en_oferta': True, f'{prefijo}precio_descuento__isnull': False},
+            then=F(f'{prefijo}precio_descuento'),
+        ),
+        default=F(f'{prefijo}precio'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def punto_control():
+    return PuntoControl.objects.get_or_create(nombre=NOMBRE)[0]
+
+
+def en_curso(punto):
+    return punto.datos.get('fase') == 'avisos'
+
+
+def preparar(punto):
+    """Toma la foto de precios de esta ejecución."""
+    ahora = timezone.now()
+    using = router.db_for_write(PrecioObservado)
+    conexion = connections[using]
+    with transaction.atomic(using=using):
+        PrecioObservado.objects.using(using).update(
+            precio_nuevo=Subquery(
+                Libro.objects.filter(pk=OuterRef('libro_id')).annotate(p=precio_efectivo()).values('p')[:1]
+            ),
+            fecha_actualizacion=ahora,
+        )
+        nuevos = (
+            Libro.objects.using(using)
+            .filter(precio_observado__isnull=True)
+            .order_by()
+            .annotate(p=precio_efectivo(), p_nuevo=precio_efectivo(), f=Value(ahora, output_field=DateTimeField()))
+            .values_list('pk', 'p', 'p_nuevo', 'f')
+        )
+        select, params = nuevos.query.get_compiler(using).as_sql()
+        tabla = conexion.ops.quote_name(PrecioObservado._meta.db_table)
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabla} (libro_id, precio, precio_nuevo, fecha_actualizacion) {select}', params,
+            )
+            altas = cursor.rowcount
+
+        punto.datos = {
+            'fase': 'avisos', 'inicio': ahora.isoformat(), 'ultimo_usuario': 0,
+            'usuarios': 0, 'libros': 0, 'altas': altas,
+        }
+        punto.save()
+
+
+def bajadas():
+    """Filas de wishlist cuyo libro ha bajado de precio desde la ejecución anterior."""
+    return Wishlist.objects.filter(
+        usuario__is_active=True,
+        libro__activo=True,
+        libro__precio_observado__precio_nuevo__lt=F('libro__precio_observado__precio'),
+    )
+
+
+def avisar_lote(punto, usuarios=500):
+    """Encola los avisos de los siguientes ``usuarios`` usuarios. Devuelve cuántos fueron."""
+    ids = list(
+        bajadas()
+        .filter(usuario_id__gt=punto.datos['ultimo_usuario'])
+        .order_by('usuario_id')
+        .values_list('usuario_id', flat=True)
+        .distinct()[:usuarios]
+    )
+    if not ids:
+        return 0
+
+    filas = (
+        bajadas()
+        .filter(usuario_id__gte=ids[0], usuario_id__lte=ids[-1])
+        .order_by('usuario_id', 'libro_id')
+        .values_list('usuario_id', 'libro_id', 'libro__precio_observado__precio', 'libro__precio_observado__precio_nuevo')
+    )
+    avisos = [
+        {'usuario_id': usuario_id, 'libros': [[libro_id, str(antes), str(ahora)] for _, libro_id, antes, ahora in grupo]}
+        for usuario_id, grupo in groupby(filas.iterator(chunk_size=2000), key=itemgetter(0))
+    ]
+    with transaction.atomic():
+        encolar_varias('enviar_aviso_precios', avisos)
+        punto.datos['ultimo_usuario'] = ids[-1]
+        punto.datos['usuarios'] += len(avisos)
+        punto.datos['libros'] += sum(len(aviso['libros']) for aviso in avisos)
+        punto.save()
+    return len(ids)
+
+
+def cerrar(punto):
+    """La foto de esta ejecución pasa a ser la referencia de la siguiente."""
+    with transaction.atomic():
+        PrecioObservado.objects.filter(precio_nuevo__isnull=False).update(precio=F('precio_nuevo'), precio_nuevo=None)
+        punto.datos['fase'] = 'completada'
+        punto.datos['fin'] = timezone.now().isoformat()
+        punto.save()
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+class EmailOUsuarioBackend(ModelBackend):
+    """
+    Autentica con correo o nombre de usuario indistintamente.
+
+    Resuelve el identificador en una sola consulta sobre LOWER(email) y
+    LOWER(username), que tienen índices únicos funcionales, y calcula como
+    máximo un hash por intento: si el usuario no existe se calcula un hash
+    de relleno para que el tiempo de respuesta no revele si la cuenta existe.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+
+        identificador = username.strip().lower()
+        candidatos = list(
+            UserModel._default_manager
+            .alias(email_normalizado=Lower('email'), username_normalizado=Lower('username'))
+            .filter(Q(email_normalizado=identificador) | Q(username_normalizado=identificador))[:2]
+        )
+        # Si el identificador es el correo de una cuenta y el username de otra, gana el correo.
+        usuario = next((u for u in candidatos if u.email.lower() == identificador), None)
+        if usuario is None and candidatos:
+            usuario = candidatos[0]
+
+        if usuario is None:
+            UserModel().set_password(password)
+            return None
+        if usuario.check_password(password) and self.user_can_authenticate(usuario):
+            return usuario
+        return None
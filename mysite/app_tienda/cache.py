@@ -0,0 +1,167 @@
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+CLAVE_VERSION_CATALOGO = 'app_tienda:catalogo:version'
+CLAVE_MODIFICACION_CATALOGO = 'app_tienda:catalogo:modificado'
+CLAVE_VERSION_LIBRO = 'app_tienda:libro:{}:version'
+
+
+def _version_inicial():
+    # Tras vaciar la caché el contador no vuelve a un número ya usado: las
+    # claves y los ETag antiguos no pueden coincidir con los nuevos.
+    return time.time_ns() // 1000
+
+
+def version_catalogo():
+    """
+    Número de versión global del catálogo. Las cachés que dependen de precios,
+    ofertas o categorías incluyen este número en su clave, de modo que basta
+    con incrementarlo para invalidarlas todas a la vez.
+    """
+    version = cache.get(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        cache.add(CLAVE_VERSION_CATALOGO, _version_inicial(), timeout=None)
+        version = cache.get(CLAVE_VERSION_CATALOGO)
+    return version
+
+
+def modificacion_catalogo():
+    """Fecha del último cambio del catálogo (Last-Modified de las páginas públicas)."""
+    fecha = cache.get(CLAVE_MODIFICACION_CATALOGO)
+    if fecha is None:
+        # Sin registro no se sabe cuándo cambió: se toma como recién modificado.
+        cache.add(CLAVE_MODIFICACION_CATALOGO, timezone.now().replace(microsecond=0), timeout=None)
+        fecha = cache.get(CLAVE_MODIFICACION_CATALOGO)
+    return fecha
+
+
+def invalidar_catalogo():
+    cache.set(CLAVE_MODIFICACION_CATALOGO, timezone.now().replace(microsecond=0), timeout=None)
+    try:
+        return cache.incr(CLAVE_VERSION_CATALOGO)
+    except ValueError:
+        # La clave no existía (caché reiniciada): cualquier valor nuevo invalida.
+        return version_catalogo()
+
+
+def version_libro(libro_id):
+    """
+    (versión, fecha) de lo que cambia en la ficha de un libro sin tocar su
+    fila ni el resto del catálogo: reseñas y valoraciones. La versión son los
+    microsegundos del último cambio, así que también da su fecha.
+    """
+    clave = CLAVE_VERSION_LIBRO.format(libro_id)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, _version_inicial(), timeout=None)
+        version = cache.get(clave)
+    return version, datetime.fromtimestamp(version // 10**6, tz=dt_timezone.utc)
+
+
+def invalidar_libros(libro_ids):
+    version = _version_inicial()
+    cache.set_many({CLAVE_VERSION_LIBRO.format(libro_id): version for libro_id in libro_ids}, timeout=None)
+
+
+def _catalogo_modificado(sender, **kwargs):
+    transaction.on_commit(invalidar_catalogo)
+
+
+def conectar_senales():
+    for modelo in ('app_tienda.Libro', 'app_tienda.Categoria'):
+        post_save.connect(_catalogo_modificado, sender=modelo, dispatch_uid=f'catalogo:save:{modelo}')
+        post_delete.connect(_catalogo_modificado, sender=modelo, dispatch_uid=f'catalogo:delete:{modelo}')
+
+
+# ---------- Caché HTTP de las páginas públicas ----------
+
+def _es_anonima(request):
+    # Sin cookie de sesión la página es igual para todos. No se usa request.user,
+    # que obligaría a cargar la sesión solo para decidir.
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _condicional(validadores, request, args, kwargs):
+    """(etag, última modificación, respuesta 304/412 o None) de la petición."""
+    resultado = validadores(request, *args, **kwargs)
+    if resultado is None:
+        return None, None, None
+    claves, modificacion = resultado
+    texto = ':'.join(str(clave) for clave in (settings.CACHE_HTTP_REVISION, *claves))
+    etag = quote_etag(hashlib.md5(texto.encode()).hexdigest())
+    respuesta = get_conditional_response(
+        request, etag=etag, last_modified=modificacion and int(modificacion.timestamp()),
+    )
+    return etag, modificacion, respuesta
+
+
+def _cabeceras(request, etag, modificacion, response):
+    if response.status_code not in (200, 304):
+        return response
+    patch_vary_headers(response, ['Cookie'])
+    # Los validadores valen también para una respuesta privada: el navegador
+    # que la guardó puede revalidarla y recibir un 304.
+    if etag:
+        response.headers.setdefault('ETag', etag)
+    if modificacion:
+        response.headers.setdefault('Last-Modified', http_date(modificacion.timestamp()))
+    # Una respuesta que fija cookies nunca se comparte. La de CSRF la añade
+    # CsrfViewMiddleware después de la vista si la plantilla usó el token.
+    if not _es_anonima(request) or response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    patch_cache_control(
+        response, public=True, max_age=settings.CACHE_HTTP_MAX_AGE,
+        s_maxage=settings.CACHE_HTTP_S_MAXAGE, must_revalidate=True,
+    )
+    return response
+
+
+def cache_publico(validadores):
+    """
+    GET condicional para las páginas públicas de visitantes anónimos.
+
+    ``validadores(request, *args, **kwargs)`` devuelve (claves, última
+    modificación): las claves de las que depende la página (versión del
+    catálogo, fecha del libro...) forman el ETag y la fecha el Last-Modified.
+    Si devuelve None la vista se ejecuta sin validadores (p. ej. para su 404).
+    Si el cliente ya tiene esa versión se responde 304 sin ejecutar la vista.
+    Con cookie de sesión la página puede ser personal: se ejecuta siempre y
+    se marca como privada.
+    """
+    def decorador(vista):
+        def aplicable(request):
+            return request.method in ('GET', 'HEAD') and _es_anonima(request)
+
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura(request, *args, **kwargs):
+                etag = modificacion = respuesta = None
+                if aplicable(request):
+                    etag, modificacion, respuesta = await sync_to_async(_condicional)(validadores, request, args, kwargs)
+                if respuesta is None:
+                    respuesta = await vista(request, *args, **kwargs)
+                return _cabeceras(request, etag, modificacion, respuesta)
+        else:
+            @wraps(vista)
+            def envoltura(request, *args, **kwargs):
+                etag = modificacion = respuesta = None
+                if aplicable(request):
+                    etag, modificacion, respuesta = _condicional(validadores, request, args, kwargs)
+                if respuesta is None:
+                    respuesta = vista(request, *args, **kwargs)
+                return _cabeceras(request, etag, modificacion, respuesta)
+        return envoltura
+    return decorador
@@ -0,0 +1,115 @@
+"""
+Valoraciones desnormalizadas de Libro (num_resenas, calificacion_media y el
+histograma resenas_1..resenas_5), calculadas solo con reseñas aprobadas.
+
+Las señales post_save y post_delete de Resena (resenas.py) llaman a
+ajustar() con lo que la reseña contaba antes y después, también en los
+borrados en cascada y por queryset; el ajuste es un único UPDATE con
+expresiones F, sin volver a contar las reseñas del libro. Los UPDATE por lotes,
+que no envían señales, usan ajustar_lote(), y recalcular() (comando
+recalcular_calificaciones) corrige cualquier desviación en una sola pasada
+GROUP BY.
+"""
+
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+from .cache import invalidar_libros
+from .models import CAMPOS_CALIFICACION, Libro
+
+ESTRELLAS = range(1, 6)
+
+
+def _cambios(histograma):
+    """Asignaciones F para sumar ``histograma`` ({estrellas: delta}) a un libro."""
+    delta_total = sum(histograma.values())
+    delta_suma = sum(estrellas * delta for estrellas, delta in histograma.items())
+    total = F('num_resenas') + delta_total
+    # En un UPDATE todas las expresiones ven los valores anteriores de la fila.
+    suma = sum((F(f'resenas_{estrellas}') * estrellas for estrellas in ESTRELLAS), Value(delta_suma))
+    cambios = {f'resenas_{estrellas}': F(f'resenas_{estrellas}') + delta for estrellas, delta in histograma.items() if delta}
+    cambios['num_resenas'] = total
+    cambios['calificacion_media'] = Case(
+        When(num_resenas=-delta_total, then=Value(0.0)),
+        default=Cast(suma, FloatField()) / total,
+        output_field=FloatField(),
+    )
+    return cambios
+
+
+def ajustar(anterior, actual):
+    """
+    ``anterior`` y ``actual`` son (libro_id, calificación) o None, según la
+    reseña contara antes y después del cambio.
+    """
+    por_libro = defaultdict(Counter)
+    if anterior:
+        por_libro[anterior[0]][anterior[1]] -= 1
+    if actual:
+        por_libro[actual[0]][actual[1]] += 1
+    ajustar_lote(por_libro)
+
+
+def ajustar_lote(por_libro):
+    """Aplica {libro_id: {estrellas: delta}}; un UPDATE por libro afectado."""
+    for libro_id, histograma in por_libro.items():
+        if any(histograma.values()):
+            Libro.objects.filter(pk=libro_id).update(**_cambios(histograma))
+
+
+def histogramas(queryset, signo=1):
+    """{libro_id: {estrellas: ±reseñas}} de las reseñas del queryset, con un GROUP BY."""
+    por_libro = defaultdict(Counter)
+    filas = (
+        queryset.order_by()
+        .values_list('libro_id', 'calificacion').annotate(n=Count('pk'))
+    )
+    for libro_id, calificacion, cantidad in filas:
+        por_libro[libro_id][calificacion] += signo * cantidad
+    return por_libro
+
+
+def recalcular(lote=1000):
+    """
+    Recalcula las valoraciones de todos los libros con una pasada GROUP BY
+    (por tramos de clave primaria) y escribe solo las filas que no coinciden.
+    Devuelve cuántos libros se corrigieron.
+    """
+    aprobadas = Q(resenas__aprobada=True)
+    estadisticas = (
+        Libro.objects.order_by('pk')
+        .annotate(**{
+            f'r_{estrellas}': Count('resenas', filter=aprobadas & Q(resenas__calificacion=estrellas))
+            for estrellas in ESTRELLAS
+        })
+        .only('pk', *CAMPOS_CALIFICACION)
+    )
+    corregidos, ultimo = 0, 0
+    while True:
+        libros = list(estadisticas.filter(pk__gt=ultimo)[:lote])
+        if not libros:
+            return corregidos
+        ultimo = libros[-1].pk
+        pendientes = []
+        for libro in libros:
+            histograma = {estrellas: getattr(libro, f'r_{estrellas}') for estrellas in ESTRELLAS}
+            total = sum(histograma.values())
+            esperado = {f'resenas_{estrellas}': cantidad for estrellas, cantidad in histograma.items()}
+            esperado['num_resenas'] = total
+            esperado['calificacion_media'] = (
+                sum(estrellas * cantidad for estrellas, cantidad in histograma.items()) / total if total else 0.0
+            )
+            if any(
+                abs(getattr(libro, campo) - valor) > 1e-9 for campo, valor in esperado.items()
+            ):
+                for campo, valor in esperado.items():
+                    setattr(libro, campo, valor)
+                pendientes.append(libro)
+        if pendientes:
+            Libro.objects.bulk_update(pendientes, CAMPOS_CALIFICACION)
+            corregidos += len(pendientes)
+            transaction.on_commit(partial(invalidar_libros, [libro.pk for libro in pendientes]))
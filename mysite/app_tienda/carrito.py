@@ -0,0 +1,95 @@
+"""
+Operaciones en lote sobre wishlist y carrito.
+
+Mover N libros de la wishlist al carrito son tres sentencias sea cual sea N:
+se fijan los ids a mover, un INSERT ... SELECT ... ON CONFLICT suma 1 a la
+cantidad de los libros que ya estaban en el carrito e inserta el resto, y un
+único DELETE los quita de la wishlist. Todo en la misma transacción.
+"""
+
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, DateTimeField, DecimalField, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import CarritoItem, Wishlist
+
+IVA = Decimal('0.16')
+
+
+def _seleccion(usuario, ids=None):
+    qs = Wishlist.objects.filter(usuario=usuario)
+    if ids is not None:
+        qs = qs.filter(pk__in=ids)
+    return qs
+
+
+def mover_a_carrito(usuario, ids=None):
+    """
+    Mueve al carrito los elementos ``ids`` de la wishlist del usuario (todos
+    si es None). Los libros no disponibles se quedan en la wishlist.
+    Devuelve los ids de wishlist movidos.
+    """
+    using = router.db_for_write(CarritoItem)
+    conexion = connections[using]
+    with transaction.atomic(using=using):
+        movibles = list(
+            _seleccion(usuario, ids).using(using).filter(libro__activo=True).values_list('pk', flat=True)
+        )
+        if not movibles:
+            return []
+
+        ahora = timezone.now()
+        origen = (
+            Wishlist.objects.using(using)
+            .filter(pk__in=movibles)
+            .order_by()
+            .annotate(
+                c_cantidad=Value(1, output_field=IntegerField()),
+                c_agregado=Value(ahora, output_field=DateTimeField()),
+                c_actualizado=Value(ahora, output_field=DateTimeField()),
+            )
+            .values_list('usuario_id', 'libro_id', 'c_cantidad', 'c_agregado', 'c_actualizado')
+        )
+        select, params = origen.query.get_compiler(using).as_sql()
+        tabla = conexion.ops.quote_name(CarritoItem._meta.db_table)
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabla} (usuario_id, libro_id, cantidad, fecha_agregado, fecha_actualizado) '
+                f'{select} '
+                f'ON CONFLICT (usuario_id, libro_id) DO UPDATE SET '
+                f'cantidad = {tabla}.cantidad + 1, fecha_actualizado = excluded.fecha_actualizado',
+                params,
+            )
+        Wishlist.objects.using(using).filter(pk__in=movibles).delete()
+    return movibles
+
+
+def eliminar_de_wishlist(usuario, ids):
+    """Quita de la wishlist del usuario los elementos ``ids`` con un único DELETE."""
+    using = router.db_for_write(Wishlist)
+    return _seleccion(usuario, ids).using(using).delete()[0]
+
+
+def resumen(usuario):
+    """Totales del carrito y tamaño de la wishlist, en una consulta cada uno."""
+    precio = Case(
+        When(libro__en_oferta=True, libro__precio_descuento__isnull=False, then=F('libro__precio_descuento')),
+        default=F('libro__precio'),
+    )
+    totales = CarritoItem.objects.filter(usuario=usuario).aggregate(
+        items=Count('pk'),
+        unidades=Sum('cantidad'),
+        subtotal=Sum(precio * F('cantidad'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    subtotal = (totales['subtotal'] or Decimal('0')).quantize(Decimal('0.01'))
+    impuestos = (subtotal * IVA).quantize(Decimal('0.01'))
+    return {
+        'items': totales['items'],
+        'unidades': totales['unidades'] or 0,
+        'subtotal': subtotal,
+        'impuestos': impuestos,
+        'total': subtotal + impuestos,
+        'wishlist': Wishlist.objects.filter(usuario=usuario).count(),
+    }
@@ -0,0 +1,65 @@
+"""
+Cupones en el checkout.
+
+buscar() valida el código que escribe el cliente. Los códigos que no existen
+o no se pueden usar se recuerdan unos segundos en la caché (caché negativa),
+así que repetir o probar códigos al azar no llega a la base de datos.
+
+canjear() consume un uso con un único UPDATE condicional
+(``usos_realizados = usos_realizados + 1 WHERE usos_realizados < uso_maximo
+AND activo AND fecha_inicio <= ahora <= fecha_fin``): la base de datos
+serializa las peticiones concurrentes sobre la fila y nunca se canjean más
+usos de los permitidos. Se llama dentro de la transacción del pedido, de modo
+que si el pedido falla el uso se devuelve con el ROLLBACK.
+"""
+
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cupon
+
+FORMATO_CODIGO = re.compile(r'^[A-Za-z0-9_-]{1,50}$')
+
+
+class CuponInvalido(ValueError):
+    pass
+
+
+def _clave_invalido(codigo):
+    return f'app_tienda:cupon:invalido:{codigo}'
+
+
+def olvidar_invalido(codigo):
+    if FORMATO_CODIGO.match(codigo or ''):
+        cache.delete(_clave_invalido(codigo))
+
+
+def buscar(codigo):
+    """Cupón utilizable con ese código o CuponInvalido."""
+    codigo = (codigo or '').strip()
+    # Lo que ni siquiera tiene forma de código no llega a la caché ni a la base de datos
+    if not FORMATO_CODIGO.match(codigo) or cache.get(_clave_invalido(codigo)):
+        raise CuponInvalido("El cupón no existe o ya no es válido.")
+    cupon = Cupon.objects.filter(codigo=codigo).first()
+    if cupon is None or not cupon.es_valido():
+        cache.set(_clave_invalido(codigo), True, settings.CUPONES_CACHE_INVALIDO_SEGUNDOS)
+        raise CuponInvalido("El cupón no existe o ya no es válido.")
+    return cupon
+
+
+def canjear(cupon):
+    """Consume un uso del cupón o lanza CuponInvalido si ya no quedan (o ha caducado)."""
+    ahora = timezone.now()
+    canjeado = Cupon.objects.filter(
+        pk=cupon.pk,
+        activo=True,
+        usos_realizados__lt=F('uso_maximo'),
+        fecha_inicio__lte=ahora,
+        fecha_fin__gte=ahora,
+    ).update(usos_realizados=F('usos_realizados') + 1)
+    if not canjeado:
+        raise CuponInvalido("El cupón ya no es válido.")
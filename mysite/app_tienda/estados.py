@@ -0,0 +1,127 @@
+"""
+Máquina de estados de Pedido.
+
+Cada transición bloquea primero los pedidos que la admiten
+(``SELECT ... FOR UPDATE WHERE estado IN (orígenes permitidos)``) y después
+los cambia con un UPDATE por clave primaria que solo escribe las columnas que
+cambian, de modo que dos peticiones concurrentes no pueden llevar un pedido a
+un estado ilegal. En la misma transacción se registra el historial y se
+actualizan los resúmenes de KPIs (kpis.registrar_transicion).
+transicionar_lote() aplica la misma regla a un queryset completo e inserta el
+historial con un INSERT ... SELECT, sin recorrer las filas en Python.
+"""
+
+from django.db import connections, router, transaction
+from django.db.models import CharField, DateTimeField, IntegerField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import historial, kpis
+from .models import HistorialPedido, Pedido
+
+TRANSICIONES = {
+    'pendiente_pago': {'pagado', 'cancelado'},
+    'pagado': {'procesando', 'completado', 'reembolsado', 'cancelado'},
+    'procesando': {'completado', 'reembolsado', 'cancelado'},
+    'completado': {'reembolsado'},
+    'reembolsado': set(),
+    'cancelado': set(),
+}
+
+ESTADOS = dict(Pedido.ESTADO_PEDIDO)
+
+# Claves de pedido por UPDATE en transicionar_lote().
+LOTE_CLAVES = 5000
+
+
+class TransicionInvalida(ValueError):
+    pass
+
+
+def siguientes(estado):
+    """Estados a los que se puede pasar desde ``estado``, en el orden de ESTADO_PEDIDO."""
+    return [clave for clave in ESTADOS if clave in TRANSICIONES.get(estado, ())]
+
+
+def origenes(destino):
+    if destino not in ESTADOS:
+        raise TransicionInvalida(f"Estado desconocido: {destino}")
+    return sorted(origen for origen, destinos in TRANSICIONES.items() if destino in destinos)
+
+
+def _cambios(destino, ahora):
+    """Columnas que escribe la transición, además de estado y fecha_actualizacion."""
+    cambios = {'estado': destino, 'fecha_actualizacion': ahora}
+    if destino == 'pagado':
+        cambios['pagado'] = True
+        cambios['fecha_pago'] = Coalesce('fecha_pago', Value(ahora, output_field=DateTimeField()))
+    return cambios
+
+
+def transicionar(pedido, destino, usuario=None, descripcion=''):
+    """
+    Cambia el estado de un pedido si la transición es legal desde su estado
+    actual en la base de datos. Lanza TransicionInvalida en caso contrario.
+    """
+    ahora = timezone.now()
+    permitidos = origenes(destino)
+    with transaction.atomic():
+        origen = Pedido.objects.select_for_update().filter(pk=pedido.pk).values_list('estado', flat=True).first()
+        if origen not in permitidos:
+            raise TransicionInvalida(
+                f"El pedido {pedido.numero_pedido} no puede pasar de "
+                f"{ESTADOS.get(origen, origen)} a {ESTADOS[destino]}."
+            )
+        seleccion = Pedido.objects.filter(pk=pedido.pk)
+        kpis.registrar_transicion(seleccion, destino)
+        seleccion.update(**_cambios(destino, ahora))
+        historial.registrar(pedido, destino, descripcion or f'{origen} -> {destino}', usuario)
+
+    pedido.estado = destino
+    pedido.fecha_actualizacion = ahora
+    if destino == 'pagado':
+        pedido.pagado = True
+        pedido.fecha_pago = pedido.fecha_pago or ahora
+
+
+def transicionar_lote(queryset, destino, usuario=None, descripcion=''):
+    """
+    Aplica la transición a todos los pedidos del queryset que la admiten y
+    devuelve cuántos cambiaron; el resto se ignora. Lee y bloquea sus claves,
+    actualiza los KPIs con consultas agrupadas y hace el UPDATE y el
+    INSERT ... SELECT del historial sobre esas claves.
+    """
+    ahora = timezone.now()
+    permitidos = origenes(destino)
+    using = router.db_for_write(Pedido)
+    descripcion = descripcion or f'Cambio masivo a {destino}'
+    with transaction.atomic(using=using):
+        ids = list(
+            queryset.using(using).filter(estado__in=permitidos).order_by()
+            .select_for_update().values_list('pk', flat=True)
+        )
+        actualizados = 0
+        tabla = connections[using].ops.quote_name(HistorialPedido._meta.db_table)
+        # Por tramos, para no pasar del límite de parámetros por sentencia.
+        for inicio in range(0, len(ids), LOTE_CLAVES):
+            seleccion = Pedido.objects.using(using).filter(pk__in=ids[inicio:inicio + LOTE_CLAVES])
+            kpis.registrar_transicion(seleccion, destino)
+            actualizados += seleccion.update(**_cambios(destino, ahora))
+
+            eventos = (
+                seleccion.order_by()
+                .annotate(
+                    h_usuario=Value(getattr(usuario, 'pk', usuario), output_field=IntegerField()),
+                    h_accion=Value(destino, output_field=CharField()),
+                    h_descripcion=Value(descripcion, output_field=CharField()),
+                    h_fecha=Value(ahora, output_field=DateTimeField()),
+                )
+                .values_list('id', 'h_usuario', 'h_accion', 'h_descripcion', 'h_fecha')
+            )
+            select, params = eventos.query.get_compiler(using).as_sql()
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {tabla} (pedido_id, usuario_id, accion, descripcion, fecha_registro) {select}',
+                    params,
+                )
+    return actualizados
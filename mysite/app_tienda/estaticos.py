@@ -0,0 +1,141 @@
+"""
+Ficheros estáticos con hash en el nombre y copias precomprimidas.
+
+En producción collectstatic usa AlmacenEstaticos: copia cada fichero con el
+hash de su contenido en el nombre (ManifestStaticFilesStorage, así que
+{% static %} ya devuelve ese nombre) y deja junto a los compresibles una copia
+.gz y, si está instalado el paquete brotli, otra .br. EstaticosMiddleware los
+sirve con responder(): la variante que acepte el cliente y, para los nombres
+con hash, Cache-Control immutable de un año, de modo que un visitante que
+vuelve no descarga ni revalida ningún estático.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotFound
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+UN_ANIO = 365 * 24 * 3600
+# ManifestStaticFilesStorage inserta los 12 primeros caracteres del MD5: app.1a2b3c4d5e6f.css
+NOMBRE_CON_HASH = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+# Una copia comprimida que no ahorra al menos esto no merece servirse.
+AHORRO_MINIMO = 0.05
+
+
+def _gzip(datos):
+    # mtime=0: el mismo fichero produce siempre los mismos bytes
+    return gzip.compress(datos, compresslevel=9, mtime=0)
+
+
+def _brotli(datos):
+    return brotli.compress(datos, quality=11)
+
+
+def codificaciones():
+    """[(Content-Encoding, extensión, compresor)] disponibles, de más a menos preferida."""
+    disponibles = [('gzip', '.gz', _gzip)]
+    if brotli is not None:
+        disponibles.insert(0, ('br', '.br', _brotli))
+    return disponibles
+
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if not kwargs.get('dry_run'):
+            self.comprimir(set(self.hashed_files.values()))
+
+    def comprimir(self, nombres):
+        """Crea las copias .gz/.br que falten. Devuelve cuántas se escribieron."""
+        escritas = 0
+        for nombre in nombres:
+            if not nombre.endswith(settings.ESTATICOS_EXTENSIONES_COMPRIMIBLES):
+                continue
+            pendientes = [
+                (extension, compresor) for _, extension, compresor in codificaciones()
+                # El contenido de un nombre con hash no cambia: si la copia existe, vale.
+                if not self.exists(nombre + extension)
+            ]
+            if not pendientes:
+                continue
+            with self.open(nombre) as archivo:
+                datos = archivo.read()
+            if len(datos) < settings.ESTATICOS_TAMANIO_MINIMO:
+                continue
+            for extension, compresor in pendientes:
+                comprimido = compresor(datos)
+                if len(comprimido) <= len(datos) * (1 - AHORRO_MINIMO):
+                    self.save(nombre + extension, ContentFile(comprimido))
+                    escritas += 1
+        return escritas
+
+
+def _aceptadas(request):
+    aceptadas = set()
+    for parte in request.headers.get('Accept-Encoding', '').split(','):
+        codificacion, _, parametros = parte.partition(';')
+        try:
+            if float(parametros.strip().removeprefix('q=') or 1) == 0:
+                continue
+        except ValueError:
+            pass
+        aceptadas.add(codificacion.strip().lower())
+    return aceptadas
+
+
+def responder(request, nombre):
+    """Respuesta para ``nombre`` (ruta relativa a STATIC_ROOT) o 404."""
+    try:
+        ruta = safe_join(settings.STATIC_ROOT, nombre)
+    except SuspiciousFileOperation:
+        return HttpResponseNotFound()
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return HttpResponseNotFound()
+    if not stat.S_ISREG(estado.st_mode):
+        return HttpResponseNotFound()
+
+    variantes = [
+        (codificacion, ruta + extension) for codificacion, extension, _ in codificaciones()
+        if os.path.isfile(ruta + extension)
+    ]
+    respuesta = get_conditional_response(request, last_modified=int(estado.st_mtime))
+    if respuesta is None:
+        aceptadas = _aceptadas(request)
+        codificacion, servida = next(
+            ((codificacion, variante) for codificacion, variante in variantes if codificacion in aceptadas),
+            (None, ruta),
+        )
+        tipo, _ = mimetypes.guess_type(ruta)
+        respuesta = FileResponse(open(servida, 'rb'), content_type=tipo or 'application/octet-stream')
+        respuesta.headers.pop('Content-Disposition', None)
+        if codificacion:
+            respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.headers['Last-Modified'] = http_date(estado.st_mtime)
+
+    if variantes:
+        patch_vary_headers(respuesta, ['Accept-Encoding'])
+    if NOMBRE_CON_HASH.search(nombre):
+        patch_cache_control(respuesta, public=True, max_age=UN_ANIO, immutable=True)
+    else:
+        # Sin hash (enlaces directos, ficheros que no pasan por {% static %}) el
+        # contenido puede cambiar en el siguiente despliegue.
+        patch_cache_control(respuesta, public=True, max_age=settings.ESTATICOS_MAX_AGE_SIN_HASH)
+    return respuesta
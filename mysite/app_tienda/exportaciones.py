@@ -0,0 +1,225 @@
+"""
+Exportaciones en streaming (CSV / JSONL, opcionalmente gzip) de pedidos,
+líneas de pedido, usuarios, catálogo e historial de pedidos.
+
+Todo se genera con QuerySet.iterator(chunk_size=...) y se emite en bloques
+de ~64 KB, de modo que la memoria usada no depende del número de filas.
+La misma API la usan las vistas de administración y el comando exportar.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from operator import attrgetter
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import DetallePedido, HistorialPedido, Libro, Pedido, Usuario
+
+FORMATOS = ('csv', 'jsonl')
+CHUNK_SIZE = 2000
+TAMANIO_BLOQUE = 64 * 1024
+# Una celda de texto que empieza por uno de estos caracteres se interpreta
+# como fórmula al abrir el CSV en una hoja de cálculo.
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ErrorExportacion(ValueError):
+    pass
+
+
+def _col(nombre, ruta=None):
+    return nombre, attrgetter(ruta or nombre)
+
+
+EXPORTACIONES = {
+    'pedidos': {
+        'queryset': lambda: Pedido.objects.select_related('usuario', 'cupon').only(
+            'numero_pedido', 'estado', 'metodo_pago', 'subtotal', 'descuento', 'impuestos', 'total',
+            'pagado', 'fecha_pago', 'fecha_creacion', 'usuario__email', 'usuario__username', 'cupon__codigo',
+        ),
+        'campo_fecha': 'fecha_creacion',
+        'campo_estado': 'estado',
+        'columnas': [
+            _col('numero_pedido'),
+            _col('fecha_creacion'),
+            _col('estado'),
+            _col('metodo_pago'),
+            _col('subtotal'),
+            # Pedido sin cupón: celda vacía en CSV, null en JSONL
+            ('cupon', lambda pedido: pedido.cupon and pedido.cupon.codigo),
+            _col('descuento'),
+            _col('impuestos'),
+            _col('total'),
+            _col('pagado'),
+            _col('fecha_pago'),
+            _col('usuario_email', 'usuario.email'),
+            _col('usuario_username', 'usuario.username'),
+        ],
+    },
+    'detalles': {
+        'queryset': lambda: DetallePedido.objects.select_related('pedido', 'libro').only(
+            'cantidad', 'precio_unitario', 'precio_total',
+            'pedido__numero_pedido', 'pedido__fecha_creacion', 'pedido__estado',
+            'libro__isbn', 'libro__titulo',
+        ),
+        'campo_fecha': 'pedido__fecha_creacion',
+        'campo_estado': 'pedido__estado',
+        'columnas': [
+            _col('numero_pedido', 'pedido.numero_pedido'),
+            _col('fecha_pedido', 'pedido.fecha_creacion'),
+            _col('estado', 'pedido.estado'),
+            _col('libro_id'),
+            _col('isbn', 'libro.isbn'),
+            _col('titulo', 'libro.titulo'),
+            _col('cantidad'),
+            _col('precio_unitario'),
+            _col('precio_total'),
+        ],
+    },
+    'usuarios': {
+        'queryset': lambda: Usuario.objects.only(
+            'email', 'username', 'first_name', 'last_name', 'tipo_usuario',
+            'fecha_registro', 'is_active', 'email_verificado',
+        ),
+        'campo_fecha': 'fecha_registro',
+        'campo_estado': None,
+        'columnas': [
+            _col('id'),
+            _col('email'),
+            _col('username'),
+            _col('first_name'),
+            _col('last_name'),
+            _col('tipo_usuario'),
+            _col('fecha_registro'),
+            _col('is_active'),
+            _col('email_verificado'),
+        ],
+    },
+    'libros': {
+        'queryset': lambda: Libro.objects.only(
+            'isbn', 'titulo', 'autor', 'categoria_id', 'precio', 'precio_descuento',
+            'en_oferta', 'formato', 'activo', 'fecha_actualizacion',
+        ),
+        'campo_fecha': 'fecha_actualizacion',
+        'campo_estado': None,
+        'columnas': [
+            _col('id'),
+            _col('isbn'),
+            _col('titulo'),
+            _col('autor'),
+            _col('categoria_id'),
+            _col('precio'),
+            _col('precio_descuento'),
+            _col('en_oferta'),
+            _col('formato'),
+            _col('activo'),
+            _col('fecha_actualizacion'),
+        ],
+    },
+    'historial': {
+        'queryset': lambda: HistorialPedido.objects.select_related('pedido').only(
+            'accion', 'descripcion', 'fecha_registro', 'usuario_id', 'pedido__numero_pedido',
+        ),
+        'campo_fecha': 'fecha_registro',
+        'campo_estado': None,
+        'columnas': [
+            _col('id'),
+            _col('fecha_registro'),
+            _col('pedido_id'),
+            _col('numero_pedido', 'pedido.numero_pedido'),
+            _col('usuario_id'),
+            _col('accion'),
+            _col('descripcion'),
+        ],
+    },
+}
+
+
+def construir_queryset(recurso, desde=None, hasta=None, estado=None, using=DEFAULT_DB_ALIAS):
+    """
+    ``desde`` y ``hasta`` son fechas (inclusive) en la zona horaria local.
+    El recorrido es por clave primaria para que el iterador use el índice.
+    """
+    if recurso not in EXPORTACIONES:
+        raise ErrorExportacion(f"Recurso desconocido: {recurso}")
+    definicion = EXPORTACIONES[recurso]
+    qs = definicion['queryset']().using(using)
+    campo_fecha = definicion['campo_fecha']
+    if desde:
+        qs = qs.filter(**{f'{campo_fecha}__gte': timezone.make_aware(datetime.combine(desde, time.min))})
+    if hasta:
+        qs = qs.filter(**{f'{campo_fecha}__lt': timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))})
+    if estado:
+        if not definicion['campo_estado']:
+            raise ErrorExportacion(f"El recurso {recurso} no admite filtro por estado.")
+        if estado not in dict(Pedido.ESTADO_PEDIDO):
+            raise ErrorExportacion(f"Estado desconocido: {estado}")
+        qs = qs.filter(**{definicion['campo_estado']: estado})
+    return qs.order_by('pk')
+
+
+def _celda_csv(valor):
+    # Nombres, usuarios o títulos los escribe el cliente: se neutralizan con un
+    # apóstrofo. Los números (Decimal, int) se dejan tal cual.
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def filas(recurso, queryset, formato):
+    """Genera el archivo como bloques de texto de ~TAMANIO_BLOQUE caracteres."""
+    if formato not in FORMATOS:
+        raise ErrorExportacion(f"Formato desconocido: {formato}")
+    columnas = EXPORTACIONES[recurso]['columnas']
+    nombres = [nombre for nombre, _ in columnas]
+    buffer = io.StringIO()
+
+    if formato == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(nombres)
+        escribir = lambda valores: writer.writerow(map(_celda_csv, valores))
+    else:
+        escribir = lambda valores: buffer.write(
+            json.dumps(dict(zip(nombres, map(_valor_json, valores))), ensure_ascii=False) + '\n'
+        )
+
+    for obj in queryset.iterator(chunk_size=CHUNK_SIZE):
+        escribir([getter(obj) for _, getter in columnas])
+        if buffer.tell() >= TAMANIO_BLOQUE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def codificar(bloques, comprimir=False):
+    """Convierte los bloques a bytes UTF-8 y, si se pide, los comprime en gzip al vuelo."""
+    if not comprimir:
+        for bloque in bloques:
+            yield bloque.encode('utf-8')
+        return
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> cabecera gzip
+    for bloque in bloques:
+        datos = compresor.compress(bloque.encode('utf-8'))
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def nombre_archivo(recurso, formato, comprimir=False):
+    sufijo = timezone.localtime().strftime('%Y%m%d-%H%M%S')
+    return f"{recurso}-{sufijo}.{formato}{'.gz' if comprimir else ''}"
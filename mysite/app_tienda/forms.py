@@ -1,5 +1,5 @@
 from django import forms
-from .models import Libro, Usuario
+from .models import Libro, Pedido, Resena, Usuario
 
 class RegistroForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput, label="Contraseña")
@@ -46,3 +46,88 @@ class LibroForm(forms.ModelForm):
             'descripcion': forms.Textarea(attrs={'rows': 4}),
             'meta_descripcion': forms.Textarea(attrs={'rows': 2}),
         }
+
+class LibroImportacionForm(LibroForm):
+    """
+    Valida una fila de importación con las reglas de LibroForm. Los archivos
+    y la categoría los resuelve el importador; la unicidad del ISBN no se
+    valida porque la importación actualiza los libros existentes.
+    """
+    class Meta(LibroForm.Meta):
+        exclude = None
+        fields = (
+            'isbn', 'titulo', 'autor', 'descripcion', 'descripcion_corta', 'precio',
+            'precio_descuento', 'formato', 'paginas', 'activo', 'meta_descripcion', 'meta_keywords',
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['isbn'].required = True
+
+    def validate_unique(self):
+        pass
+
+class ImportarCatalogoForm(forms.Form):
+    FORMATOS = [('csv', 'CSV'), ('onix', 'ONIX 3.0 (XML)')]
+
+    archivo = forms.FileField(label="Archivo del catálogo")
+    formato = forms.ChoiceField(choices=FORMATOS, initial='csv')
+    dry_run = forms.BooleanField(required=False, initial=True, label="Simular (no guardar cambios)")
+
+class FiltroPedidosForm(forms.Form):
+    # orden visible -> campos de la clave de paginación (el último siempre único)
+    ORDENES = {
+        'recientes': ['-fecha_creacion', '-id'],
+        'antiguos': ['fecha_creacion', 'id'],
+        'total_desc': ['-total', '-id'],
+        'total_asc': ['total', 'id'],
+    }
+    ORDEN_CHOICES = [
+        ('recientes', 'Más recientes'),
+        ('antiguos', 'Más antiguos'),
+        ('total_desc', 'Mayor total'),
+        ('total_asc', 'Menor total'),
+    ]
+
+    estado = forms.ChoiceField(choices=[('', 'Todos')] + Pedido.ESTADO_PEDIDO, required=False)
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    email = forms.EmailField(required=False, label="Email del cliente")
+    total_min = forms.DecimalField(required=False, min_value=0, decimal_places=2, label="Total mínimo")
+    total_max = forms.DecimalField(required=False, min_value=0, decimal_places=2, label="Total máximo")
+    orden = forms.ChoiceField(choices=ORDEN_CHOICES, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for campo in self.fields.values():
+            campo.widget.attrs['class'] = 'form-select' if isinstance(campo.widget, forms.Select) else 'form-control'
+
+    def clean(self):
+        datos = super().clean()
+        if datos.get('desde') and datos.get('hasta') and datos['desde'] > datos['hasta']:
+            raise forms.ValidationError("La fecha inicial no puede ser posterior a la final.")
+        if datos.get('total_min') is not None and datos.get('total_max') is not None \
+                and datos['total_min'] > datos['total_max']:
+            raise forms.ValidationError("El total mínimo no puede ser mayor que el máximo.")
+        return datos
+
+class ResenaForm(forms.ModelForm):
+    class Meta:
+        model = Resena
+        fields = ['calificacion', 'comentario']
+        labels = {
+            'calificacion': 'Calificación',
+            'comentario': 'Comentario',
+        }
+        widgets = {
+            'calificacion': forms.Select(
+                choices=[(n, '★' * n) for n in range(5, 0, -1)], attrs={'class': 'form-select'},
+            ),
+            'comentario': forms.Textarea(attrs={'rows': 4, 'class': 'form-control', 'maxlength': 2000}),
+        }
+
+    def clean_comentario(self):
+        comentario = self.cleaned_data['comentario'].strip()
+        if len(comentario) > 2000:
+            raise forms.ValidationError("El comentario no puede superar los 2000 caracteres.")
+        return comentario
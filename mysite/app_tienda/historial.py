@@ -0,0 +1,111 @@
+"""
+Registro de eventos de pedidos (HistorialPedido), de solo inserción.
+
+registrar() inserta el evento en la transacción en curso, así que un rollback
+(también el de un savepoint) lo descarta con el resto de cambios. Dentro de
+un bloque ``with agrupar():`` los eventos se acumulan y se insertan todos con
+un único bulk_create al salir del bloque sin errores; si el bloque lanza una
+excepción no se inserta ninguno.
+
+Se aparta de la idea inicial de acumular por transacción y volcar en
+transaction.on_commit: sin leer el estado interno de la conexión no se sabe
+qué eventos descartó el rollback de un savepoint ni cuándo empieza otra
+transacción, y un volcado posterior al commit perdería eventos de cambios ya
+confirmados si el proceso muere entre ambos. agrupar() es explícito y vuelca
+dentro de la transacción. Lo usan los llamadores que registran varios
+eventos (checkout, populate_all); transicionar() registra uno solo y
+transicionar_lote() los inserta con un INSERT ... SELECT.
+
+Las consultas por rango de fechas se hacen partición a partición (meses de
+fecha_registro) y el comando archivar_historial mueve los meses antiguos a
+archivos JSONL comprimidos.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import HistorialPedido
+
+# {alias de base de datos: [eventos]} del bloque agrupar() activo, o None.
+_pendientes = ContextVar('historial_pendientes', default=None)
+
+
+def registrar(pedido, accion, descripcion='', usuario=None, using=DEFAULT_DB_ALIAS):
+    """Añade un evento al historial del pedido (o al grupo de agrupar() activo)."""
+    evento = HistorialPedido(
+        pedido_id=getattr(pedido, 'pk', pedido),
+        usuario_id=getattr(usuario, 'pk', usuario),
+        accion=accion,
+        descripcion=descripcion or None,
+    )
+    pendientes = _pendientes.get()
+    if pendientes is not None:
+        pendientes[using].append(evento)
+    else:
+        HistorialPedido.objects.using(using).bulk_create([evento])
+
+
+@contextmanager
+def agrupar():
+    """
+    Acumula los eventos registrados en el bloque y los inserta al final con un
+    bulk_create por base de datos. Debe envolver un bloque que se confirma o
+    falla entero (p. ej. el cuerpo de un transaction.atomic()): un savepoint
+    interno que hace rollback no retira los eventos ya acumulados. Los bloques
+    anidados se unen al exterior.
+    """
+    if _pendientes.get() is not None:
+        yield
+        return
+    pendientes = defaultdict(list)
+    token = _pendientes.set(pendientes)
+    try:
+        yield
+    finally:
+        _pendientes.reset(token)
+    for using, eventos in pendientes.items():
+        HistorialPedido.objects.using(using).bulk_create(eventos)
+
+
+# ---------- Consulta por particiones ----------
+
+def particiones(desde, hasta):
+    """Meses [inicio, fin) que cubren el rango de fechas [desde, hasta]."""
+    inicio = desde.replace(day=1)
+    while inicio <= hasta:
+        siguiente = (inicio + timedelta(days=32)).replace(day=1)
+        yield inicio, siguiente
+        inicio = siguiente
+
+
+def _instante(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def eventos(desde, hasta=None, pedido=None, accion=None, chunk_size=2000):
+    """
+    Itera los eventos de [desde, hasta] en orden cronológico, un mes cada vez,
+    para que cada consulta use el índice de fecha_registro sobre un rango acotado.
+    """
+    hasta = hasta or timezone.localdate()
+    limite = _instante(hasta + timedelta(days=1))
+    for inicio, fin in particiones(desde, hasta):
+        qs = HistorialPedido.objects.filter(
+            fecha_registro__gte=_instante(max(inicio, desde)),
+            fecha_registro__lt=min(_instante(fin), limite),
+        )
+        if pedido is not None:
+            qs = qs.filter(pedido_id=getattr(pedido, 'pk', pedido))
+        if accion:
+            qs = qs.filter(accion=accion)
+        yield from qs.order_by('fecha_registro', 'id').iterator(chunk_size=chunk_size)
+
+
+def particion_mas_antigua():
+    primero = HistorialPedido.objects.order_by('fecha_registro').values_list('fecha_registro', flat=True).first()
+    return timezone.localdate(primero).replace(day=1) if primero else None
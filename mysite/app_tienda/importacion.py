@@ -0,0 +1,310 @@
+"""
+Importación masiva del catálogo desde CSV u ONIX 3.0.
+
+El archivo se lee en streaming, cada fila se valida con LibroImportacionForm
+y las filas válidas se agrupan en lotes. Para cada lote se copian portadas y
+archivos desde un directorio local con un pool de hilos y después se hace un
+único INSERT ... ON CONFLICT (isbn) DO UPDATE con bulk_create.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils._os import safe_join
+from django.utils.text import slugify
+
+from .cache import invalidar_catalogo
+from .forms import LibroImportacionForm
+from .models import Categoria, Libro
+
+# Columnas que se sobrescriben cuando el ISBN ya existe. El slug y los flags
+# editoriales (destacado, nuevo) se conservan.
+CAMPOS_ACTUALIZABLES = [
+    'titulo', 'autor', 'categoria', 'descripcion', 'descripcion_corta', 'precio',
+    'precio_descuento', 'en_oferta', 'formato', 'paginas', 'activo', 'meta_descripcion',
+    'meta_keywords', 'portada', 'archivo_digital', 'tamanio_archivo', 'fecha_actualizacion',
+]
+
+VALORES_POR_DEFECTO = {
+    campo.name: campo.get_default()
+    for campo in Libro._meta.fields
+    if campo.name in LibroImportacionForm._meta.fields and campo.has_default()
+}
+
+
+@dataclass
+class Informe:
+    dry_run: bool = False
+    leidas: int = 0
+    creadas: int = 0
+    actualizadas: int = 0
+    invalidas: list = field(default_factory=list)  # (número de fila, isbn, errores)
+    categorias_nuevas: set = field(default_factory=set)
+    medios_faltantes: list = field(default_factory=list)  # (isbn, ruta)
+    segundos: float = 0.0
+
+    @property
+    def validas(self):
+        return self.creadas + self.actualizadas
+
+    def filas_por_segundo(self):
+        return self.leidas / self.segundos if self.segundos else 0.0
+
+
+# ---------- Lectores ----------
+
+def leer_csv(archivo):
+    """Acepta un archivo binario o de texto; las cabeceras coinciden con los campos de Libro."""
+    if isinstance(archivo, io.TextIOBase):
+        texto = archivo
+    else:
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    for fila in csv.DictReader(texto):
+        yield {clave.strip(): (valor or '').strip() for clave, valor in fila.items() if clave}
+
+
+def _texto(elemento, ruta):
+    nodo = elemento.find(ruta)
+    return nodo.text.strip() if nodo is not None and nodo.text else ''
+
+
+def leer_onix(archivo):
+    """
+    Lee <Product> a <Product> (ONIX 3.0, etiquetas de referencia) liberando
+    cada elemento tras procesarlo. Las portadas y archivos se esperan en
+    <SupportingResource> con ResourceContentType 01 (portada) y 99 (archivo).
+    """
+    raiz = None
+    for evento, producto in ET.iterparse(archivo, events=('start', 'end')):
+        if raiz is None:
+            raiz = producto
+        if evento != 'end' or producto.tag.rsplit('}', 1)[-1] != 'Product':
+            continue
+        for elemento in producto.iter():
+            elemento.tag = elemento.tag.rsplit('}', 1)[-1]
+
+        isbn = ''
+        for identificador in producto.findall('ProductIdentifier'):
+            if _texto(identificador, 'ProductIDType') in ('15', '03'):
+                isbn = _texto(identificador, 'IDValue')
+                break
+
+        fila = {
+            'isbn': isbn,
+            'titulo': _texto(producto, 'DescriptiveDetail/TitleDetail/TitleElement/TitleText'),
+            'autor': _texto(producto, 'DescriptiveDetail/Contributor/PersonName'),
+            'categoria': _texto(producto, 'DescriptiveDetail/Subject/SubjectHeadingText'),
+            'paginas': _texto(producto, 'DescriptiveDetail/Extent/ExtentValue'),
+            'descripcion': _texto(producto, 'CollateralDetail/TextContent/Text'),
+            'precio': _texto(producto, 'ProductSupply/SupplyDetail/Price/PriceAmount'),
+        }
+        for recurso in producto.findall('CollateralDetail/SupportingResource'):
+            enlace = _texto(recurso, 'ResourceVersion/ResourceLink')
+            tipo = _texto(recurso, 'ResourceContentType')
+            if tipo == '01':
+                fila['portada'] = enlace
+            elif tipo == '99':
+                fila['archivo'] = enlace
+        yield fila
+        raiz.clear()
+
+
+LECTORES = {'csv': leer_csv, 'onix': leer_onix}
+
+
+# ---------- Medios ----------
+
+def _ruta_medio(base, ruta):
+    """
+    Ruta absoluta de ``ruta`` dentro de ``base``, o None si sale de él: el
+    feed lo escribe la editorial y una ruta absoluta, con ../ o a través de un
+    enlace simbólico acabaría copiando cualquier archivo al storage público.
+    """
+    try:
+        origen = safe_join(base, ruta)
+    except SuspiciousFileOperation:
+        return None
+    base_real = os.path.realpath(base)
+    if os.path.commonpath([base_real, os.path.realpath(origen)]) != base_real:
+        return None
+    return origen
+
+
+def _copiar_medio(origen_dir, ruta, destino):
+    """
+    Copia un archivo local al storage y devuelve (nombre, tamaño), o
+    (None, None) si no existe. El nombre lleva un hash del contenido: dos
+    medios distintos con el mismo nombre (cover.jpg de carpetas distintas del
+    feed) no se confunden, y uno ya copiado se reutiliza sin volver a escribirlo.
+    """
+    origen = _ruta_medio(origen_dir, ruta)
+    if origen is None or not os.path.isfile(origen):
+        return None, None
+    resumen = hashlib.sha256()
+    with open(origen, 'rb') as f:
+        for bloque in File(f).chunks():
+            resumen.update(bloque)
+    base, extension = os.path.splitext(os.path.basename(ruta))
+    nombre = f'{destino}/{base}.{resumen.hexdigest()[:16]}{extension}'
+    tamanio = os.path.getsize(origen)
+    if not default_storage.exists(nombre):
+        with open(origen, 'rb') as f:
+            nombre = default_storage.save(nombre, File(f))
+    return nombre, tamanio
+
+
+# ---------- Importador ----------
+
+class ImportadorCatalogo:
+
+    def __init__(self, medios_dir=None, tamanio_lote=500, hilos=8, dry_run=False, progreso=None):
+        self.medios_dir = medios_dir
+        self.tamanio_lote = tamanio_lote
+        self.hilos = hilos
+        self.dry_run = dry_run
+        self.progreso = progreso or (lambda informe: None)
+        self.informe = Informe(dry_run=dry_run)
+        # nombre en minúsculas -> id; se carga una sola vez.
+        self.categorias = {
+            nombre.lower(): pk for pk, nombre in Categoria.objects.values_list('id', 'nombre')
+        }
+
+    def importar(self, archivo, formato='csv'):
+        inicio = time.perf_counter()
+        lote = []
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            for numero, fila in enumerate(LECTORES[formato](archivo), start=2 if formato == 'csv' else 1):
+                self.informe.leidas += 1
+                datos = self._validar(numero, fila)
+                if datos is None:
+                    continue
+                lote.append((fila, datos))
+                if len(lote) >= self.tamanio_lote:
+                    self._procesar_lote(lote, pool)
+                    lote = []
+                    self.informe.segundos = time.perf_counter() - inicio
+                    self.progreso(self.informe)
+            if lote:
+                self._procesar_lote(lote, pool)
+        self.informe.segundos = time.perf_counter() - inicio
+        self.progreso(self.informe)
+        return self.informe
+
+    def _validar(self, numero, fila):
+        # Las columnas ausentes toman el valor por defecto del modelo (formato='pdf', activo=True).
+        datos = {**VALORES_POR_DEFECTO, **{k: v for k, v in fila.items() if v != ''}}
+        if str(datos.get('activo')).lower() in ('0', 'false', 'no'):
+            datos.pop('activo')
+        form = LibroImportacionForm(data=datos)
+        if not form.is_valid():
+            errores = '; '.join(f"{campo}: {' '.join(mensajes)}" for campo, mensajes in form.errors.items())
+            self.informe.invalidas.append((numero, fila.get('isbn', ''), errores))
+            return None
+        # Sin directorio de medios las rutas se guardan tal cual, relativas a MEDIA_ROOT.
+        base = self.medios_dir or settings.MEDIA_ROOT
+        fuera = [clave for clave in ('portada', 'archivo') if fila.get(clave) and _ruta_medio(base, fila[clave]) is None]
+        if fuera:
+            errores = '; '.join(f"{clave}: la ruta sale del directorio de medios." for clave in fuera)
+            self.informe.invalidas.append((numero, fila.get('isbn', ''), errores))
+            return None
+        return form.cleaned_data
+
+    def _categoria_id(self, nombre):
+        if not nombre:
+            return None
+        clave = nombre.lower()
+        if clave not in self.categorias:
+            self.informe.categorias_nuevas.add(nombre)
+            if self.dry_run:
+                return None
+            categoria, _ = Categoria.objects.get_or_create(nombre=nombre, defaults={'slug': slugify(nombre)})
+            self.categorias[clave] = categoria.id
+        return self.categorias[clave]
+
+    def _procesar_lote(self, lote, pool):
+        isbns = {datos['isbn'] for _, datos in lote}
+        existentes = {
+            fila[0]: fila[1:] for fila in Libro.objects.filter(isbn__in=isbns).values_list(
+                'isbn', 'categoria_id', 'portada', 'archivo_digital', 'tamanio_archivo',
+            )
+        }
+        nuevos = len(isbns - existentes.keys())
+        if self.dry_run:
+            self.informe.creadas += nuevos
+            self.informe.actualizadas += len(isbns) - nuevos
+            for fila, datos in lote:
+                self._categoria_id(fila.get('categoria'))
+                for clave in ('portada', 'archivo'):
+                    ruta = fila.get(clave)
+                    if ruta and not (self.medios_dir and os.path.isfile(_ruta_medio(self.medios_dir, ruta))):
+                        self.informe.medios_faltantes.append((datos['isbn'], ruta))
+            return
+
+        copiados = self._copiar_medios(lote, pool)
+
+        libros = {}
+        for fila, datos in lote:
+            portada, _ = copiados.get((fila.get('portada'), 'portadas'), (None, None))
+            archivo, tamanio = copiados.get((fila.get('archivo'), 'libros_digitales'), (None, None))
+            for ruta, nombre in ((fila.get('portada'), portada), (fila.get('archivo'), archivo)):
+                if ruta and nombre is None:
+                    self.informe.medios_faltantes.append((datos['isbn'], ruta))
+            # Lo que el feed no trae se conserva del libro existente.
+            categoria_id, portada_actual, archivo_actual, tamanio_actual = existentes.get(
+                datos['isbn'], (None, 'portadas/default.jpg', 'libros_digitales/default.pdf', ''),
+            )
+            libro = Libro(**datos)
+            libro.categoria_id = self._categoria_id(fila.get('categoria')) or categoria_id
+            isbn_slug = slugify(datos['isbn'])
+            libro.slug = f"{slugify(datos['titulo'])[:49 - len(isbn_slug)]}-{isbn_slug}"
+            # Misma regla que Libro.save, que bulk_create no ejecuta.
+            if libro.precio_descuento and 0 < libro.precio_descuento < libro.precio:
+                libro.en_oferta = True
+            else:
+                libro.en_oferta = False
+                libro.precio_descuento = None
+            libro.portada = portada or portada_actual
+            libro.archivo_digital = archivo or archivo_actual
+            libro.tamanio_archivo = libro._get_file_size(tamanio) if tamanio is not None else tamanio_actual
+            libros[datos['isbn']] = libro  # la última fila con el mismo ISBN gana
+
+        with transaction.atomic():
+            Libro.objects.bulk_create(
+                libros.values(),
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=CAMPOS_ACTUALIZABLES,
+            )
+            # bulk_create no envía post_save
+            transaction.on_commit(invalidar_catalogo)
+        self.informe.creadas += nuevos
+        self.informe.actualizadas += len(libros) - nuevos
+
+    def _copiar_medios(self, lote, pool):
+        """
+        Copia cada archivo distinto del lote una sola vez, en paralelo.
+        Devuelve {(ruta, destino): (nombre en storage | None, tamaño | None)}.
+        """
+        pendientes = {
+            (fila[clave], destino)
+            for fila, _ in lote
+            for clave, destino in (('portada', 'portadas'), ('archivo', 'libros_digitales'))
+            if fila.get(clave)
+        }
+        if not self.medios_dir:
+            # Sin directorio de medios las rutas se toman tal cual, relativas a MEDIA_ROOT.
+            return {par: (par[0], None) for par in pendientes}
+        pendientes = list(pendientes)
+        resultados = pool.map(lambda par: _copiar_medio(self.medios_dir, *par), pendientes)
+        return dict(zip(pendientes, resultados))
@@ -0,0 +1,251 @@
+"""
+Tablas de resumen diarias para el panel de administración.
+
+Los contadores se incrementan dentro de la misma transacción que genera el
+evento (checkout, registro, descarga, cambio de estado de un pedido) y se
+recalculan desde las tablas de origen con los comandos actualizar_kpis /
+backfill_kpis. actualizar_kpis
+recalcula los últimos días y, además, el día de creación de cualquier pedido
+modificado en ese periodo, de modo que un reembolso o una cancelación de un
+pedido antiguo corrige los ingresos y los estados del día en que se creó.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import (
+    DetallePedido, Pedido, PedidosEstadoDiario, ResumenDiario, Usuario, VentaLibroDiaria,
+)
+
+# Estados cuyo total cuenta como ingreso.
+ESTADOS_INGRESO = ('pagado', 'procesando', 'completado')
+
+
+def _incrementar(modelo, claves, **incrementos):
+    """
+    UPDATE ... SET campo = campo + n; inserta la fila si aún no existe. Los
+    decrementos no bajan de 0: un resumen aún sin recalcular puede no incluir
+    el pedido que se resta.
+    """
+    expresiones = {
+        campo: F(campo) + valor if valor >= 0
+        else Greatest(F(campo) + valor, 0, output_field=modelo._meta.get_field(campo))
+        for campo, valor in incrementos.items()
+    }
+    if modelo.objects.filter(**claves).update(**expresiones):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **{campo: max(valor, 0) for campo, valor in incrementos.items()})
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT.
+        modelo.objects.filter(**claves).update(**expresiones)
+
+
+def registrar_pedido(pedido, lineas):
+    """
+    Suma un pedido recién creado a los contadores por estado y, si ya está en
+    un estado de ingreso, a pedidos, ingresos y ventas por libro. ``lineas``
+    es una lista de tuplas (libro_id, cantidad, precio_total) con el detalle
+    ya calculado.
+    """
+    fecha = timezone.localdate(pedido.fecha_creacion)
+    _incrementar(PedidosEstadoDiario, {'fecha': fecha, 'estado': pedido.estado}, cantidad=1)
+    if pedido.estado not in ESTADOS_INGRESO:
+        # Los suma la transición a pagado (registrar_transicion).
+        return
+    unidades = sum(cantidad for _, cantidad, _ in lineas)
+    _incrementar(ResumenDiario, {'fecha': fecha}, pedidos=1, ingresos=pedido.total, unidades=unidades)
+    for libro_id, cantidad, precio_total in lineas:
+        _incrementar(
+            VentaLibroDiaria, {'fecha': fecha, 'libro_id': libro_id},
+            unidades=cantidad, ingresos=precio_total,
+        )
+
+
+def registrar_transicion(pedidos, destino):
+    """
+    Pasa los pedidos del queryset ``pedidos``, aún en su estado de origen, a
+    ``destino`` en los resúmenes del día de su creación: mueve los contadores
+    por estado y suma o resta pedidos, ingresos, unidades y ventas por libro
+    de los que entran en ESTADOS_INGRESO o salen de ellos. Se llama dentro de
+    la transacción del cambio de estado y antes del UPDATE; son consultas
+    agrupadas por día, sin recorrer los pedidos.
+    """
+    tz = timezone.get_current_timezone()
+    grupos = list(
+        pedidos.annotate(dia=TruncDate('fecha_creacion', tzinfo=tz))
+        .values('dia', 'estado').annotate(n=Count('id'), ingresos=Sum('total')).order_by()
+    )
+    for grupo in grupos:
+        _incrementar(PedidosEstadoDiario, {'fecha': grupo['dia'], 'estado': grupo['estado']}, cantidad=-grupo['n'])
+        _incrementar(PedidosEstadoDiario, {'fecha': grupo['dia'], 'estado': destino}, cantidad=grupo['n'])
+
+    entran = destino in ESTADOS_INGRESO
+    signo = 1 if entran else -1
+    resumen = {}
+    for grupo in grupos:
+        if (grupo['estado'] in ESTADOS_INGRESO) != entran:
+            dia = resumen.setdefault(grupo['dia'], {'pedidos': 0, 'ingresos': Decimal('0'), 'unidades': 0})
+            dia['pedidos'] += signo * grupo['n']
+            dia['ingresos'] += signo * grupo['ingresos']
+    if not resumen:
+        return
+
+    afectados = pedidos.exclude(estado__in=ESTADOS_INGRESO) if entran else pedidos.filter(estado__in=ESTADOS_INGRESO)
+    for venta in (
+        DetallePedido.objects.filter(pedido__in=afectados)
+        .annotate(dia=TruncDate('pedido__fecha_creacion', tzinfo=tz))
+        .values('dia', 'libro_id')
+        .annotate(unidades=Sum('cantidad'), ingresos=Sum('precio_total'))
+        .order_by()
+    ):
+        _incrementar(
+            VentaLibroDiaria, {'fecha': venta['dia'], 'libro_id': venta['libro_id']},
+            unidades=signo * venta['unidades'], ingresos=signo * venta['ingresos'],
+        )
+        resumen[venta['dia']]['unidades'] += signo * venta['unidades']
+    for fecha, valores in resumen.items():
+        _incrementar(ResumenDiario, {'fecha': fecha}, **valores)
+
+
+def registrar_nuevo_usuario(usuario):
+    _incrementar(ResumenDiario, {'fecha': timezone.localdate(usuario.fecha_registro)}, nuevos_usuarios=1)
+
+
+def registrar_descarga():
+    _incrementar(ResumenDiario, {'fecha': timezone.localdate()}, descargas=1)
+
+
+def _rango_utc(desde, hasta):
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    return inicio, fin
+
+
+@transaction.atomic
+def recalcular_rango(desde, hasta):
+    """
+    Recalcula los resúmenes de [desde, hasta] con un GROUP BY por tabla.
+    Conserva el contador de descargas, que no puede reconstruirse.
+    Devuelve el número de días con actividad.
+    """
+    inicio, fin = _rango_utc(desde, hasta)
+    tz = timezone.get_current_timezone()
+    dia = TruncDate('fecha_creacion', tzinfo=tz)
+
+    pedidos = Pedido.objects.filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+
+    por_estado = (
+        pedidos.annotate(dia=dia).values('dia', 'estado').annotate(n=Count('id')).order_by()
+    )
+    PedidosEstadoDiario.objects.filter(fecha__range=(desde, hasta)).delete()
+    PedidosEstadoDiario.objects.bulk_create(
+        PedidosEstadoDiario(fecha=fila['dia'], estado=fila['estado'], cantidad=fila['n'])
+        for fila in por_estado
+    )
+
+    ventas = (
+        DetallePedido.objects
+        .filter(pedido__in=pedidos.filter(estado__in=ESTADOS_INGRESO))
+        .annotate(dia=TruncDate('pedido__fecha_creacion', tzinfo=tz))
+        .values('dia', 'libro_id')
+        .annotate(unidades=Sum('cantidad'), ingresos=Sum('precio_total'))
+        .order_by()
+    )
+    VentaLibroDiaria.objects.filter(fecha__range=(desde, hasta)).delete()
+    VentaLibroDiaria.objects.bulk_create(
+        VentaLibroDiaria(fecha=f['dia'], libro_id=f['libro_id'], unidades=f['unidades'], ingresos=f['ingresos'])
+        for f in ventas
+    )
+
+    resumen = {}
+    for fila in (
+        pedidos.filter(estado__in=ESTADOS_INGRESO)
+        .annotate(dia=dia).values('dia')
+        .annotate(n=Count('id'), ingresos=Sum('total'))
+        .order_by()
+    ):
+        resumen.setdefault(fila['dia'], {}).update(pedidos=fila['n'], ingresos=fila['ingresos'])
+    for fila in (
+        DetallePedido.objects.filter(pedido__in=pedidos.filter(estado__in=ESTADOS_INGRESO))
+        .annotate(dia=TruncDate('pedido__fecha_creacion', tzinfo=tz))
+        .values('dia').annotate(unidades=Sum('cantidad')).order_by()
+    ):
+        resumen.setdefault(fila['dia'], {})['unidades'] = fila['unidades']
+    for fila in (
+        Usuario.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin)
+        .annotate(dia=TruncDate('fecha_registro', tzinfo=tz))
+        .values('dia').annotate(n=Count('id')).order_by()
+    ):
+        resumen.setdefault(fila['dia'], {})['nuevos_usuarios'] = fila['n']
+
+    vacio = {'pedidos': 0, 'ingresos': Decimal('0'), 'unidades': 0, 'nuevos_usuarios': 0}
+    ResumenDiario.objects.filter(fecha__range=(desde, hasta)).exclude(fecha__in=resumen.keys()).update(**vacio)
+    filas = [ResumenDiario(fecha=fecha, **{**vacio, **valores}) for fecha, valores in resumen.items()]
+    ResumenDiario.objects.bulk_create(
+        filas, update_conflicts=True, unique_fields=['fecha'], update_fields=list(vacio),
+    )
+    return len(resumen)
+
+
+def dias_modificados(desde, hasta):
+    """Días de creación anteriores a ``desde`` de los pedidos modificados en [desde, hasta]."""
+    inicio, fin = _rango_utc(desde, hasta)
+    return sorted(
+        Pedido.objects.filter(fecha_actualizacion__gte=inicio, fecha_actualizacion__lt=fin, fecha_creacion__lt=inicio)
+        .annotate(dia=TruncDate('fecha_creacion', tzinfo=timezone.get_current_timezone()))
+        .values_list('dia', flat=True).order_by().distinct()
+    )
+
+
+def recalcular_recientes(dias):
+    """
+    Recalcula los últimos ``dias`` días (incluido hoy) y los días anteriores
+    con pedidos modificados en ese periodo. Devuelve (desde, hasta, días
+    anteriores recalculados).
+    """
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=dias - 1)
+    anteriores = dias_modificados(desde, hasta)
+    recalcular_rango(desde, hasta)
+    for dia in anteriores:
+        recalcular_rango(dia, dia)
+    return desde, hasta, anteriores
+
+
+def panel(dias=30):
+    """Métricas del panel leídas exclusivamente de las tablas de resumen."""
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    resumen = list(ResumenDiario.objects.filter(fecha__gte=desde).order_by('fecha'))
+    totales = {
+        'ingresos': sum((r.ingresos for r in resumen), Decimal('0')),
+        'pedidos': sum(r.pedidos for r in resumen),
+        'unidades': sum(r.unidades for r in resumen),
+        'nuevos_usuarios': sum(r.nuevos_usuarios for r in resumen),
+        'descargas': sum(r.descargas for r in resumen),
+    }
+    estados = dict(Pedido.ESTADO_PEDIDO)
+    por_estado = [
+        {'estado': estados.get(f['estado'], f['estado']), 'cantidad': f['cantidad']}
+        for f in PedidosEstadoDiario.objects.filter(fecha__gte=desde)
+        .values('estado').annotate(cantidad=Sum('cantidad')).order_by('-cantidad')
+    ]
+    top_libros = (
+        VentaLibroDiaria.objects.filter(fecha__gte=desde)
+        .values('libro_id', 'libro__titulo')
+        .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+        .order_by('-unidades')[:5]
+    )
+    return {
+        'dias': dias,
+        'resumen': resumen,
+        'totales': totales,
+        'por_estado': por_estado,
+        'top_libros': list(top_libros),
+    }
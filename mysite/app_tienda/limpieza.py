@@ -0,0 +1,92 @@
+"""
+Borrado por lotes de datos caducados: carritos abandonados, entregas digitales
+caducadas y sesiones vencidas (comando purgar_caducados).
+
+Cada lote recorre un tramo acotado de la clave primaria: se busca la clave
+que está ``lote`` filas más allá del punto de control (solo el índice de la
+PK) y se borra con ``DELETE ... WHERE pk > desde AND pk <= hasta AND fecha <
+corte``. Ningún DELETE examina más de ``lote`` filas ni necesita un índice
+sobre la fecha, y la transacción de cada lote es corta, así que en SQLite el
+bloqueo de escritura dura poco. El punto de control se guarda en la misma
+transacción que el borrado: una ejecución interrumpida se reanuda con los
+mismos cortes desde el último lote confirmado.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CarritoItem, EntregaDigital, PuntoControl
+
+NOMBRE = 'purgar_caducados'
+
+# nombre -> (modelo, campo de fecha comparado con el corte)
+LIMPIEZAS = {
+    'carritos': (CarritoItem, 'fecha_actualizado'),
+    'entregas': (EntregaDigital, 'expiracion'),
+    'sesiones': (Session, 'expire_date'),
+}
+
+
+def punto_control():
+    return PuntoControl.objects.get_or_create(nombre=NOMBRE)[0]
+
+
+def en_curso(punto):
+    return punto.datos.get('fase') == 'borrando'
+
+
+def iniciar(punto, nombres, retencion=None):
+    """Fija los cortes de esta ejecución: ahora menos los días de retención de cada limpieza."""
+    dias = {**settings.LIMPIEZA_RETENCION_DIAS, **(retencion or {})}
+    ahora = timezone.now()
+    punto.datos = {
+        'fase': 'borrando',
+        'inicio': ahora.isoformat(),
+        'cortes': {nombre: (ahora - timedelta(days=dias[nombre])).isoformat() for nombre in nombres},
+        'pendientes': list(nombres),
+        'ultimo_pk': None,
+        'borrados': {nombre: 0 for nombre in nombres},
+    }
+    punto.save()
+
+
+def borrar_lote(punto, lote=1000):
+    """
+    Borra el siguiente tramo de ``lote`` claves de la limpieza en curso.
+    Devuelve (nombre, filas borradas) o None si no queda nada.
+    """
+    if not punto.datos['pendientes']:
+        return None
+    nombre = punto.datos['pendientes'][0]
+    modelo, campo = LIMPIEZAS[nombre]
+    corte = parse_datetime(punto.datos['cortes'][nombre])
+
+    tramo = modelo.objects.order_by('pk')
+    if punto.datos['ultimo_pk'] is not None:
+        tramo = tramo.filter(pk__gt=punto.datos['ultimo_pk'])
+    hasta = list(tramo.values_list('pk', flat=True)[lote - 1:lote])
+    if hasta:
+        tramo = tramo.filter(pk__lte=hasta[0])
+
+    with transaction.atomic():
+        borrados = tramo.filter(**{f'{campo}__lt': corte}).delete()[0]
+        punto.datos['borrados'][nombre] += borrados
+        if hasta:
+            punto.datos['ultimo_pk'] = hasta[0]
+        else:
+            # Último tramo (sin límite superior): se pasa a la siguiente limpieza.
+            punto.datos['pendientes'].pop(0)
+            punto.datos['ultimo_pk'] = None
+        punto.save()
+    return nombre, borrados
+
+
+def cerrar(punto):
+    punto.datos['fase'] = 'completada'
+    punto.datos['fin'] = timezone.now().isoformat()
+    punto.save()
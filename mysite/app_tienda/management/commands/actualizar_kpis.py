@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app_tienda import kpis
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los resúmenes diarios del panel para los últimos días y para los días '
+        'de creación de los pedidos modificados en ese periodo (pensado para cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=2, help='Días hacia atrás a recalcular, incluido hoy.')
+
+    def handle(self, *args, **options):
+        desde, hasta, anteriores = kpis.recalcular_recientes(options['dias'])
+        mensaje = f"KPIs recalculados del {desde} al {hasta}"
+        if anteriores:
+            mensaje += f" y de {len(anteriores)} día(s) anterior(es) con pedidos modificados"
+        self.stdout.write(self.style.SUCCESS(mensaje + '.'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from app_tienda import promociones
+
+
+class Command(BaseCommand):
+    help = 'Aplica las campañas que empiezan y revierte las que terminan (ejecutar desde cron cada minuto).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Muestra los cambios de precio sin aplicarlos.')
+        parser.add_argument('--limite', type=int, default=20, help='Filas de ejemplo por campaña en --dry-run.')
+
+    def handle(self, *args, **options):
+        por_revertir, por_aplicar = promociones.pendientes()
+
+        for campania in por_revertir:
+            if options['dry_run']:
+                total, filas = promociones.diferencias_revertir(campania, options['limite'])
+                self._diff(f"Revertir '{campania}'", total, filas)
+                continue
+            n = promociones.revertir(campania)
+            self.stdout.write(self.style.SUCCESS(f"Campaña '{campania}' revertida: {n} libros restaurados."))
+
+        for campania in por_aplicar:
+            if options['dry_run']:
+                total, filas = promociones.diferencias_aplicar(campania, options['limite'])
+                self._diff(f"Aplicar '{campania}'", total, filas)
+                continue
+            n = promociones.aplicar(campania)
+            self.stdout.write(self.style.SUCCESS(f"Campaña '{campania}' aplicada a {n} libros."))
+
+        if not por_revertir and not por_aplicar:
+            self.stdout.write("No hay campañas pendientes.")
+
+    def _diff(self, titulo, total, filas):
+        self.stdout.write(self.style.WARNING(f"{titulo}: {total} libros afectados"))
+        formato = lambda valor: '-' if valor is None else f'{valor:.2f}'
+        for libro_id, nombre, precio, actual, nuevo in filas:
+            self.stdout.write(
+                f"  #{libro_id} {nombre[:40]:<40} precio {precio:.2f}  oferta {formato(actual)} -> {formato(nuevo)}"
+            )
+        if total > len(filas):
+            self.stdout.write(f"  ... y {total - len(filas)} más.")
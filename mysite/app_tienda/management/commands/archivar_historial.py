@@ -0,0 +1,95 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from app_tienda import exportaciones, historial
+from app_tienda.models import HistorialPedido
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los eventos de HistorialPedido anteriores a una fecha a archivos '
+        'JSONL comprimidos (uno por mes) y los borra de la base de datos por lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses', type=int, default=12,
+            help='Meses completos que se conservan en la base de datos (además del actual).',
+        )
+        parser.add_argument('--antes-de', help='Archiva los meses anteriores a esta fecha (AAAA-MM-DD). Tiene prioridad sobre --meses.')
+        parser.add_argument('--destino', default=settings.HISTORIAL_ARCHIVO_DIR, help='Directorio de los archivos .jsonl.gz.')
+        parser.add_argument('--lote', type=int, default=5000, help='Eventos borrados por DELETE.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra qué meses se archivarían.')
+
+    def handle(self, *args, **options):
+        if options['antes_de']:
+            corte = parse_date(options['antes_de'])
+            if corte is None:
+                raise CommandError("Fecha inválida en --antes-de.")
+        else:
+            corte = timezone.localdate().replace(day=1)
+            for _ in range(options['meses']):
+                corte = (corte - timedelta(days=1)).replace(day=1)
+        # Solo se archivan meses completos.
+        corte = corte.replace(day=1)
+
+        primero = historial.particion_mas_antigua()
+        if primero is None or primero >= corte:
+            self.stdout.write(f"No hay eventos anteriores a {corte}.")
+            return
+
+        os.makedirs(options['destino'], exist_ok=True)
+        inicio = time.perf_counter()
+        total = 0
+        for desde, hasta in historial.particiones(primero, corte - timedelta(days=1)):
+            qs = exportaciones.construir_queryset('historial', desde, hasta - timedelta(days=1))
+            ultimo_id = qs.aggregate(m=Max('id'))['m']
+            if ultimo_id is None:
+                continue
+            # Lo insertado después de leer ultimo_id no entra en el archivo ni se borra.
+            qs = qs.filter(pk__lte=ultimo_id)
+            cantidad = qs.count()
+            if options['dry_run']:
+                self.stdout.write(f"  {desde:%Y-%m}: {cantidad} eventos")
+                total += cantidad
+                continue
+
+            ruta = self._escribir(qs, options['destino'], f"historial-{desde:%Y-%m}")
+            borrados = self._borrar(qs, options['lote'])
+            total += borrados
+            self.stdout.write(f"  {desde:%Y-%m}: {borrados} eventos -> {ruta}")
+
+        accion = "se archivarían" if options['dry_run'] else "archivados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} eventos {accion} en {time.perf_counter() - inicio:.1f}s."
+        ))
+
+    def _escribir(self, queryset, destino, base):
+        ruta = os.path.join(destino, f"{base}.jsonl.gz")
+        sufijo = 1
+        while os.path.exists(ruta):
+            sufijo += 1
+            ruta = os.path.join(destino, f"{base}.{sufijo}.jsonl.gz")
+        temporal = ruta + '.tmp'
+        bloques = exportaciones.filas('historial', queryset, 'jsonl')
+        with open(temporal, 'wb') as f:
+            for datos in exportaciones.codificar(bloques, comprimir=True):
+                f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        # El archivo queda completo en disco antes de borrar ninguna fila.
+        os.replace(temporal, ruta)
+        return ruta
+
+    def _borrar(self, queryset, lote):
+        borrados = 0
+        while ids := list(queryset.values_list('id', flat=True)[:lote]):
+            borrados += HistorialPedido.objects.filter(pk__in=ids).delete()[0]
+        return borrados
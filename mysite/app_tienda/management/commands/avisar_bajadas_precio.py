@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_tienda import avisos_precio
+
+
+class Command(BaseCommand):
+    help = (
+        'Detecta los libros que han bajado de precio desde la ejecución anterior y '
+        'encola un correo por usuario con los de su wishlist. Si se interrumpe, la '
+        'siguiente ejecución continúa desde el último lote confirmado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=500, help='Usuarios avisados por lote.')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos de espera entre lotes.')
+        parser.add_argument(
+            '--max-lotes', type=int, default=None,
+            help='Termina tras este número de lotes; la siguiente ejecución continúa donde se quedó.',
+        )
+
+    def handle(self, *args, **options):
+        punto = avisos_precio.punto_control()
+        inicio = time.perf_counter()
+        if avisos_precio.en_curso(punto):
+            self.stdout.write(
+                f"Reanudando la ejecución del {punto.datos['inicio']} "
+                f"desde el usuario {punto.datos['ultimo_usuario']}."
+            )
+        else:
+            avisos_precio.preparar(punto)
+            self.stdout.write(f"Precios tomados ({punto.datos['altas']} libros nuevos sin precio anterior).")
+
+        lotes = 0
+        while options['max_lotes'] is None or lotes < options['max_lotes']:
+            if not avisos_precio.avisar_lote(punto, options['usuarios']):
+                avisos_precio.cerrar(punto)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{punto.datos['usuarios']} avisos encolados ({punto.datos['libros']} libros) "
+                    f"en {time.perf_counter() - inicio:.1f}s."
+                ))
+                return
+            lotes += 1
+            self.stdout.write(f"  lote {lotes}: hasta el usuario {punto.datos['ultimo_usuario']}")
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(
+            f"Detenido tras {lotes} lotes en el usuario {punto.datos['ultimo_usuario']}; "
+            f"la siguiente ejecución continuará desde ahí."
+        )
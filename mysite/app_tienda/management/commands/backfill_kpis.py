@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from app_tienda import kpis
+from app_tienda.models import Pedido, Usuario
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios del panel sobre todo el historial, por bloques de días.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD). Por defecto, el primer pedido o registro.')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD). Por defecto, hoy.')
+        parser.add_argument('--bloque', type=int, default=31, help='Días recalculados por transacción.')
+
+    def handle(self, *args, **options):
+        hasta = parse_date(options['hasta']) if options['hasta'] else timezone.localdate()
+        if options['desde']:
+            desde = parse_date(options['desde'])
+        else:
+            primeros = [
+                Pedido.objects.aggregate(m=Min('fecha_creacion'))['m'],
+                Usuario.objects.aggregate(m=Min('fecha_registro'))['m'],
+            ]
+            primeros = [timezone.localdate(f) for f in primeros if f]
+            if not primeros:
+                self.stdout.write("No hay datos que agregar.")
+                return
+            desde = min(primeros)
+        if desde is None or hasta is None or desde > hasta:
+            raise CommandError("Rango de fechas inválido.")
+
+        inicio = time.perf_counter()
+        total = 0
+        actual = desde
+        while actual <= hasta:
+            fin_bloque = min(actual + timedelta(days=options['bloque'] - 1), hasta)
+            total += kpis.recalcular_rango(actual, fin_bloque)
+            self.stdout.write(f"  {actual} -> {fin_bloque}")
+            actual = fin_bloque + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill completado: {total} días con actividad en {time.perf_counter() - inicio:.1f}s."
+        ))
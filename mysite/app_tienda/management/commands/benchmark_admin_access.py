@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from app_tienda.middleware.admin_access_middleware import AdminAccessMiddleware
+from app_tienda.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Microbenchmark del coste por petición de AdminAccessMiddleware sobre '
+        'SessionMiddleware + AuthenticationMiddleware, en rutas públicas y de administración.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=20000, help='Peticiones por caso.')
+
+    def handle(self, *args, **options):
+        iteraciones = options['iteraciones']
+        factory = RequestFactory()
+
+        vista = lambda request: HttpResponse('ok')
+        sin_middleware = SessionMiddleware(AuthenticationMiddleware(vista))
+        con_middleware = SessionMiddleware(AuthenticationMiddleware(AdminAccessMiddleware(vista)))
+
+        # Sesión de un administrador para las rutas protegidas.
+        admin = Usuario.objects.filter(tipo_usuario='administrador').first() or Usuario.objects.filter(is_staff=True).first()
+        cookie = None
+        if admin:
+            request = factory.get('/')
+            SessionMiddleware(lambda r: HttpResponse())(request)
+            login(request, admin, backend='app_tienda.backends.EmailOUsuarioBackend')
+            request.session.save()
+            cookie = request.session.session_key
+
+        casos = [('/catalogo/', None), ('/libro/un-libro/', None), ('/admin-dashboard/', None)]
+        if cookie:
+            casos.append(('/admin-dashboard/', cookie))
+
+        self.stdout.write(f"{'Ruta':<22}{'Sesión':<8}{'sin (µs)':>10}{'con (µs)':>10}{'extra (µs)':>12}{'consultas':>11}")
+        for ruta, sesion in casos:
+            base = self._medir(sin_middleware, factory, ruta, sesion, iteraciones)
+            medido = self._medir(con_middleware, factory, ruta, sesion, iteraciones)
+            with CaptureQueriesContext(connection) as consultas:
+                self._peticion(con_middleware, factory, ruta, sesion)
+            self.stdout.write(
+                f"{ruta:<22}{'admin' if sesion else '-':<8}{base:>10.2f}{medido:>10.2f}"
+                f"{medido - base:>12.2f}{len(consultas):>11}"
+            )
+
+    def _peticion(self, cadena, factory, ruta, sesion):
+        request = factory.get(ruta)
+        if sesion:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = sesion
+        return cadena(request)
+
+    def _medir(self, cadena, factory, ruta, sesion, iteraciones):
+        self._peticion(cadena, factory, ruta, sesion)  # calienta caché y decisión
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            self._peticion(cadena, factory, ruta, sesion)
+        return (time.perf_counter() - inicio) / iteraciones * 1e6
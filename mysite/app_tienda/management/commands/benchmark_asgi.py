@@ -0,0 +1,114 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la capacidad con muchas conexiones concurrentes del camino ASGI '
+        '(uvicorn + vistas async) frente al WSGI (servidor con un hilo por conexión '
+        'de runserver). Requiere el paquete uvicorn.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ruta', default='/catalogo/', help='Ruta a solicitar.')
+        parser.add_argument(
+            '--conexiones', default='10,50,200',
+            help='Niveles de conexiones concurrentes, separados por comas.',
+        )
+        parser.add_argument('--duracion', type=float, default=5.0, help='Segundos por nivel.')
+        parser.add_argument('--puerto', type=int, default=8765, help='Puerto base para los servidores.')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError("Este benchmark necesita uvicorn: pip install uvicorn")
+        niveles = [int(n) for n in options['conexiones'].split(',')]
+        puerto = options['puerto']
+
+        servidores = {
+            'WSGI': [sys.executable, '-m', 'django', 'runserver', f'127.0.0.1:{puerto}', '--noreload'],
+            'ASGI': [
+                sys.executable, '-m', 'uvicorn', 'mysite.asgi:application',
+                '--host', '127.0.0.1', '--port', str(puerto + 1), '--log-level', 'warning',
+            ],
+        }
+        puertos = {'WSGI': puerto, 'ASGI': puerto + 1}
+
+        self.stdout.write(
+            f"Ruta: {options['ruta']} | {options['duracion']:.0f}s por nivel | "
+            f"Settings: {settings.SETTINGS_MODULE}"
+        )
+        self.stdout.write(f"{'Servidor':<10}{'Conexiones':>11}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errores':>9}")
+        for nombre, comando in servidores.items():
+            proceso = subprocess.Popen(
+                comando, cwd=settings.BASE_DIR, env=os.environ.copy(),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                self._esperar_puerto(puertos[nombre])
+                for conexiones in niveles:
+                    resultado = asyncio.run(
+                        self._carga(puertos[nombre], options['ruta'], conexiones, options['duracion'])
+                    )
+                    self.stdout.write(
+                        f"{nombre:<10}{conexiones:>11}{resultado['rps']:>10.1f}"
+                        f"{resultado['p50']:>10.1f}{resultado['p95']:>10.1f}{resultado['errores']:>9}"
+                    )
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=10)
+
+    def _esperar_puerto(self, puerto, limite=30):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            try:
+                with socket.create_connection(('127.0.0.1', puerto), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"El servidor no respondió en el puerto {puerto}.")
+
+    async def _carga(self, puerto, ruta, conexiones, duracion):
+        peticion = (
+            f"GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n"
+        ).encode()
+        latencias = []
+        errores = 0
+        fin = time.monotonic() + duracion
+
+        async def cliente():
+            nonlocal errores
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', puerto)
+                    writer.write(peticion)
+                    await writer.drain()
+                    respuesta = await reader.read()
+                    writer.close()
+                    if not respuesta.startswith(b'HTTP/1.1 200') and not respuesta.startswith(b'HTTP/1.0 200'):
+                        errores += 1
+                        continue
+                except OSError:
+                    errores += 1
+                    continue
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(conexiones)))
+        transcurrido = time.perf_counter() - inicio
+        latencias.sort()
+        return {
+            'rps': len(latencias) / transcurrido,
+            'p50': statistics.median(latencias) if latencias else 0.0,
+            'p95': latencias[int(len(latencias) * 0.95) - 1] if latencias else 0.0,
+            'errores': errores,
+        }
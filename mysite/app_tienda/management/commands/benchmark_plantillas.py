@@ -0,0 +1,82 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app_tienda.models import Libro
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el tiempo de generación de las páginas públicas con y sin la caché '
+        'de fragmentos de plantilla ({% cache %} de tarjetas, menú y pie).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=10000, help='Peticiones por página y modo.')
+
+    def handle(self, *args, **options):
+        peticiones = options['peticiones']
+
+        libro = Libro.objects.filter(activo=True).only('slug').first()
+        if libro is None:
+            self.stderr.write('No hay libros activos; ejecuta populate_books primero.')
+            return
+
+        paginas = {
+            'index': reverse('app_tienda:index'),
+            'catalogo': reverse('app_tienda:catalogo'),
+            'detalle_libro': reverse('app_tienda:detalle_libro', args=[libro.slug]),
+            'ofertas': reverse('app_tienda:ofertas'),
+        }
+
+        # Sin alias 'template_fragments' el tag {% cache %} usa 'default'; con
+        # una DummyCache en ese alias los fragmentos se generan siempre.
+        sin_fragmentos = {
+            **settings.CACHES,
+            'template_fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }
+        modos = {
+            'sin fragmentos': override_settings(CACHES=sin_fragmentos),
+            'con fragmentos': override_settings(CACHES=settings.CACHES),
+        }
+
+        self.stdout.write(f"Settings: {settings.SETTINGS_MODULE} | {peticiones} peticiones por página")
+        resultados = {}
+        for modo, ajustes in modos.items():
+            with ajustes:
+                caches['default'].clear()
+                for nombre, url in paginas.items():
+                    resultados[nombre, modo] = self._medir(url, peticiones)
+
+        for nombre in paginas:
+            linea = [f'  {nombre:<15}']
+            for modo in modos:
+                ms, consultas = resultados[nombre, modo]
+                linea.append(f'{modo}: {ms:7.2f} ms/pág {consultas:3d} consultas')
+            antes, despues = resultados[nombre, 'sin fragmentos'][0], resultados[nombre, 'con fragmentos'][0]
+            linea.append(f'x{antes / despues:.2f}')
+            self.stdout.write('  '.join(linea))
+
+    def _medir(self, url, peticiones):
+        # Sin cookie de sesión ni If-None-Match: cada petición genera la página
+        # completa, como la primera visita de un anónimo o el origen de una CDN.
+        client = Client()
+        client.get(url)
+        with ExitStack() as pila:
+            # Las páginas públicas leen de la réplica si está configurada.
+            consultas = [pila.enter_context(CaptureQueriesContext(conexion)) for conexion in connections.all()]
+            client.get(url)
+        # Se cuenta ya: cada petición posterior vacía el registro de consultas.
+        num_consultas = sum(len(captura) for captura in consultas)
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            client.get(url)
+        duracion = time.perf_counter() - inicio
+        return duracion * 1000 / peticiones, num_consultas
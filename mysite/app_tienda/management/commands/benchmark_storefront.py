@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from app_tienda.models import Libro, Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el throughput (peticiones/segundo) de los flujos principales de la tienda. '
+        'Ejecutar con distintos DJANGO_SETTINGS_MODULE para comparar configuraciones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=300, help='Peticiones por flujo.')
+        parser.add_argument('--hilos', type=int, default=4, help='Clientes concurrentes.')
+        parser.add_argument(
+            '--con-escrituras', action='store_true',
+            help='Incluye un flujo autenticado que escribe en el carrito (crea el usuario bench@example.com).',
+        )
+
+    def handle(self, *args, **options):
+        peticiones = options['peticiones']
+        hilos = options['hilos']
+
+        # detalle_libro.html usa portada.url sin comprobarla: un libro sin portada da 500
+        libros = list(Libro.objects.filter(activo=True).exclude(portada='').values_list('id', 'slug')[:20])
+        if not libros:
+            self.stderr.write('No hay libros activos; ejecuta populate_books primero.')
+            return
+
+        flujos = {
+            'index': [reverse('app_tienda:index')],
+            'catalogo': [
+                reverse('app_tienda:catalogo'),
+                reverse('app_tienda:catalogo') + '?orden=precio_asc',
+                reverse('app_tienda:catalogo') + '?q=el',
+            ],
+            'detalle_libro': [reverse('app_tienda:detalle_libro', args=[slug]) for _, slug in libros],
+            'ofertas': [reverse('app_tienda:ofertas')],
+        }
+
+        usuario = None
+        if options['con_escrituras']:
+            usuario, _ = Usuario.objects.get_or_create(
+                email='bench@example.com', defaults={'username': 'bench'}
+            )
+            flujos['carrito'] = [reverse('app_tienda:agregar_al_carrito', args=[libro_id]) for libro_id, _ in libros]
+
+        # La primera petición de cada flujo calienta plantillas y conexiones.
+        self._ejecutar(flujos, 1, 1, usuario)
+        connection.close()
+
+        motor = settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1]
+        self.stdout.write(
+            f"Settings: {settings.SETTINGS_MODULE} | BD: {motor} | DEBUG={settings.DEBUG} | "
+            f"{peticiones} peticiones x {hilos} hilos"
+        )
+        resultados = self._ejecutar(flujos, peticiones, hilos, usuario)
+        for nombre, (duracion, errores) in resultados.items():
+            self.stdout.write(
+                f"  {nombre:<15} {peticiones / duracion:8.1f} req/s  "
+                f"{duracion * 1000 / peticiones:7.2f} ms/req  errores={errores}"
+            )
+
+        if usuario is not None:
+            usuario.carrito.all().delete()
+
+    def _ejecutar(self, flujos, peticiones, hilos, usuario):
+        resultados = {}
+        for nombre, urls in flujos.items():
+            por_hilo = [peticiones // hilos + (1 if i < peticiones % hilos else 0) for i in range(hilos)]
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                errores = sum(pool.map(lambda n: self._cliente(urls, n, usuario), por_hilo))
+            resultados[nombre] = (time.perf_counter() - inicio, errores)
+        return resultados
+
+    def _host(self):
+        # Con el Host por defecto de Client ('testserver') settings_production
+        # respondería 400 DisallowedHost a todo.
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'testserver'
+        return 'testserver' if host == '*' else host.lstrip('.')
+
+    def _cliente(self, urls, n, usuario):
+        client = Client(raise_request_exception=False, HTTP_HOST=self._host())
+        if usuario is not None:
+            client.force_login(usuario)
+        errores = 0
+        try:
+            for i in range(n):
+                respuesta = client.get(urls[i % len(urls)])
+                # Un 4xx (host no permitido, 404, rate limit) tampoco mide la página
+                if not 200 <= respuesta.status_code < 400:
+                    errores += 1
+        finally:
+            connections.close_all()
+        return errores
@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from app_tienda import exportaciones
+
+
+class Command(BaseCommand):
+    help = 'Exporta pedidos, detalles, usuarios, libros o historial en CSV/JSONL con memoria constante.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recurso', choices=sorted(exportaciones.EXPORTACIONES))
+        parser.add_argument('--formato', choices=exportaciones.FORMATOS, default='csv')
+        parser.add_argument('--desde', help='Fecha inicial inclusive (AAAA-MM-DD).')
+        parser.add_argument('--hasta', help='Fecha final inclusive (AAAA-MM-DD).')
+        parser.add_argument('--estado', help='Filtra pedidos/detalles por estado.')
+        parser.add_argument('--gzip', action='store_true', help='Comprime la salida en gzip.')
+        parser.add_argument('--salida', default='-', help='Archivo de destino ("-" para stdout).')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = exportaciones.construir_queryset(
+                options['recurso'],
+                desde=parse_date(options['desde']) if options['desde'] else None,
+                hasta=parse_date(options['hasta']) if options['hasta'] else None,
+                estado=options['estado'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        bloques = exportaciones.filas(options['recurso'], queryset, options['formato'])
+        inicio = time.perf_counter()
+        escritos = 0
+        destino = sys.stdout.buffer if options['salida'] == '-' else open(options['salida'], 'wb')
+        try:
+            for datos in exportaciones.codificar(bloques, options['gzip']):
+                destino.write(datos)
+                escritos += len(datos)
+        finally:
+            if destino is not sys.stdout.buffer:
+                destino.close()
+
+        if options['salida'] != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f"{options['salida']}: {escritos} bytes en {time.perf_counter() - inicio:.1f}s."
+            ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_tienda.importacion import LECTORES, ImportadorCatalogo
+
+
+class Command(BaseCommand):
+    help = 'Importa (alta o actualización por ISBN) un catálogo de editorial en CSV u ONIX 3.0.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta al archivo CSV u ONIX.')
+        parser.add_argument('--formato', choices=sorted(LECTORES), default='csv')
+        parser.add_argument('--medios', help='Directorio local con portadas y archivos referenciados en el feed.')
+        parser.add_argument('--lote', type=int, default=500, help='Filas por INSERT/UPSERT.')
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos para copiar portadas y archivos.')
+        parser.add_argument('--dry-run', action='store_true', help='Valida y muestra el informe sin escribir nada.')
+
+    def handle(self, *args, **options):
+        importador = ImportadorCatalogo(
+            medios_dir=options['medios'],
+            tamanio_lote=options['lote'],
+            hilos=options['hilos'],
+            dry_run=options['dry_run'],
+            progreso=self._progreso,
+        )
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                informe = importador.importar(archivo, options['formato'])
+        except OSError as e:
+            raise CommandError(e)
+
+        titulo = "Simulación" if informe.dry_run else "Importación"
+        self.stdout.write(self.style.SUCCESS(
+            f"{titulo} terminada: {informe.leidas} filas, {informe.creadas} nuevas, "
+            f"{informe.actualizadas} actualizadas, {len(informe.invalidas)} inválidas "
+            f"({informe.filas_por_segundo():.0f} filas/s)."
+        ))
+        if informe.categorias_nuevas:
+            self.stdout.write(f"Categorías nuevas: {', '.join(sorted(informe.categorias_nuevas))}")
+        for numero, isbn, errores in informe.invalidas[:50]:
+            self.stdout.write(self.style.WARNING(f"  fila {numero} ({isbn or 'sin ISBN'}): {errores}"))
+        if len(informe.invalidas) > 50:
+            self.stdout.write(f"  ... y {len(informe.invalidas) - 50} filas inválidas más.")
+        for isbn, ruta in informe.medios_faltantes[:50]:
+            self.stdout.write(self.style.WARNING(f"  {isbn}: no se encontró {ruta}"))
+
+    def _progreso(self, informe):
+        self.stdout.write(f"  {informe.leidas} filas leídas, {informe.validas} procesadas...")
@@ -4,9 +4,11 @@ from datetime import timedelta
 from decimal import Decimal
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 
+from app_tienda import estados, historial
 from app_tienda.models import (
     Usuario, Categoria, Libro, CarritoItem, Pedido, DetallePedido,
     EntregaDigital, Resena, Wishlist, Cupon, HistorialPedido
@@ -164,53 +166,47 @@ class Command(BaseCommand):
         # --- 7. Create Pedidos, Detalles, Entregas y Historial ---
         self.stdout.write("Creating 10 Pedidos with all related items...")
         for i in range(10):
-            usuario_pedido = random.choice(usuarios)
-            
-            # Create Pedido
-            pedido = Pedido.objects.create(
-                usuario=usuario_pedido,
-                estado=random.choice(['pagado', 'completado']),
-                metodo_pago=random.choice(['simulado', 'paypal']),
-            )
-            HistorialPedido.objects.create(
-                pedido=pedido,
-                usuario=usuario_pedido,
-                accion="Pedido Creado",
-                descripcion="El pedido fue creado por el cliente."
-            )
-            
-            # Create Detalles de Pedido (1 a 3 libros por pedido)
-            libros_en_pedido = random.sample(libros, random.randint(1, 3))
-            for libro_pedido in libros_en_pedido:
-                cantidad = random.randint(1, 2)
-                precio = libro_pedido.precio_actual()
-                DetallePedido.objects.create(
-                    pedido=pedido,
-                    libro=libro_pedido,
-                    cantidad=cantidad,
-                    precio_unitario=precio,
-                    precio_total=precio * cantidad
+            # All history events of an order are inserted together.
+            with transaction.atomic(), historial.agrupar():
+                usuario_pedido = random.choice(usuarios)
+                estado_final = random.choice(['pagado', 'completado'])
+
+                # Create Pedido (the state machine only reaches pagado from pendiente_pago)
+                pedido = Pedido.objects.create(
+                    usuario=usuario_pedido,
+                    estado='pendiente_pago',
+                    metodo_pago=random.choice(['simulado', 'paypal']),
                 )
-                
-                # Create Entrega Digital for each item
-                if pedido.estado in ['pagado', 'completado']:
-                    EntregaDigital.objects.create(
+                historial.registrar(pedido, 'creado', 'El pedido fue creado por el cliente.', usuario_pedido)
+
+                # Create Detalles de Pedido (1 a 3 libros por pedido)
+                libros_en_pedido = random.sample(libros, random.randint(1, 3))
+                for libro_pedido in libros_en_pedido:
+                    cantidad = random.randint(1, 2)
+                    precio = libro_pedido.precio_actual()
+                    DetallePedido.objects.create(
                         pedido=pedido,
                         libro=libro_pedido,
-                        usuario=usuario_pedido,
-                        expiracion=timezone.now() + timedelta(days=365)
+                        cantidad=cantidad,
+                        precio_unitario=precio,
+                        precio_total=precio * cantidad
                     )
 
-            # Update Pedido totals and status
-            pedido.calcular_totales()
-            if pedido.estado in ['pagado', 'completado']:
+                    # Create Entrega Digital for each item
+                    if estado_final in ['pagado', 'completado']:
+                        EntregaDigital.objects.create(
+                            pedido=pedido,
+                            libro=libro_pedido,
+                            usuario=usuario_pedido,
+                            expiracion=timezone.now() + timedelta(days=365)
+                        )
+
+                # Update Pedido totals and status
+                # (each transition records its own HistorialPedido event)
+                pedido.calcular_totales()
                 pedido.marcar_como_pagado()
-                HistorialPedido.objects.create(
-                    pedido=pedido,
-                    usuario=None,
-                    accion="Pago Confirmado",
-                    descripcion=f"El pago fue confirmado a través de {pedido.metodo_pago}."
-                )
+                if estado_final == 'completado':
+                    estados.transicionar(pedido, 'completado')
 
         self.stdout.write(self.style.SUCCESS("Pedidos, Detalles, Entregas and Historial created."))
         self.stdout.write(self.style.SUCCESS("Database population complete!"))
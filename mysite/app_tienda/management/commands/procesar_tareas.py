@@ -0,0 +1,56 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from app_tienda import tareas
+
+
+class Command(BaseCommand):
+    help = (
+        'Trabajador de la cola de tareas: envía correos de confirmación, crea las '
+        'entregas de pedidos grandes y envía los avisos de bajada de precio.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prioridades', default='alta,normal,baja',
+            help='Carriles que atiende este trabajador, separados por comas (alta, normal, baja).',
+        )
+        parser.add_argument('--lote', type=int, default=10, help='Tareas reclamadas por iteración.')
+        parser.add_argument('--pausa', type=float, default=2.0, help='Segundos de espera cuando no hay tareas.')
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina (útil en cron y pruebas).')
+
+    def handle(self, *args, **options):
+        try:
+            prioridades = [tareas.PRIORIDADES[p.strip()] for p in options['prioridades'].split(',')]
+        except KeyError as e:
+            raise CommandError(f"Prioridad desconocida: {e.args[0]}")
+
+        self.detener = False
+        signal.signal(signal.SIGTERM, self._detener)
+        signal.signal(signal.SIGINT, self._detener)
+
+        trabajador = tareas.nombre_trabajador()
+        self.stdout.write(f"Trabajador {trabajador} atendiendo prioridades {options['prioridades']}")
+        total_ok = total_error = 0
+        while not self.detener:
+            close_old_connections()
+            completadas, errores = tareas.procesar_pendientes(trabajador, options['lote'], prioridades)
+            total_ok += completadas
+            total_error += errores
+            if completadas or errores:
+                self.stdout.write(f"  {completadas} completadas, {errores} con error")
+            elif options['una_vez']:
+                break
+            else:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Trabajador detenido: {total_ok} tareas completadas, {total_error} con error."
+        ))
+
+    def _detener(self, signum, frame):
+        # Termina la tarea en curso y sale en la siguiente iteración.
+        self.detener = True
@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_tienda import limpieza
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra carritos abandonados, entregas digitales caducadas y sesiones vencidas '
+        'por tramos acotados de clave primaria, con una pausa entre lotes. Si se '
+        'interrumpe, la siguiente ejecución continúa desde el último lote confirmado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'limpiezas', nargs='*',
+            help=f"Limpiezas a ejecutar: {', '.join(limpieza.LIMPIEZAS)} (todas si no se indica ninguna).",
+        )
+        parser.add_argument('--lote', type=int, default=1000, help='Claves primarias recorridas por DELETE.')
+        parser.add_argument('--pausa', type=float, default=0.1, help='Segundos de espera entre lotes.')
+        parser.add_argument(
+            '--retencion', action='append', default=[], metavar='NOMBRE=DIAS',
+            help='Días de retención para una limpieza; sustituye a LIMPIEZA_RETENCION_DIAS. Repetible.',
+        )
+        parser.add_argument(
+            '--max-lotes', type=int, default=None,
+            help='Termina tras este número de lotes; la siguiente ejecución continúa donde se quedó.',
+        )
+
+    def handle(self, *args, **options):
+        desconocidas = set(options['limpiezas']) - set(limpieza.LIMPIEZAS)
+        if desconocidas:
+            raise CommandError(f"Limpiezas desconocidas: {', '.join(sorted(desconocidas))}.")
+        retencion = {}
+        for valor in options['retencion']:
+            nombre, _, dias = valor.partition('=')
+            if nombre not in limpieza.LIMPIEZAS or not dias.isdigit():
+                raise CommandError(f"--retencion no válida: {valor!r} (se espera NOMBRE=DIAS).")
+            retencion[nombre] = int(dias)
+
+        punto = limpieza.punto_control()
+        if limpieza.en_curso(punto):
+            self.stdout.write(
+                f"Reanudando la ejecución del {punto.datos['inicio']} en "
+                f"'{punto.datos['pendientes'][0]}' desde la clave {punto.datos['ultimo_pk']}."
+            )
+        else:
+            limpieza.iniciar(punto, options['limpiezas'] or list(limpieza.LIMPIEZAS), retencion)
+            for nombre, corte in punto.datos['cortes'].items():
+                self.stdout.write(f"  {nombre}: anteriores a {corte}")
+
+        # Solo cuenta el tiempo de los DELETE, no las pausas.
+        segundos = dict.fromkeys(punto.datos['borrados'], 0.0)
+        filas = dict.fromkeys(punto.datos['borrados'], 0)
+        lotes = 0
+        while options['max_lotes'] is None or lotes < options['max_lotes']:
+            inicio = time.perf_counter()
+            resultado = limpieza.borrar_lote(punto, options['lote'])
+            if resultado is None:
+                limpieza.cerrar(punto)
+                self._informe(filas, segundos)
+                return
+            nombre, borrados = resultado
+            segundos[nombre] += time.perf_counter() - inicio
+            filas[nombre] += borrados
+            lotes += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  lote {lotes}: {nombre}, {borrados} filas borradas")
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self._informe(filas, segundos)
+        if not punto.datos['pendientes']:
+            limpieza.cerrar(punto)
+            return
+        self.stdout.write(
+            f"Detenido tras {lotes} lotes en '{punto.datos['pendientes'][0]}'; "
+            f"la siguiente ejecución continuará desde ahí."
+        )
+
+    def _informe(self, filas, segundos):
+        for nombre in filas:
+            ritmo = filas[nombre] / segundos[nombre] if segundos[nombre] else 0
+            self.stdout.write(f"  {nombre}: {filas[nombre]} filas en {segundos[nombre]:.2f}s ({ritmo:,.0f} filas/s)")
+        total, tiempo = sum(filas.values()), sum(segundos.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} filas borradas en {tiempo:.2f}s ({total / tiempo if tiempo else 0:,.0f} filas/s)."
+        ))
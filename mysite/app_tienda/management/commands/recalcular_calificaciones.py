@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_tienda import calificaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula num_resenas, calificacion_media y el histograma de todos los '
+        'libros a partir de las reseñas aprobadas y corrige los que no coinciden.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Libros por consulta y por bulk_update.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        corregidos = calificaciones.recalcular(options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{corregidos} libros corregidos en {time.perf_counter() - inicio:.1f}s."
+        ))
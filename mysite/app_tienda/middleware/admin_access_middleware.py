@@ -1,15 +1,90 @@
+import re
+import time
 
-from django.shortcuts import redirect
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.db.models.signals import post_save
 from django.urls import reverse
 
+# Clave de sesión con la decisión cacheada: [id de usuario, hash de sesión, es_admin, caduca, tomada].
+CLAVE_DECISION = '_acceso_admin'
+
+
+def _clave_cambio(usuario_id):
+    return f'acceso_admin:cambio:{usuario_id}'
+
+
+def _usuario_modificado(sender, instance, **kwargs):
+    # Al guardar un usuario (p. ej. al quitarle is_staff) se descartan sus
+    # decisiones anteriores en todas sus sesiones.
+    cache.set(
+        _clave_cambio(instance.pk), time.time(),
+        getattr(settings, 'ADMIN_DECISION_SEGUNDOS', 60),
+    )
+
+
+def conectar_senales():
+    post_save.connect(_usuario_modificado, sender=settings.AUTH_USER_MODEL, dispatch_uid='acceso_admin:usuario')
+
+
 class AdminAccessMiddleware:
+    """
+    Restringe a administradores el admin de Django (/admin/) y las vistas
+    propias /admin-*/. Las rutas se comparan con una única expresión regular
+    compilada al arrancar; en las rutas públicas no se toca request.user ni la
+    sesión. En las protegidas la decisión se guarda en la sesión durante
+    ADMIN_DECISION_SEGUNDOS, así que solo se carga el usuario al caducar, al
+    cambiar de usuario o de hash de sesión o al guardarse el usuario.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        prefijos = getattr(settings, 'ADMIN_PREFIJOS_PROTEGIDOS', ('/admin/', '/admin-'))
+        self.patron = re.compile('|'.join(re.escape(prefijo) for prefijo in prefijos))
+        self.vigencia = getattr(settings, 'ADMIN_DECISION_SEGUNDOS', 60)
+        self.login_url = None
 
     def __call__(self, request):
-        if request.path.startswith('/admin/'):
-            if not request.user.is_authenticated or not request.user.es_administrador():
-                return redirect(reverse('app_tienda:login_view') + '?next=' + request.path)
-        
-        response = self.get_response(request)
-        return response
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.patron.match(request.path_info) and not self._es_administrador(request):
+            return self._redirigir(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.patron.match(request.path_info) and not await sync_to_async(self._es_administrador)(request):
+            return self._redirigir(request)
+        return await self.get_response(request)
+
+    def _redirigir(self, request):
+        if self.login_url is None:
+            self.login_url = reverse(settings.LOGIN_URL)
+        return redirect_to_login(request.get_full_path(), self.login_url)
+
+    def _es_administrador(self, request):
+        session = request.session
+        usuario_id = session.get(SESSION_KEY)
+        if usuario_id is None:
+            return False
+        hash_sesion = session.get(HASH_SESSION_KEY)
+        decision = session.get(CLAVE_DECISION)
+        ahora = time.time()
+        if (
+            decision and len(decision) == 5
+            and decision[:2] == [usuario_id, hash_sesion] and decision[3] > ahora
+            and decision[4] > cache.get(_clave_cambio(usuario_id), 0)
+        ):
+            return decision[2]
+
+        user = request.user
+        es_admin = user.is_authenticated and user.es_administrador()
+        session[CLAVE_DECISION] = [usuario_id, hash_sesion, es_admin, ahora + self.vigencia, ahora]
+        return es_admin
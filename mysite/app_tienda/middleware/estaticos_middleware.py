@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from app_tienda.estaticos import responder
+
+
+class EstaticosMiddleware(MiddlewareMixin):
+    """
+    Sirve STATIC_URL desde STATIC_ROOT antes de cargar sesión, usuario o
+    vistas, con la copia precomprimida que acepte el cliente (ver
+    app_tienda/estaticos.py). Solo actúa con ESTATICOS_SERVIR activado; en
+    desarrollo los estáticos los sirve runserver.
+    """
+
+    def process_request(self, request):
+        if not settings.ESTATICOS_SERVIR or request.method not in ('GET', 'HEAD'):
+            return None
+        prefijo = settings.STATIC_URL
+        if not request.path_info.startswith(prefijo):
+            return None
+        return responder(request, request.path_info[len(prefijo):])
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from app_tienda.ratelimit import comprobar, respuesta_429
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Aplica las políticas de settings.RATELIMIT_RUTAS ({'app:nombre_url': 'politica'})
+    antes de ejecutar la vista. Solo usa datos de la petición, así que la
+    sesión y el usuario no se llegan a cargar cuando se rechaza.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.rutas = getattr(settings, 'RATELIMIT_RUTAS', {})
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        politica = self.rutas.get(request.resolver_match.view_name)
+        if politica is None:
+            return None
+        espera = comprobar(politica, request, **view_kwargs)
+        if espera is not None:
+            return respuesta_429(espera)
+        return None
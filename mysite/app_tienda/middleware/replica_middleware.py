@@ -0,0 +1,56 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from app_tienda.routers import (
+    estado_actual, iniciar_estado, nueva_fijacion, primario_fijado_hasta, restaurar_estado,
+)
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Fija al primario las lecturas de un cliente durante
+    REPLICA_STICKY_SECONDS después de cualquier escritura, para que
+    checkout -> pedido_confirmacion vea siempre el pedido recién creado.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = iniciar_estado(primario=primario_fijado_hasta(request) > time.time())
+        try:
+            response = self.get_response(request)
+            self._fijar(response)
+        finally:
+            restaurar_estado(token)
+        return response
+
+    async def __acall__(self, request):
+        # El estado vive en una ContextVar, que sync_to_async copia a los hilos del ORM.
+        token = iniciar_estado(primario=primario_fijado_hasta(request) > time.time())
+        try:
+            response = await self.get_response(request)
+            self._fijar(response)
+        finally:
+            restaurar_estado(token)
+        return response
+
+    def _fijar(self, response):
+        if estado_actual()['escritura']:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                f'{nueva_fijacion():.3f}',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
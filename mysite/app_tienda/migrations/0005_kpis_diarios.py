@@ -0,0 +1,60 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0004_alter_historialpedido_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('nuevos_usuarios', models.PositiveIntegerField(default=0)),
+                ('descargas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PedidosEstadoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente_pago', 'Pendiente de pago'), ('pagado', 'Pagado'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('reembolsado', 'Reembolsado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Pedidos por estado (diario)',
+                'verbose_name_plural': 'Pedidos por estado (diario)',
+                'unique_together': {('fecha', 'estado')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaLibroDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='app_tienda.libro')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por libro',
+                'verbose_name_plural': 'Ventas diarias por libro',
+                'unique_together': {('fecha', 'libro')},
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:22
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0005_kpis_diarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campania',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=150)),
+                ('tipo_descuento', models.CharField(choices=[('porcentaje', 'Porcentaje'), ('fijo', 'Fijo')], max_length=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('fecha_inicio', models.DateTimeField()),
+                ('fecha_fin', models.DateTimeField()),
+                ('activo', models.BooleanField(default=True)),
+                ('estado', models.CharField(choices=[('programada', 'Programada'), ('activa', 'Activa'), ('finalizada', 'Finalizada')], default='programada', editable=False, max_length=20)),
+                ('autores', models.TextField(blank=True, help_text='Un autor por línea (coincidencia exacta, sin distinguir mayúsculas).')),
+                ('fecha_aplicada', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('fecha_revertida', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('categorias', models.ManyToManyField(blank=True, related_name='campanias', to='app_tienda.categoria')),
+                ('libros', models.ManyToManyField(blank=True, related_name='campanias', to='app_tienda.libro')),
+            ],
+            options={
+                'verbose_name': 'Campaña',
+                'verbose_name_plural': 'Campañas',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaniaLibro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_descuento_anterior', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('en_oferta_anterior', models.BooleanField(default=False)),
+                ('campania', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='afectados', to='app_tienda.campania')),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app_tienda.libro')),
+            ],
+            options={
+                'verbose_name': 'Libro en campaña',
+                'verbose_name_plural': 'Libros en campaña',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='campania',
+            index=models.Index(fields=['estado', 'fecha_inicio'], name='app_tienda__estado_2831c2_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='campanialibro',
+            unique_together={('campania', 'libro')},
+        ),
+    ]
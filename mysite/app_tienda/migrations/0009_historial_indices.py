@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0008_tareas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialpedido',
+            index=models.Index(fields=['fecha_registro'], name='app_tienda__fecha_r_da9170_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialpedido',
+            index=models.Index(fields=['pedido', 'fecha_registro'], name='app_tienda__pedido__4d8588_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0009_historial_indices'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pedido',
+            name='app_tienda__fecha_c_5f29d4_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='app_tienda__fecha_c_ce9e96_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'fecha_creacion', 'id'], name='app_tienda__estado_a1daee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['total', 'id'], name='app_tienda__total_68dd17_idx'),
+        ),
+    ]
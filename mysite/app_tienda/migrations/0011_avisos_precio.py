@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0010_pedido_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioObservado',
+            fields=[
+                ('libro', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='precio_observado', serialize=False, to='app_tienda.libro')),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_nuevo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Precio observado',
+                'verbose_name_plural': 'Precios observados',
+            },
+        ),
+        migrations.CreateModel(
+            name='PuntoControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Punto de control',
+                'verbose_name_plural': 'Puntos de control',
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:50
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def calcular_valoraciones(apps, schema_editor):
+    Libro = apps.get_model('app_tienda', 'Libro')
+    Resena = apps.get_model('app_tienda', 'Resena')
+    histogramas = defaultdict(dict)
+    filas = (
+        Resena.objects.filter(aprobada=True).order_by()
+        .values_list('libro_id', 'calificacion').annotate(n=models.Count('id'))
+    )
+    for libro_id, calificacion, cantidad in filas:
+        histogramas[libro_id][calificacion] = cantidad
+    for libro_id, histograma in histogramas.items():
+        total = sum(histograma.values())
+        Libro.objects.filter(pk=libro_id).update(
+            num_resenas=total,
+            calificacion_media=sum(e * n for e, n in histograma.items()) / total,
+            **{f'resenas_{e}': histograma.get(e, 0) for e in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0011_avisos_precio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='calificacion_media',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='num_resenas',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='resenas_1',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='resenas_2',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='resenas_3',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='resenas_4',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='resenas_5',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['activo', '-calificacion_media', '-num_resenas'], name='libro_valoracion_idx'),
+        ),
+        migrations.RunPython(calcular_valoraciones, migrations.RunPython.noop),
+    ]
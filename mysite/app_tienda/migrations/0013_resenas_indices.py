@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0012_valoraciones_libro'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(condition=models.Q(('aprobada', True)), fields=['libro', 'fecha_creacion', 'id'], name='resena_aprobadas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(condition=models.Q(('aprobada', False)), fields=['fecha_creacion', 'id'], name='resena_pendientes_idx'),
+        ),
+    ]
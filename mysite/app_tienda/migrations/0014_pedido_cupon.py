@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0013_resenas_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='cupon',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos', to='app_tienda.cupon'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='descuento',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_tienda', '0014_pedido_cupon'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='campania',
+            constraint=models.CheckConstraint(check=models.Q(('tipo_descuento', 'fijo'), ('valor__lt', 100), _connector='OR'), name='campania_porcentaje_menor_100'),
+        ),
+        migrations.AddConstraint(
+            model_name='campania',
+            constraint=models.CheckConstraint(check=models.Q(('fecha_fin__gt', models.F('fecha_inicio'))), name='campania_fin_posterior_inicio'),
+        ),
+    ]
@@ -1,12 +1,14 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.conf import settings
 import uuid
 import random
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from django.utils.text import slugify
+from django.db.models.functions import Lower
 
 # 1. USUARIO PERSONALIZADO
 class Usuario(AbstractUser):
@@ -30,6 +32,11 @@ class Usuario(AbstractUser):
     class Meta:
         verbose_name = "Usuario"
         verbose_name_plural = "Usuarios"
+        constraints = [
+            # Índices únicos sin distinguir mayúsculas: login por correo o usuario en una sola búsqueda
+            models.UniqueConstraint(Lower('email'), name='usuario_email_lower_uniq'),
+            models.UniqueConstraint(Lower('username'), name='usuario_username_lower_uniq'),
+        ]
         permissions = [
             ("acceso_panel_admin", "Puede acceder al panel de administración"),
             ("gestionar_libros", "Puede gestionar libros"),
@@ -110,6 +117,15 @@ class Libro(models.Model):
     slug = models.SlugField(unique=True, blank=True)
     meta_descripcion = models.CharField(max_length=160, blank=True, null=True)
     meta_keywords = models.CharField(max_length=255, blank=True, null=True)
+
+    # Valoraciones: resumen de las reseñas aprobadas, mantenido por calificaciones.py
+    num_resenas = models.IntegerField(default=0, editable=False)
+    calificacion_media = models.FloatField(default=0, editable=False)
+    resenas_1 = models.IntegerField(default=0, editable=False)
+    resenas_2 = models.IntegerField(default=0, editable=False)
+    resenas_3 = models.IntegerField(default=0, editable=False)
+    resenas_4 = models.IntegerField(default=0, editable=False)
+    resenas_5 = models.IntegerField(default=0, editable=False)
     
     # Auditoría
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -126,6 +142,8 @@ class Libro(models.Model):
             models.Index(fields=['categoria']),
             models.Index(fields=['precio']),
             models.Index(fields=['destacado']),
+            # Orden "mejor valorados" del catálogo
+            models.Index(fields=['activo', '-calificacion_media', '-num_resenas'], name='libro_valoracion_idx'),
         ]
     
     def __str__(self):
@@ -139,9 +157,25 @@ class Libro(models.Model):
             return int(((self.precio - self.precio_descuento) / self.precio) * 100)
         return 0
     
+    def histograma(self):
+        """[(estrellas, reseñas, porcentaje)] de 5 a 1 estrellas."""
+        return [
+            (estrellas, cantidad, round(cantidad * 100 / self.num_resenas) if self.num_resenas else 0)
+            for estrellas, cantidad in ((i, getattr(self, f'resenas_{i}')) for i in range(5, 0, -1))
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.titulo)
+
+        # Las valoraciones solo se escriben con UPDATE atómicos (calificaciones.py);
+        # guardar una instancia leída antes de una reseña no debe pisarlas.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            diferidos = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in CAMPOS_CALIFICACION and campo.attname not in diferidos
+            ]
         
         if self.precio_descuento and self.precio_descuento > 0 and self.precio_descuento < self.precio:
             self.en_oferta = True
@@ -149,7 +183,8 @@ class Libro(models.Model):
             self.en_oferta = False
             self.precio_descuento = None
 
-        if self.archivo_digital:
+        # Solo se consulta el tamaño en disco cuando el archivo es nuevo o aún no se conoce.
+        if self.archivo_digital and (not self.tamanio_archivo or not self.archivo_digital._committed):
             self.tamanio_archivo = self._get_file_size(self.archivo_digital.size)
         
         super().save(*args, **kwargs)
@@ -161,13 +196,30 @@ class Libro(models.Model):
             size /= 1024.0
         return f"{size:.1f} TB"
 
+# Columnas del libro que muestran los listados de usuario (tarjetas, carrito,
+# pedidos): portada, título, autor, formato y lo necesario para precio_actual().
+CAMPOS_LIBRO_LISTADO = (
+    'libro__titulo', 'libro__autor', 'libro__portada', 'libro__formato',
+    'libro__precio', 'libro__precio_descuento', 'libro__en_oferta',
+)
+
+CAMPOS_CALIFICACION = (
+    'num_resenas', 'calificacion_media', 'resenas_1', 'resenas_2', 'resenas_3', 'resenas_4', 'resenas_5',
+)
+
 # 4. CARRITO
+class CarritoItemQuerySet(models.QuerySet):
+    def para_listado(self):
+        return self.select_related('libro').only('cantidad', 'libro', *CAMPOS_LIBRO_LISTADO)
+
 class CarritoItem(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='carrito')
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
     fecha_agregado = models.DateTimeField(auto_now_add=True)
     fecha_actualizado = models.DateTimeField(auto_now=True)
+
+    objects = CarritoItemQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Item del carrito"
@@ -207,6 +259,8 @@ class Pedido(models.Model):
     
     # Totales
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cupon = models.ForeignKey('Cupon', on_delete=models.SET_NULL, blank=True, null=True, related_name='pedidos')
+    descuento = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     impuestos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
@@ -225,7 +279,10 @@ class Pedido(models.Model):
         indexes = [
             models.Index(fields=['numero_pedido']),
             models.Index(fields=['estado']),
-            models.Index(fields=['fecha_creacion']),
+            # Claves de la paginación por cursor de admin_pedidos
+            models.Index(fields=['fecha_creacion', 'id']),
+            models.Index(fields=['estado', 'fecha_creacion', 'id']),
+            models.Index(fields=['total', 'id']),
         ]
     
     def __str__(self):
@@ -242,26 +299,35 @@ class Pedido(models.Model):
         random_part = random.randint(1000, 9999)
         return f"ORD-{timestamp}-{self.usuario.id:04d}-{random_part}"
     
-    def calcular_totales(self):
+    def calcular_totales(self, usuario=None):
+        from .historial import registrar
         detalles = self.detalles.all()
         self.subtotal = sum(detalle.subtotal() for detalle in detalles)
-        self.impuestos = self.subtotal * Decimal('0.16')  # 16% IVA
-        self.total = self.subtotal + self.impuestos
-        self.save()
-    
-    def marcar_como_pagado(self):
-        self.estado = 'pagado'
-        self.pagado = True
-        self.fecha_pago = timezone.now()
-        self.save()
+        base = self.subtotal - self.descuento
+        self.impuestos = base * Decimal('0.16')  # 16% IVA
+        self.total = base + self.impuestos
+        self.save(update_fields=['subtotal', 'impuestos', 'total', 'fecha_actualizacion'])
+        registrar(self, 'totales_calculados', f'Total {self.total:.2f}', usuario)
+    
+    def marcar_como_pagado(self, usuario=None):
+        from .estados import transicionar
+        transicionar(self, 'pagado', usuario, f'Pago {self.get_metodo_pago_display()} de {self.total:.2f}')
 
 # 6. DETALLE PEDIDO
+class DetallePedidoQuerySet(models.QuerySet):
+    def para_listado(self):
+        return self.select_related('libro').only(
+            'pedido', 'cantidad', 'precio_unitario', 'precio_total', 'libro', *CAMPOS_LIBRO_LISTADO,
+        )
+
 class DetallePedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='detalles')
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     precio_total = models.DecimalField(max_digits=10, decimal_places=2)
+
+    objects = DetallePedidoQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Detalle del pedido"
@@ -274,6 +340,10 @@ class DetallePedido(models.Model):
         return self.precio_unitario * self.cantidad
 
 # 7. ENTREGA DIGITAL
+class EntregaDigitalQuerySet(models.QuerySet):
+    def para_listado(self):
+        return self.select_related('libro').only('token', 'fecha_creacion', 'libro', *CAMPOS_LIBRO_LISTADO)
+
 class EntregaDigital(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='entregas')
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE)
@@ -293,6 +363,8 @@ class EntregaDigital(models.Model):
     primera_descarga = models.DateTimeField(blank=True, null=True)
     ultima_descarga = models.DateTimeField(blank=True, null=True)
     ip_ultima_descarga = models.GenericIPAddressField(blank=True, null=True)
+
+    objects = EntregaDigitalQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Entrega digital"
@@ -334,15 +406,29 @@ class Resena(models.Model):
         verbose_name = "Reseña"
         verbose_name_plural = "Reseñas"
         unique_together = ['libro', 'usuario']
+        indexes = [
+            # Listado por cursor de las reseñas aprobadas de un libro. Parcial y no
+            # (libro, aprobada, ...) porque aprobada=True se compila como un
+            # booleano sin '= 1' que SQLite no usa como igualdad del índice.
+            models.Index(fields=['libro', 'fecha_creacion', 'id'], condition=models.Q(aprobada=True), name='resena_aprobadas_idx'),
+            # Cola de moderación: solo las pendientes, por antigüedad
+            models.Index(fields=['fecha_creacion', 'id'], condition=models.Q(aprobada=False), name='resena_pendientes_idx'),
+        ]
     
     def __str__(self):
         return f"Reseña de {self.usuario} para {self.libro}"
 
 # 9. WISHLIST
+class WishlistQuerySet(models.QuerySet):
+    def para_listado(self):
+        return self.select_related('libro').only('fecha_agregado', 'libro', *CAMPOS_LIBRO_LISTADO)
+
 class Wishlist(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='wishlist')
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE)
     fecha_agregado = models.DateTimeField(auto_now_add=True)
+
+    objects = WishlistQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Wishlist"
@@ -379,6 +465,20 @@ class Cupon(models.Model):
             self.fecha_inicio <= ahora <= self.fecha_fin
         )
 
+    def save(self, *args, **kwargs):
+        from .cupones import olvidar_invalido
+        super().save(*args, **kwargs)
+        # Un código recién creado o reactivado no debe esperar a que caduque la caché negativa
+        codigo = self.codigo
+        transaction.on_commit(lambda: olvidar_invalido(codigo))
+
+    def calcular_descuento(self, subtotal):
+        if self.tipo_descuento == 'porcentaje':
+            descuento = subtotal * self.valor / 100
+        else:
+            descuento = self.valor
+        return Decimal(min(descuento, subtotal)).quantize(Decimal('0.01'))
+
 # 11. HISTORIAL DE PEDIDOS (para auditoría)
 class HistorialPedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='historial')
@@ -391,6 +491,194 @@ class HistorialPedido(models.Model):
         verbose_name = "Historial de Pedido"
         verbose_name_plural = "Historial de Pedidos"
         ordering = ['-fecha_registro']
+        indexes = [
+            models.Index(fields=['fecha_registro']),
+            models.Index(fields=['pedido', 'fecha_registro']),
+        ]
     
     def __str__(self):
-        return f"[{self.fecha_registro.strftime('%Y-%m-%d %H:%M')}] Pedido {self.pedido.numero_pedido} - {self.accion}"
\ No newline at end of file
+        return f"[{self.fecha_registro.strftime('%Y-%m-%d %H:%M')}] Pedido {self.pedido.numero_pedido} - {self.accion}"
+
+# 12. KPIs DIARIOS (tablas de resumen para el panel de administración)
+class ResumenDiario(models.Model):
+    fecha = models.DateField(unique=True)
+    pedidos = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    nuevos_usuarios = models.PositiveIntegerField(default=0)
+    # Solo se mantiene de forma incremental: no hay historial por descarga del que recalcularlo.
+    descargas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen diario"
+        verbose_name_plural = "Resúmenes diarios"
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"Resumen {self.fecha}"
+
+class VentaLibroDiaria(models.Model):
+    fecha = models.DateField()
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='ventas_diarias')
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Venta diaria por libro"
+        verbose_name_plural = "Ventas diarias por libro"
+        unique_together = ['fecha', 'libro']
+
+    def __str__(self):
+        return f"{self.fecha} - {self.libro_id}: {self.unidades}"
+
+class PedidosEstadoDiario(models.Model):
+    fecha = models.DateField()
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADO_PEDIDO)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Pedidos por estado (diario)"
+        verbose_name_plural = "Pedidos por estado (diario)"
+        unique_together = ['fecha', 'estado']
+
+    def __str__(self):
+        return f"{self.fecha} - {self.estado}: {self.cantidad}"
+
+# 13. CAMPAÑAS DE PROMOCIÓN (ofertas masivas programadas)
+class Campania(models.Model):
+    ESTADO_CAMPANIA = [
+        ('programada', 'Programada'),
+        ('activa', 'Activa'),
+        ('finalizada', 'Finalizada'),
+    ]
+
+    nombre = models.CharField(max_length=150)
+    tipo_descuento = models.CharField(max_length=10, choices=[('porcentaje', 'Porcentaje'), ('fijo', 'Fijo')])
+    # El tope depende del tipo (un porcentaje debe ser menor que 100): lo comprueban clean() y Meta.constraints
+    valor = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    fecha_inicio = models.DateTimeField()
+    fecha_fin = models.DateTimeField()
+    activo = models.BooleanField(default=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CAMPANIA, default='programada', editable=False)
+
+    # Objetivos: se combinan con OR
+    categorias = models.ManyToManyField(Categoria, blank=True, related_name='campanias')
+    autores = models.TextField(blank=True, help_text="Un autor por línea (coincidencia exacta, sin distinguir mayúsculas).")
+    libros = models.ManyToManyField(Libro, blank=True, related_name='campanias')
+
+    fecha_aplicada = models.DateTimeField(blank=True, null=True, editable=False)
+    fecha_revertida = models.DateTimeField(blank=True, null=True, editable=False)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Campaña"
+        verbose_name_plural = "Campañas"
+        ordering = ['-fecha_inicio']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_inicio']),
+        ]
+        constraints = [
+            # Un porcentaje del 100% o más dejaría el libro gratis o con precio negativo
+            models.CheckConstraint(
+                check=models.Q(tipo_descuento='fijo') | models.Q(valor__lt=100),
+                name='campania_porcentaje_menor_100',
+            ),
+            models.CheckConstraint(
+                check=models.Q(fecha_fin__gt=models.F('fecha_inicio')),
+                name='campania_fin_posterior_inicio',
+            ),
+        ]
+
+    def __str__(self):
+        return self.nombre
+
+    def clean(self):
+        errores = {}
+        if self.tipo_descuento == 'porcentaje' and self.valor is not None and self.valor >= 100:
+            errores['valor'] = "Un descuento porcentual debe ser menor que 100."
+        if self.fecha_inicio and self.fecha_fin and self.fecha_fin <= self.fecha_inicio:
+            errores['fecha_fin'] = "La fecha de fin debe ser posterior a la de inicio."
+        if errores:
+            raise ValidationError(errores)
+
+    def lista_autores(self):
+        return [a.strip() for a in self.autores.splitlines() if a.strip()]
+
+class CampaniaLibro(models.Model):
+    """Precio previo de cada libro afectado, para revertir la campaña en un solo UPDATE."""
+    campania = models.ForeignKey(Campania, on_delete=models.CASCADE, related_name='afectados')
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='+')
+    precio_descuento_anterior = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    en_oferta_anterior = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Libro en campaña"
+        verbose_name_plural = "Libros en campaña"
+        unique_together = ['campania', 'libro']
+
+# 14. COLA DE TAREAS (trabajo en segundo plano tras el checkout)
+class Tarea(models.Model):
+    PRIORIDADES = [
+        (0, 'Alta'),
+        (1, 'Normal'),
+        (2, 'Baja'),
+    ]
+    ESTADO_TAREA = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    nombre = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict, blank=True)
+    prioridad = models.PositiveSmallIntegerField(choices=PRIORIDADES, default=1)
+    estado = models.CharField(max_length=20, choices=ESTADO_TAREA, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=5)
+    ejecutar_despues = models.DateTimeField(default=timezone.now)
+    bloqueada_hasta = models.DateTimeField(blank=True, null=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_finalizacion = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['prioridad', 'ejecutar_despues']
+        indexes = [
+            models.Index(fields=['estado', 'prioridad', 'ejecutar_despues']),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.pk} ({self.estado})"
+
+# 15. AVISOS DE BAJADA DE PRECIO (wishlist)
+class PrecioObservado(models.Model):
+    """Precio efectivo de cada libro en la última ejecución completa de avisar_bajadas_precio."""
+    libro = models.OneToOneField(Libro, on_delete=models.CASCADE, primary_key=True, related_name='precio_observado')
+    precio = models.DecimalField(max_digits=10, decimal_places=2)
+    # Precio tomado al empezar la ejecución en curso; se consolida en ``precio`` al terminar.
+    precio_nuevo = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Precio observado"
+        verbose_name_plural = "Precios observados"
+
+    def __str__(self):
+        return f"{self.libro_id}: {self.precio}"
+
+class PuntoControl(models.Model):
+    """Progreso de un proceso por lotes, para reanudarlo donde se quedó."""
+    nombre = models.CharField(max_length=100, unique=True)
+    datos = models.JSONField(default=dict, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Punto de control"
+        verbose_name_plural = "Puntos de control"
+
+    def __str__(self):
+        return self.nombre
@@ -0,0 +1,95 @@
+"""
+Paginación por clave (keyset) para listados grandes.
+
+En lugar de OFFSET, cada página se pide con un cursor opaco que contiene los
+valores de ordenación de su último (o primer) elemento, y la consulta filtra
+``WHERE (a, b) < (x, y) ... LIMIT n + 1``. El coste de una página no depende
+de lo lejos que esté del principio y no se hace ningún COUNT(*). El orden debe
+terminar en un campo único (normalmente 'id') para que el cursor no sea ambiguo.
+"""
+
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+@dataclass
+class Pagina:
+    objetos: list = field(default_factory=list)
+    siguiente: str = None
+    anterior: str = None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def codificar_cursor(valores):
+    # str() conserva los microsegundos de las fechas, que son parte de la clave.
+    texto = json.dumps(valores, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(modelo, campos, cursor):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            raise ValueError(cursor)
+        return [modelo._meta.get_field(campo).to_python(valor) for campo, valor in zip(campos, valores)]
+    except (ValueError, TypeError, ValidationError) as e:
+        raise CursorInvalido("Cursor de paginación no válido.") from e
+
+
+def _mas_alla(campos, descendentes, valores):
+    """Filas posteriores a ``valores`` en el orden dado: (a > x) OR (a = x AND b > y) ..."""
+    condicion = Q()
+    for i, (campo, descendente) in enumerate(zip(campos, descendentes)):
+        iguales = {campos[j]: valores[j] for j in range(i)}
+        condicion |= Q(**iguales, **{f"{campo}__{'lt' if descendente else 'gt'}": valores[i]})
+    return condicion
+
+
+def paginar(queryset, orden, por_pagina=50, despues=None, antes=None):
+    """
+    Página de ``por_pagina`` objetos de ``queryset`` ordenado por ``orden``
+    (p. ej. ['-fecha_creacion', '-id']), a continuación del cursor ``despues``
+    o justo antes del cursor ``antes``. Siempre una sola consulta.
+    """
+    campos = [campo.lstrip('-') for campo in orden]
+    descendentes = [campo.startswith('-') for campo in orden]
+    hacia_atras = bool(antes) and not despues
+    if hacia_atras:
+        # Se recorre el orden inverso desde el cursor y luego se da la vuelta.
+        descendentes = [not descendente for descendente in descendentes]
+    cursor = despues or antes
+
+    qs = queryset.order_by(*(f"{'-' if d else ''}{c}" for c, d in zip(campos, descendentes)))
+    if cursor:
+        qs = qs.filter(_mas_alla(campos, descendentes, decodificar_cursor(queryset.model, campos, cursor)))
+    objetos = list(qs[:por_pagina + 1])
+    hay_mas = len(objetos) > por_pagina
+    objetos = objetos[:por_pagina]
+    if hacia_atras:
+        objetos.reverse()
+
+    def clave(obj):
+        return codificar_cursor([getattr(obj, campo) for campo in campos])
+
+    pagina = Pagina(objetos)
+    if objetos:
+        if hacia_atras:
+            pagina.siguiente = clave(objetos[-1])
+            pagina.anterior = clave(objetos[0]) if hay_mas else None
+        else:
+            pagina.siguiente = clave(objetos[-1]) if hay_mas else None
+            pagina.anterior = clave(objetos[0]) if cursor else None
+    return pagina
@@ -0,0 +1,152 @@
+"""
+Motor de campañas de promoción.
+
+Aplicar o revertir una campaña son dos UPDATE sobre Libro, sin pasar por
+Libro.save(). Antes de aplicar se guarda el precio de oferta previo de cada
+libro afectado en CampaniaLibro, de donde la reversión lo restaura con una
+subconsulta. La versión del catálogo se incrementa una vez por campaña.
+"""
+
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache import invalidar_catalogo
+from .models import Campania, CampaniaLibro, Libro
+
+TAMANIO_LOTE = 2000
+
+
+def libros_objetivo(campania):
+    """
+    Libros activos alcanzados por la campaña, no reservados por otra campaña
+    activa, con precio de campaña positivo y cuya oferta actual (si la hay) es
+    peor que la de la campaña.
+    """
+    filtro = Q()
+    categorias = campania.categorias.values('id')
+    if categorias.exists():
+        filtro |= Q(categoria_id__in=categorias)
+    for autor in campania.lista_autores():
+        filtro |= Q(autor__iexact=autor)
+    libros = campania.libros.through.objects.filter(campania_id=campania.pk).values('libro_id')
+    if libros.exists():
+        filtro |= Q(id__in=libros)
+    if not filtro:
+        return Libro.objects.none()
+
+    qs = Libro.objects.filter(filtro, activo=True)
+    if campania.tipo_descuento == 'fijo':
+        qs = qs.filter(precio__gt=campania.valor)
+    else:
+        qs = qs.filter(precio__gt=0)
+    ocupados = (
+        CampaniaLibro.objects.filter(campania__estado='activa')
+        .exclude(campania_id=campania.pk).values('libro_id')
+    )
+    return (
+        qs.exclude(id__in=ocupados)
+        .alias(precio_campania=precio_campania(campania))
+        # El redondeo de un porcentaje sobre un precio muy bajo puede dar 0.00
+        .filter(precio_campania__gt=0)
+        .filter(Q(precio_descuento__isnull=True) | Q(precio_descuento__gt=F('precio_campania')))
+    )
+
+
+def precio_campania(campania):
+    """Expresión SQL con el precio de oferta que la campaña asigna a cada libro."""
+    if campania.tipo_descuento == 'fijo':
+        expresion = F('precio') - Value(campania.valor)
+    else:
+        expresion = Round(F('precio') * Value((100 - campania.valor) / 100), 2)
+    return ExpressionWrapper(expresion, output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _afectados(campania):
+    return Libro.objects.filter(id__in=CampaniaLibro.objects.filter(campania=campania).values('libro_id'))
+
+
+def diferencias_aplicar(campania, limite=None):
+    """Filas que cambiarían al aplicar: (id, titulo, precio, oferta actual, oferta nueva)."""
+    qs = libros_objetivo(campania).annotate(oferta_nueva=precio_campania(campania)).order_by('id')
+    filas = qs.values_list('id', 'titulo', 'precio', 'precio_descuento', 'oferta_nueva')
+    return qs.count(), list(filas[:limite] if limite else filas)
+
+
+def diferencias_revertir(campania, limite=None):
+    anterior = CampaniaLibro.objects.filter(campania=campania, libro=OuterRef('pk'))
+    qs = _afectados(campania).annotate(
+        anterior=Subquery(anterior.values('precio_descuento_anterior')[:1]),
+    ).order_by('id')
+    filas = qs.values_list('id', 'titulo', 'precio', 'precio_descuento', 'anterior')
+    return qs.count(), list(filas[:limite] if limite else filas)
+
+
+def aplicar(campania):
+    """Aplica una campaña programada. Devuelve el número de libros afectados."""
+    with transaction.atomic():
+        campania = Campania.objects.select_for_update().get(pk=campania.pk)
+        if campania.estado != 'programada':
+            return 0
+
+        previos = (
+            CampaniaLibro(
+                campania=campania, libro_id=libro_id,
+                precio_descuento_anterior=precio_descuento, en_oferta_anterior=en_oferta,
+            )
+            for libro_id, precio_descuento, en_oferta in libros_objetivo(campania)
+            .values_list('id', 'precio_descuento', 'en_oferta').iterator(chunk_size=TAMANIO_LOTE)
+        )
+        while lote := list(islice(previos, TAMANIO_LOTE)):
+            CampaniaLibro.objects.bulk_create(lote)
+
+        afectados = _afectados(campania).update(
+            precio_descuento=precio_campania(campania),
+            en_oferta=True,
+            fecha_actualizacion=timezone.now(),
+        )
+        campania.estado = 'activa'
+        campania.fecha_aplicada = timezone.now()
+        campania.save(update_fields=['estado', 'fecha_aplicada'])
+        transaction.on_commit(invalidar_catalogo)
+    return afectados
+
+
+def revertir(campania):
+    """Restaura el precio de oferta previo de los libros de una campaña activa."""
+    with transaction.atomic():
+        campania = Campania.objects.select_for_update().get(pk=campania.pk)
+        if campania.estado == 'finalizada':
+            return 0
+
+        afectados = 0
+        if campania.estado == 'activa':
+            anterior = CampaniaLibro.objects.filter(campania=campania, libro=OuterRef('pk'))
+            afectados = _afectados(campania).update(
+                precio_descuento=Subquery(anterior.values('precio_descuento_anterior')[:1]),
+                en_oferta=Subquery(anterior.values('en_oferta_anterior')[:1]),
+                fecha_actualizacion=timezone.now(),
+            )
+            CampaniaLibro.objects.filter(campania=campania).delete()
+            transaction.on_commit(invalidar_catalogo)
+
+        campania.estado = 'finalizada'
+        campania.fecha_revertida = timezone.now()
+        campania.save(update_fields=['estado', 'fecha_revertida'])
+    return afectados
+
+
+def pendientes(ahora=None):
+    """(campañas a revertir, campañas a aplicar) según el reloj."""
+    ahora = ahora or timezone.now()
+    por_revertir = Campania.objects.filter(
+        Q(estado='activa', fecha_fin__lte=ahora) | Q(estado='activa', activo=False)
+        | Q(estado='programada', fecha_fin__lte=ahora)
+    )
+    por_aplicar = Campania.objects.filter(
+        estado='programada', activo=True, fecha_inicio__lte=ahora, fecha_fin__gt=ahora,
+    ).order_by('fecha_inicio')
+    return por_revertir, por_aplicar
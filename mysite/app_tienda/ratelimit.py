@@ -0,0 +1,247 @@
+"""
+Limitación de peticiones para login, descargas y tráfico general.
+
+Las políticas se declaran en settings.RATELIMIT_POLITICAS:
+
+    RATELIMIT_POLITICAS = {
+        'login': [
+            {'clave': 'ip', 'limite': 20, 'periodo': 60},
+            {'clave': 'ip_usuario', 'limite': 5, 'periodo': 300, 'algoritmo': 'token_bucket',
+             'metodos': ['POST']},
+        ],
+    }
+
+El límite por cuenta del login va por (IP, identificador) y no solo por
+identificador: con la clave 'usuario' cualquiera podría bloquear a un cliente
+enviando contraseñas falsas con su correo.
+
+Se aplican con el decorador @limitar('login') o, por nombre de URL, con
+RateLimitMiddleware y settings.RATELIMIT_RUTAS.
+
+Cada regla se comprueba en tiempo constante y solo con datos de la petición
+(IP, campo del formulario, cookie de sesión, argumentos de la URL), de modo
+que una petición rechazada nunca llega a consultar la base de datos ni a
+calcular un hash de contraseña.
+
+Almacenes (settings.RATELIMIT_ALMACEN):
+  'local' -> diccionario en memoria del proceso, sin locks (un solo nodo).
+  'cache' -> caché de Django settings.RATELIMIT_CACHE (compartida entre
+             workers; por defecto el alias 'default'). Solo implementa
+             ventana deslizante; las reglas token_bucket se evalúan como
+             ventana con el mismo límite y periodo.
+"""
+
+import hashlib
+import logging
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+_rechazos = Counter()
+
+
+def metricas():
+    """Rechazos por política desde el arranque del proceso."""
+    return dict(_rechazos)
+
+
+# ---------- Claves ----------
+
+def _ip(request, **kwargs):
+    if getattr(settings, 'RATELIMIT_CONFIAR_PROXY', False):
+        reenviada = request.META.get('HTTP_X_FORWARDED_FOR')
+        if reenviada:
+            return reenviada.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _usuario(request, **kwargs):
+    # En el login el usuario es el identificador enviado; en el resto, la sesión.
+    # Nunca se usa request.user, que obligaría a leer la sesión de la base de datos.
+    identificador = request.POST.get('email') if request.method == 'POST' else None
+    if identificador:
+        return identificador.strip().lower()
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME) or _ip(request)
+
+
+def _ip_usuario(request, **kwargs):
+    return f'{_ip(request)}|{_usuario(request)}'
+
+
+def _token(request, **kwargs):
+    return str(kwargs.get('token', ''))
+
+
+CLAVES = {'ip': _ip, 'usuario': _usuario, 'ip_usuario': _ip_usuario, 'token': _token}
+
+
+def _resumen(valor):
+    return hashlib.blake2b(valor.encode(), digest_size=12).hexdigest()
+
+
+# ---------- Almacenes ----------
+
+class AlmacenLocal:
+    """
+    Estado en un dict del proceso. Cada entrada se reemplaza con una sola
+    asignación (atómica bajo el GIL); dos peticiones simultáneas con la misma
+    clave pueden colarse una unidad por encima del límite, a cambio de no
+    serializar nunca las peticiones con un lock.
+    """
+
+    MAX_CLAVES = 100_000
+
+    def __init__(self):
+        # En orden de última escritura: la primera clave es la que lleva más
+        # tiempo sin usarse, así que las caducadas se retiran siempre por delante.
+        self._estado = OrderedDict()
+
+    def _guardar(self, clave, valor, caduca, ahora):
+        estado = self._estado
+        estado[clave] = (valor, caduca)
+        estado.move_to_end(clave)
+        while estado:
+            _, vence = next(iter(estado.values()))
+            if vence >= ahora and len(estado) <= self.MAX_CLAVES:
+                break
+            # Caducada o, con el dict lleno, la menos reciente
+            estado.popitem(last=False)
+
+    def ventana(self, clave, limite, periodo, ahora):
+        numero = int(ahora // periodo)
+        entrada = self._estado.get(clave)
+        actual = previo = 0
+        if entrada:
+            ventana, contador, anterior = entrada[0]
+            if ventana == numero:
+                actual, previo = contador, anterior
+            elif ventana == numero - 1:
+                previo = contador
+        actual += 1
+        self._guardar(clave, (numero, actual, previo), ahora + 2 * periodo, ahora)
+        return _evaluar_ventana(actual, previo, limite, periodo, ahora)
+
+    def token_bucket(self, clave, limite, periodo, ahora):
+        entrada = self._estado.get(clave)
+        tokens, ultimo = entrada[0] if entrada else (float(limite), ahora)
+        tokens = min(float(limite), tokens + (ahora - ultimo) * limite / periodo)
+        if tokens >= 1:
+            self._guardar(clave, (tokens - 1, ahora), ahora + periodo, ahora)
+            return True, 0
+        self._guardar(clave, (tokens, ahora), ahora + periodo, ahora)
+        return False, (1 - tokens) * periodo / limite
+
+
+class AlmacenCache:
+    """Ventana deslizante aproximada con dos contadores por clave en la caché de Django."""
+
+    def ventana(self, clave, limite, periodo, ahora):
+        cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+        numero = int(ahora // periodo)
+        clave_actual = f'rl:{clave}:{numero}'
+        cache.add(clave_actual, 0, timeout=2 * periodo)
+        try:
+            actual = cache.incr(clave_actual)
+        except ValueError:
+            # La entrada expiró entre add() e incr().
+            cache.set(clave_actual, 1, timeout=2 * periodo)
+            actual = 1
+        previo = cache.get(f'rl:{clave}:{numero - 1}', 0)
+        return _evaluar_ventana(actual, previo, limite, periodo, ahora)
+
+    def token_bucket(self, clave, limite, periodo, ahora):
+        return self.ventana(clave, limite, periodo, ahora)
+
+
+def _evaluar_ventana(actual, previo, limite, periodo, ahora):
+    transcurrido = (ahora % periodo) / periodo
+    estimado = previo * (1 - transcurrido) + actual
+    if estimado <= limite:
+        return True, 0
+    return False, periodo * (1 - transcurrido)
+
+
+_almacenes = {}
+
+
+def almacen():
+    tipo = getattr(settings, 'RATELIMIT_ALMACEN', 'local')
+    if tipo not in _almacenes:
+        _almacenes[tipo] = AlmacenCache() if tipo == 'cache' else AlmacenLocal()
+    return _almacenes[tipo]
+
+
+# ---------- API ----------
+
+def comprobar(nombre, request, **kwargs):
+    """
+    Consume una unidad de cada regla de la política. Devuelve None si la
+    petición puede continuar o los segundos de espera si se rechaza.
+    """
+    if not getattr(settings, 'RATELIMIT_ACTIVO', True):
+        return None
+    reglas = settings.RATELIMIT_POLITICAS.get(nombre, [])
+    ahora = time.time()
+    destino = almacen()
+    espera = 0
+    for regla in reglas:
+        if 'metodos' in regla and request.method not in regla['metodos']:
+            continue
+        valor = CLAVES[regla['clave']](request, **kwargs)
+        clave = f"{nombre}:{regla['clave']}:{_resumen(valor)}"
+        algoritmo = getattr(destino, regla.get('algoritmo', 'ventana'))
+        permitido, reintentar = algoritmo(clave, regla['limite'], regla['periodo'], ahora)
+        if not permitido:
+            espera = max(espera, reintentar)
+    if espera:
+        _rechazos[nombre] += 1
+        logger.warning("Rate limit '%s' superado desde %s", nombre, _ip(request))
+        return espera
+    return None
+
+
+async def acomprobar(nombre, request, **kwargs):
+    # El almacén local no hace E/S; el de caché se consulta fuera del event loop.
+    if getattr(settings, 'RATELIMIT_ALMACEN', 'local') == 'cache':
+        return await sync_to_async(comprobar)(nombre, request, **kwargs)
+    return comprobar(nombre, request, **kwargs)
+
+
+def respuesta_429(espera):
+    response = HttpResponse(
+        "Demasiadas solicitudes. Por favor, espera un momento e inténtalo de nuevo.",
+        status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(max(1, int(espera + 0.999)))
+    return response
+
+
+def limitar(nombre):
+    """
+    Decorador de vistas. Debe ir por encima de @login_required para que el
+    rechazo ocurra antes de cargar el usuario de la sesión.
+    """
+    def decorador(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                espera = await acomprobar(nombre, request, **kwargs)
+                if espera is not None:
+                    return respuesta_429(espera)
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                espera = comprobar(nombre, request, **kwargs)
+                if espera is not None:
+                    return respuesta_429(espera)
+                return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorador
@@ -0,0 +1,136 @@
+"""
+Listado y moderación de reseñas.
+
+La ficha del libro solo muestra reseñas aprobadas, paginadas por cursor sobre
+el índice parcial resena_aprobadas_idx: (libro, fecha_creacion, id) WHERE
+aprobada. No uno con aprobada entre las columnas: SQLite no lo usaría para
+aprobada=True (ver Resena.Meta). La primera página, que es la
+que ve casi todo el mundo, se guarda en caché por libro y se invalida al
+confirmar cualquier cambio que afecte a una reseña aprobada. Las páginas
+siguientes ("Ver más") van directas a la base de datos, una consulta cada una.
+
+La cola de moderación aprueba en bloque con un único UPDATE y ajusta las
+valoraciones de cada libro con un GROUP BY (calificaciones.py); rechazar una
+reseña la borra.
+
+Cualquier otro alta, cambio o borrado de una reseña (también en cascada al
+borrar su usuario o su libro) ajusta las valoraciones desde las señales
+post_save/post_delete de Resena, conectadas en conectar_senales().
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from . import calificaciones
+from .cache import invalidar_libros
+from .models import Resena
+from .paginacion import paginar
+
+ORDEN_LIBRO = ['-fecha_creacion', '-id']
+ORDEN_MODERACION = ['fecha_creacion', 'id']
+
+
+def _clave(libro_id):
+    return f'app_tienda:resenas:{libro_id}'
+
+
+def aprobadas(libro):
+    return (
+        Resena.objects.filter(libro=libro, aprobada=True)
+        .select_related('usuario')
+        .only('libro_id', 'calificacion', 'comentario', 'aprobada', 'fecha_creacion',
+              'usuario__username', 'usuario__first_name', 'usuario__last_name')
+    )
+
+
+def pagina(libro, despues=None):
+    """Página de reseñas aprobadas de ``libro``; la primera sale de la caché."""
+    if despues:
+        return paginar(aprobadas(libro), ORDEN_LIBRO, settings.RESENAS_POR_PAGINA, despues=despues)
+    clave = _clave(libro.pk)
+    primera = cache.get(clave)
+    if primera is None:
+        primera = paginar(aprobadas(libro), ORDEN_LIBRO, settings.RESENAS_POR_PAGINA)
+        cache.set(clave, primera, settings.RESENAS_CACHE_SEGUNDOS)
+    return primera
+
+
+def invalidar_listados(libro_ids):
+    """Descarta la primera página en caché de los libros, al confirmar la transacción."""
+    libro_ids = list(libro_ids)
+    claves = [_clave(libro_id) for libro_id in libro_ids]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
+        # Reseñas y valoraciones salen en la ficha de cada libro (su ETag)
+        transaction.on_commit(lambda: invalidar_libros(libro_ids))
+
+
+def pendientes():
+    return (
+        Resena.objects.filter(aprobada=False)
+        .select_related('libro', 'usuario')
+        .only('calificacion', 'comentario', 'aprobada', 'fecha_creacion',
+              'libro__titulo', 'libro__slug', 'usuario__username', 'usuario__email')
+    )
+
+
+def aprobar(queryset):
+    """Aprueba las reseñas pendientes del queryset con un único UPDATE. Devuelve cuántas."""
+    with transaction.atomic():
+        ids = list(queryset.filter(aprobada=False).select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        lote = Resena.objects.filter(pk__in=ids)
+        por_libro = calificaciones.histogramas(lote)
+        aprobadas = lote.update(aprobada=True, fecha_actualizacion=timezone.now())
+        calificaciones.ajustar_lote(por_libro)
+        invalidar_listados(por_libro)
+    return aprobadas
+
+
+def rechazar(queryset):
+    """Borra las reseñas del queryset; las señales descuentan las aprobadas. Devuelve cuántas."""
+    with transaction.atomic():
+        return queryset.delete()[0]
+
+
+# ---------- Señales: valoraciones del libro ----------
+
+def _valoracion(libro_id, calificacion, aprobada):
+    """(libro_id, calificación) si la reseña cuenta en las valoraciones del libro."""
+    return (libro_id, calificacion) if aprobada else None
+
+
+def _antes_de_guardar(sender, instance, raw=False, **kwargs):
+    # Lo que contaba la reseña antes del cambio, leído de la base de datos.
+    fila = None
+    if not raw and not instance._state.adding:
+        fila = Resena.objects.filter(pk=instance.pk).values_list('libro_id', 'calificacion', 'aprobada').first()
+    instance._valoracion_anterior = _valoracion(*fila) if fila else None
+
+
+def _guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = instance.__dict__.pop('_valoracion_anterior', None)
+    actual = _valoracion(instance.libro_id, instance.calificacion, instance.aprobada)
+    if anterior != actual:
+        calificaciones.ajustar(anterior, actual)
+    # Cualquier cambio en una reseña visible cambia el listado público.
+    invalidar_listados({valoracion[0] for valoracion in (anterior, actual) if valoracion})
+
+
+def _borrada(sender, instance, **kwargs):
+    anterior = _valoracion(instance.libro_id, instance.calificacion, instance.aprobada)
+    if anterior:
+        calificaciones.ajustar(anterior, None)
+        invalidar_listados({anterior[0]})
+
+
+def conectar_senales():
+    pre_save.connect(_antes_de_guardar, sender=Resena, dispatch_uid='resenas:pre_save')
+    post_save.connect(_guardada, sender=Resena, dispatch_uid='resenas:post_save')
+    post_delete.connect(_borrada, sender=Resena, dispatch_uid='resenas:post_delete')
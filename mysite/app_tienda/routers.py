@@ -0,0 +1,113 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Estado de enrutamiento de la petición en curso:
+#   'vista'      -> None | 'replica' | 'primario' (pista declarada por la vista)
+#   'primario'   -> True si la petición está fijada al primario (stickiness)
+#   'escritura'  -> True si la petición ya escribió en la base de datos
+_estado = ContextVar('app_tienda_enrutamiento', default=None)
+
+
+def alias_replica():
+    alias = getattr(settings, 'REPLICA_DB_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def iniciar_estado(primario=False):
+    return _estado.set({'vista': None, 'primario': primario, 'escritura': False})
+
+
+def restaurar_estado(token):
+    _estado.reset(token)
+
+
+def estado_actual():
+    return _estado.get()
+
+
+class ReplicaRouter:
+    """
+    Envía las lecturas de app_tienda a la réplica solo cuando la vista lo
+    pide con @usar_replica y la petición no está fijada al primario. Todo lo
+    demás (sesiones, escrituras, comandos de gestión) va a 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or estado['primario'] or estado['escritura']:
+            return DEFAULT_DB_ALIAS
+        # La sesión se carga de forma perezosa dentro de la vista; leerla de
+        # una réplica atrasada cerraría la sesión recién creada.
+        if model._meta.app_label != 'app_tienda':
+            return DEFAULT_DB_ALIAS
+        if estado['vista'] == 'replica':
+            return alias_replica() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado['escritura'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica contienen los mismos datos.
+        return True
+
+
+@contextmanager
+def _pista(pista):
+    estado = _estado.get()
+    token = None
+    if estado is None:
+        token = iniciar_estado()
+        estado = _estado.get()
+    anterior = estado['vista']
+    estado['vista'] = pista
+    try:
+        yield
+    finally:
+        estado['vista'] = anterior
+        if token is not None:
+            restaurar_estado(token)
+
+
+def _con_pista(pista):
+    def decorador(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                with _pista(pista):
+                    return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                with _pista(pista):
+                    return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorador
+
+
+# Vistas de catálogo y reportes: toleran unos segundos de retraso de la réplica.
+usar_replica = _con_pista('replica')
+
+# Vistas que deben leer lo que el usuario acaba de escribir.
+usar_primario = _con_pista('primario')
+
+
+def primario_fijado_hasta(request):
+    try:
+        return float(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE, 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def nueva_fijacion():
+    return time.time() + settings.REPLICA_STICKY_SECONDS
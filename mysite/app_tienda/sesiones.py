@@ -0,0 +1,94 @@
+"""
+Motor de sesiones: caché primero, con escritura diferida en la base de datos.
+
+Uso: SESSION_ENGINE = 'app_tienda.sesiones'
+
+- Las lecturas salen de la caché; solo un fallo de caché consulta django_session.
+- save() no escribe nada si los datos no cambiaron desde que se cargaron,
+  aunque la sesión esté marcada como modificada.
+- Los cambios se guardan siempre en la caché y, como mucho, una vez cada
+  SESSION_ESCRITURA_DB_SEGUNDOS en la base de datos. La copia en base de datos
+  puede ir por detrás de la caché ese tiempo, salvo en la creación de la sesión
+  y en login/logout, que se escriben al momento para que una caché vaciada no
+  resucite una sesión cerrada.
+- Si la caché expulsa una entrada, se pierden los cambios aún no escritos. Por
+  eso la escritura solo se difiere con un alias propio (SESSION_CACHE_ALIAS
+  distinto de 'default') que no expulse entradas; con la caché general cada
+  cambio se escribe al momento.
+- Las sesiones caducadas se borran por lotes con el comando purgar_caducados.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+KEY_PREFIX = 'app_tienda.sesiones'
+
+CLAVES_AUTENTICACION = (SESSION_KEY, HASH_SESSION_KEY)
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Huella y claves de autenticación de los datos tal como se cargaron.
+        self._huella = None
+        self._autenticacion = None
+        # Momento de la última escritura en base de datos.
+        self._escrita_db = 0.0
+
+    def _calcular_huella(self, datos):
+        return hashlib.blake2b(self.serializer().dumps(datos), digest_size=16).digest()
+
+    def _recordar(self, datos):
+        self._huella = self._calcular_huella(datos)
+        self._autenticacion = tuple(datos.get(clave) for clave in CLAVES_AUTENTICACION)
+
+    def load(self):
+        try:
+            entrada = self._cache.get(self.cache_key)
+        except Exception:
+            entrada = None
+
+        if entrada is not None:
+            datos, self._escrita_db = entrada
+        else:
+            s = self._get_session_from_db()
+            if s:
+                datos = self.decode(s.session_data)
+                self._escrita_db = time.time()
+                self._cache.set(
+                    self.cache_key, (datos, self._escrita_db),
+                    self.get_expiry_age(expiry=s.expire_date),
+                )
+            else:
+                datos = {}
+        self._recordar(datos)
+        return datos
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        datos = self._get_session(no_load=must_create)
+        huella = self._calcular_huella(datos)
+        if not must_create and huella == self._huella:
+            return
+
+        ahora = time.time()
+        autenticacion = tuple(datos.get(clave) for clave in CLAVES_AUTENTICACION)
+        if (
+            must_create
+            or autenticacion != self._autenticacion
+            or settings.SESSION_CACHE_ALIAS == 'default'
+            or ahora - self._escrita_db >= settings.SESSION_ESCRITURA_DB_SEGUNDOS
+        ):
+            DBStore.save(self, must_create)
+            self._escrita_db = ahora
+        self._cache.set(self.cache_key, (datos, self._escrita_db), self.get_expiry_age())
+        self._huella = huella
+        self._autenticacion = autenticacion
@@ -0,0 +1,14 @@
+document.addEventListener("DOMContentLoaded", function() {
+    const banner = document.getElementById("cookie-consent-banner");
+    const acceptButton = document.getElementById("cookie-consent-accept");
+
+    // Usamos localStorage para recordar la decisión del usuario
+    if (!localStorage.getItem("cookie_consent")) {
+        banner.style.display = "block";
+    }
+
+    acceptButton.addEventListener("click", function() {
+        localStorage.setItem("cookie_consent", "true");
+        banner.style.display = "none";
+    });
+});
@@ -0,0 +1,239 @@
+"""
+Cola de tareas en base de datos, sin broker externo.
+
+Las tareas se encolan con encolar() dentro de la misma transacción que las
+origina (si el checkout hace rollback, la tarea desaparece con él) y las
+ejecuta el comando procesar_tareas. Cada trabajador reclama tareas con un
+UPDATE condicional, de modo que varios trabajadores pueden convivir; una
+tarea cuyo trabajador muere se vuelve a reclamar cuando vence su bloqueo.
+
+Los fallos se reintentan con espera exponencial hasta max_intentos; después
+la tarea queda como 'fallida' con el último error.
+
+La entrega es al menos una vez: lo que la tarea escribe en la base de datos
+se confirma junto con su estado 'completada', pero un efecto externo como un
+correo no se puede deshacer. Si el trabajador muere o falla el guardado
+después de enviarlo, la tarea se vuelve a ejecutar y el correo se repite.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DetallePedido, EntregaDigital, Libro, Pedido, Tarea, Usuario
+
+logger = logging.getLogger(__name__)
+
+PRIORIDADES = {'alta': 0, 'normal': 1, 'baja': 2}
+
+# nombre -> (función, prioridad por defecto, max_intentos)
+REGISTRO = {}
+
+
+def tarea(nombre, prioridad='normal', max_intentos=5):
+    """Registra una función como tarea ejecutable por el trabajador."""
+    def decorador(funcion):
+        REGISTRO[nombre] = (funcion, PRIORIDADES[prioridad], max_intentos)
+        return funcion
+    return decorador
+
+
+def encolar(nombre, prioridad=None, retraso=0, **argumentos):
+    """Crea la tarea; los argumentos deben ser serializables en JSON."""
+    _, prioridad_defecto, max_intentos = REGISTRO[nombre]
+    return Tarea.objects.create(
+        nombre=nombre,
+        argumentos=argumentos,
+        prioridad=PRIORIDADES[prioridad] if prioridad else prioridad_defecto,
+        max_intentos=max_intentos,
+        ejecutar_despues=timezone.now() + timedelta(seconds=retraso),
+    )
+
+
+def encolar_varias(nombre, lista_argumentos, prioridad=None):
+    """Como encolar(), con un solo INSERT para todas las tareas."""
+    _, prioridad_defecto, max_intentos = REGISTRO[nombre]
+    ahora = timezone.now()
+    return Tarea.objects.bulk_create(
+        [
+            Tarea(
+                nombre=nombre,
+                argumentos=argumentos,
+                prioridad=PRIORIDADES[prioridad] if prioridad else prioridad_defecto,
+                max_intentos=max_intentos,
+                ejecutar_despues=ahora,
+            )
+            for argumentos in lista_argumentos
+        ],
+        batch_size=1000,
+    )
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reclamar(trabajador, limite=10, prioridades=None):
+    """
+    Marca como 'en_proceso' hasta ``limite`` tareas listas, por orden de
+    prioridad, y las devuelve. Un UPDATE condicional por tarea garantiza que
+    dos trabajadores no reclamen la misma.
+    """
+    ahora = timezone.now()
+    listas = Tarea.objects.filter(
+        Q(estado='pendiente', ejecutar_despues__lte=ahora)
+        | Q(estado='en_proceso', bloqueada_hasta__lt=ahora)
+    )
+    if prioridades is not None:
+        listas = listas.filter(prioridad__in=prioridades)
+    # Se leen algunos candidatos de más por si otro trabajador se adelanta.
+    candidatos = list(listas.order_by('prioridad', 'ejecutar_despues').values_list('id', flat=True)[:limite * 2])
+
+    bloqueo = ahora + timedelta(seconds=settings.TAREAS_BLOQUEO_SEGUNDOS)
+    reclamadas = []
+    for tarea_id in candidatos:
+        if len(reclamadas) >= limite:
+            break
+        with transaction.atomic():
+            actualizadas = Tarea.objects.filter(
+                Q(estado='pendiente') | Q(estado='en_proceso', bloqueada_hasta__lt=ahora), pk=tarea_id,
+            ).update(estado='en_proceso', bloqueada_hasta=bloqueo, trabajador=trabajador)
+        if actualizadas:
+            reclamadas.append(tarea_id)
+    return list(Tarea.objects.filter(pk__in=reclamadas).order_by('prioridad', 'ejecutar_despues'))
+
+
+def espera_reintento(intentos):
+    """Espera exponencial con ±20 % de variación aleatoria, con tope."""
+    base = min(settings.TAREAS_BACKOFF_MAXIMO, settings.TAREAS_BACKOFF_BASE * 2 ** (intentos - 1))
+    return base * random.uniform(0.8, 1.2)
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea reclamada y registra el resultado. Devuelve True si terminó bien."""
+    funcion = REGISTRO.get(tarea.nombre, (None,))[0]
+    tarea.intentos += 1
+    try:
+        if funcion is None:
+            raise LookupError(f"Tarea desconocida: {tarea.nombre}")
+        with transaction.atomic():
+            funcion(**tarea.argumentos)
+    except Exception:
+        tarea.ultimo_error = traceback.format_exc()
+        if tarea.intentos >= tarea.max_intentos:
+            tarea.estado = 'fallida'
+            tarea.fecha_finalizacion = timezone.now()
+            logger.error("Tarea %s fallida tras %s intentos", tarea, tarea.intentos)
+        else:
+            tarea.estado = 'pendiente'
+            tarea.ejecutar_despues = timezone.now() + timedelta(seconds=espera_reintento(tarea.intentos))
+        tarea.bloqueada_hasta = None
+        tarea.save(update_fields=[
+            'estado', 'intentos', 'ultimo_error', 'ejecutar_despues', 'bloqueada_hasta', 'fecha_finalizacion',
+        ])
+        return False
+
+    tarea.estado = 'completada'
+    tarea.fecha_finalizacion = timezone.now()
+    tarea.bloqueada_hasta = None
+    tarea.save(update_fields=['estado', 'intentos', 'fecha_finalizacion', 'bloqueada_hasta'])
+    return True
+
+
+def procesar_pendientes(trabajador=None, limite=10, prioridades=None):
+    """Reclama y ejecuta un lote. Devuelve (completadas, con error)."""
+    trabajador = trabajador or nombre_trabajador()
+    completadas = errores = 0
+    for tarea_reclamada in reclamar(trabajador, limite, prioridades):
+        if ejecutar(tarea_reclamada):
+            completadas += 1
+        else:
+            errores += 1
+    return completadas, errores
+
+
+# ---------- Tareas del checkout ----------
+
+def crear_entregas_pedido(pedido):
+    """Una EntregaDigital por libro del pedido. Idempotente gracias a unique_together."""
+    expiracion = timezone.now() + timedelta(days=365)
+    EntregaDigital.objects.bulk_create(
+        [
+            EntregaDigital(pedido=pedido, libro_id=libro_id, usuario_id=pedido.usuario_id, expiracion=expiracion)
+            for libro_id in DetallePedido.objects.filter(pedido=pedido).values_list('libro_id', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@tarea('crear_entregas', prioridad='alta')
+def crear_entregas(pedido_id):
+    """Entregas de pedidos grandes; al terminar encola el correo con los enlaces."""
+    crear_entregas_pedido(Pedido.objects.get(pk=pedido_id))
+    encolar('enviar_confirmacion', pedido_id=pedido_id)
+
+
+@tarea('enviar_confirmacion', prioridad='alta', max_intentos=8)
+def enviar_confirmacion(pedido_id):
+    """
+    Correo con los enlaces de descarga. Al menos una vez: un reintento tras un
+    fallo posterior al envío lo repite, con los mismos enlaces. Para que otro
+    trabajador no lo reclame mientras se envía, TAREAS_BLOQUEO_SEGUNDOS debe
+    superar EMAIL_TIMEOUT.
+    """
+    pedido = Pedido.objects.select_related('usuario').get(pk=pedido_id)
+    entregas = EntregaDigital.objects.filter(pedido=pedido).select_related('libro').order_by('libro__titulo')
+    contexto = {
+        'pedido': pedido,
+        'usuario': pedido.usuario,
+        'descargas': [
+            (entrega.libro.titulo, settings.SITIO_URL + reverse('app_tienda:descargar_libro', args=[entrega.token]))
+            for entrega in entregas
+        ],
+        'mis_descargas_url': settings.SITIO_URL + reverse('app_tienda:mis_descargas'),
+    }
+    send_mail(
+        subject=f"Confirmación de tu pedido {pedido.numero_pedido}",
+        message=render_to_string('app_tienda/emails/confirmacion_pedido.txt', contexto),
+        from_email=None,
+        recipient_list=[pedido.usuario.email],
+        html_message=render_to_string('app_tienda/emails/confirmacion_pedido.html', contexto),
+    )
+
+
+# ---------- Avisos de bajada de precio (comando avisar_bajadas_precio) ----------
+
+@tarea('enviar_aviso_precios', prioridad='baja')
+def enviar_aviso_precios(usuario_id, libros):
+    """Un correo con todos los libros de la wishlist que han bajado: [[libro_id, antes, ahora], ...]."""
+    usuario = Usuario.objects.get(pk=usuario_id)
+    precios = {libro_id: (Decimal(antes), Decimal(ahora)) for libro_id, antes, ahora in libros}
+    contexto = {
+        'usuario': usuario,
+        'bajadas': [
+            (libro.titulo, *precios[libro.pk], settings.SITIO_URL + reverse('app_tienda:detalle_libro', args=[libro.slug]))
+            for libro in Libro.objects.filter(pk__in=precios).only('titulo', 'slug').order_by('titulo')
+        ],
+        'wishlist_url': settings.SITIO_URL + reverse('app_tienda:wishlist'),
+    }
+    if not contexto['bajadas']:
+        return
+    send_mail(
+        subject="Han bajado de precio libros de tu wishlist",
+        message=render_to_string('app_tienda/emails/aviso_precios.txt', contexto),
+        from_email=None,
+        recipient_list=[usuario.email],
+        html_message=render_to_string('app_tienda/emails/aviso_precios.html', contexto),
+    )
@@ -0,0 +1,18 @@
+from django import template
+
+from app_tienda import cache
+from app_tienda.models import Categoria
+
+register = template.Library()
+
+
+@register.simple_tag
+def version_catalogo():
+    """Para usar como clave de {% cache %} en fragmentos que dependen del catálogo."""
+    return cache.version_catalogo()
+
+
+@register.inclusion_tag('app_tienda/partials/menu_categorias.html')
+def menu_categorias():
+    # Dentro de un {% cache %} la consulta solo se hace cuando falta el fragmento.
+    return {'categorias': Categoria.objects.filter(activa=True).only('id', 'nombre')}
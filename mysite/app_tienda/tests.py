@@ -1,3 +1,1433 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, authenticate
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.template import RequestContext, Template
+from django.templatetags.static import static
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import calificaciones, cupones, estados, exportaciones, historial, kpis, promociones, ratelimit, resenas, tareas
+from .cache import cache_publico, version_catalogo
+from .carrito import mover_a_carrito, resumen as resumen_carrito
+from .forms import RegistroForm
+from .importacion import ImportadorCatalogo
+from .models import (
+    Campania, CarritoItem, Categoria, Cupon, DetallePedido, EntregaDigital, HistorialPedido, Libro, Pedido,
+    PedidosEstadoDiario, PrecioObservado, PuntoControl, Resena, ResumenDiario, Tarea, Usuario, VentaLibroDiaria,
+    Wishlist,
+)
+from .sesiones import SessionStore
+
+
+def crear_libros(cantidad, inicio=0):
+    # bulk_create evita Libro.save(), que leería el tamaño del archivo en disco
+    return Libro.objects.bulk_create([
+        Libro(
+            titulo=f'Libro {i}', autor='Autor', descripcion='-', precio=Decimal('10.00'),
+            slug=f'libro-{i}', archivo_digital='libros_digitales/libro.pdf', tamanio_archivo='1 MB',
+            portada='portadas/libro.jpg',
+        )
+        for i in range(inicio, inicio + cantidad)
+    ])
+
+
+class DetectorNMas1Mixin:
+    """
+    Detector de N+1: pide la vista con pocas filas y con muchas más. Si el
+    número de consultas crece con las filas, algún acceso por fila (una FK sin
+    select_related, un campo diferido...) lanza su propia consulta.
+    """
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return [consulta['sql'] for consulta in consultas]
+
+    def assertSinNMas1(self, url, crear_filas, pocas=2, muchas=25):
+        crear_filas(0, pocas)
+        self.contar_consultas(url)  # la primera petición guarda en sesión lo que se cachea por usuario
+        antes = self.contar_consultas(url)
+        crear_filas(pocas, muchas - pocas)
+        despues = self.contar_consultas(url)
+        if len(despues) != len(antes):
+            extra = '\n'.join(despues[len(antes):len(antes) + 5])
+            self.fail(
+                f"{url}: {len(antes)} consultas con {pocas} filas y {len(despues)} con {muchas}. "
+                f"Primeras consultas de más:\n{extra}"
+            )
+
+
+class ListadosUsuarioTests(DetectorNMas1Mixin, TestCase):
+    """Los listados del usuario hacen las mismas consultas con 2 libros que con 25."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        cls.libros = crear_libros(25)
+        cls.pedido = Pedido.objects.create(usuario=cls.usuario, numero_pedido='PED-LECTOR')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_mis_descargas(self):
+        def crear(inicio, cantidad):
+            EntregaDigital.objects.bulk_create([
+                EntregaDigital(pedido=self.pedido, libro=libro, usuario=self.usuario, expiracion=timezone.now())
+                for libro in self.libros[inicio:inicio + cantidad]
+            ])
+        self.assertSinNMas1(reverse('app_tienda:mis_descargas'), crear)
+
+    def test_wishlist(self):
+        def crear(inicio, cantidad):
+            Wishlist.objects.bulk_create([
+                Wishlist(usuario=self.usuario, libro=libro) for libro in self.libros[inicio:inicio + cantidad]
+            ])
+        self.assertSinNMas1(reverse('app_tienda:wishlist'), crear)
+
+    def crear_carrito(self, inicio, cantidad):
+        CarritoItem.objects.bulk_create([
+            CarritoItem(usuario=self.usuario, libro=libro) for libro in self.libros[inicio:inicio + cantidad]
+        ])
+
+    def test_carrito(self):
+        self.assertSinNMas1(reverse('app_tienda:carrito'), self.crear_carrito)
+
+    def test_checkout(self):
+        self.assertSinNMas1(reverse('app_tienda:checkout'), self.crear_carrito)
+
+    def test_detalle_pedido(self):
+        def crear(inicio, cantidad):
+            DetallePedido.objects.bulk_create([
+                DetallePedido(pedido=self.pedido, libro=libro, precio_unitario=libro.precio, precio_total=libro.precio)
+                for libro in self.libros[inicio:inicio + cantidad]
+            ])
+        url = reverse('app_tienda:detalle_pedido', args=[self.pedido.numero_pedido])
+        self.assertSinNMas1(url, crear)
+        self.assertContains(self.client.get(url), 'Libro 24')
+
+
+class AdminPedidosTests(TestCase):
+    """Consola de pedidos: paginación por cursor con un número fijo de consultas por página."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin', email='admin@example.com', password='x', tipo_usuario='administrador',
+        )
+        cls.cliente = Usuario.objects.create_user(username='cliente', email='Cliente@Example.com', password='x')
+        cls.libros = crear_libros(3)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def crear_pedidos(self, cantidad):
+        inicio = Pedido.objects.count()
+        pedidos = Pedido.objects.bulk_create([
+            # Totales repetidos para comprobar el desempate por id del cursor
+            Pedido(usuario=self.cliente, numero_pedido=f'PED-{inicio + i}', total=Decimal((inicio + i) % 7))
+            for i in range(cantidad)
+        ])
+        DetallePedido.objects.bulk_create([
+            DetallePedido(pedido=pedido, libro=libro, precio_unitario=libro.precio, precio_total=libro.precio)
+            for pedido in pedidos for libro in self.libros
+        ])
+
+    def obtener(self, **parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('app_tienda:admin_pedidos'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(consultas)
+
+    def test_consultas_constantes_por_pagina(self):
+        self.crear_pedidos(3)
+        self.obtener()  # la primera petición guarda en sesión la decisión de acceso
+        _, pocas = self.obtener()
+
+        self.crear_pedidos(120)
+        respuesta, primera = self.obtener()
+        _, segunda = self.obtener(despues=respuesta.context['pagina'].siguiente)
+
+        self.assertEqual(len(respuesta.context['pagina']), 50)
+        self.assertEqual(pocas, primera)
+        self.assertEqual(primera, segunda)
+
+    def test_recorrido_completo_por_total(self):
+        self.crear_pedidos(23)
+        vistos, cursor, paginas = [], None, []
+        while True:
+            parametros = {'orden': 'total_desc'}
+            if cursor:
+                parametros['despues'] = cursor
+            with self.settings(ADMIN_PEDIDOS_POR_PAGINA=5):
+                pagina = self.obtener(**parametros)[0].context['pagina']
+            paginas.append((cursor, [p.pk for p in pagina]))
+            vistos.extend(pagina)
+            cursor = pagina.siguiente
+            if not cursor:
+                break
+
+        esperado = list(Pedido.objects.order_by('-total', '-id').values_list('pk', flat=True))
+        self.assertEqual([p.pk for p in vistos], esperado)
+
+        # "Anterior" desde la tercera página devuelve exactamente la segunda
+        with self.settings(ADMIN_PEDIDOS_POR_PAGINA=5):
+            tercera = self.obtener(orden='total_desc', despues=paginas[2][0])[0].context['pagina']
+            anterior = self.obtener(orden='total_desc', antes=tercera.anterior)[0].context['pagina']
+        self.assertEqual([p.pk for p in anterior], paginas[1][1])
+
+    def test_filtros(self):
+        self.crear_pedidos(10)
+        Pedido.objects.filter(numero_pedido='PED-3').update(estado='pagado')
+        respuesta, _ = self.obtener(email='cliente@example.com', estado='pagado', total_min='3', total_max='3')
+        self.assertEqual([p.numero_pedido for p in respuesta.context['pagina']], ['PED-3'])
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get(reverse('app_tienda:admin_pedidos'), {'despues': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ResenasTests(TestCase):
+    """Envío, listado paginado con primera página en caché y moderación en bloque."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin', email='admin@example.com', password='x', tipo_usuario='administrador',
+        )
+        cls.libro = crear_libros(1)[0]
+        cls.lectores = Usuario.objects.bulk_create([
+            Usuario(username=f'lector{i}', email=f'lector{i}@example.com') for i in range(25)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def crear_resenas(self, aprobada):
+        Resena.objects.bulk_create([
+            Resena(libro=self.libro, usuario=lector, calificacion=i % 5 + 1, comentario=f'Comentario {i}', aprobada=aprobada)
+            for i, lector in enumerate(self.lectores)
+        ])
+
+    def test_enviar_solo_compradores_y_queda_pendiente(self):
+        lector = self.lectores[0]
+        self.client.force_login(lector)
+        url = reverse('app_tienda:enviar_resena', args=[self.libro.slug])
+        datos = {'calificacion': 4, 'comentario': 'Muy bueno'}
+        self.assertEqual(self.client.post(url, datos).status_code, 403)
+
+        pedido = Pedido.objects.create(usuario=lector, numero_pedido='PED-R', estado='pagado')
+        DetallePedido.objects.create(pedido=pedido, libro=self.libro, precio_unitario=1, precio_total=1)
+        self.assertEqual(self.client.post(url, datos).status_code, 302)
+        resena = Resena.objects.get(libro=self.libro, usuario=lector)
+        self.assertFalse(resena.aprobada)
+
+        # Editar una reseña aprobada la devuelve a la cola y la descuenta
+        resenas.aprobar(Resena.objects.filter(pk=resena.pk))
+        self.client.post(url, {'calificacion': 2, 'comentario': 'Cambié de opinión'})
+        self.assertFalse(Resena.objects.get(pk=resena.pk).aprobada)
+        self.assertEqual(Libro.objects.get(pk=self.libro.pk).num_resenas, 0)
+
+    def test_listado_aprobadas_por_cursor_y_primera_pagina_en_cache(self):
+        self.crear_resenas(aprobada=True)
+        Resena.objects.filter(usuario=self.lectores[0]).update(aprobada=False)
+        with self.settings(RESENAS_POR_PAGINA=10):
+            primera = resenas.pagina(self.libro)
+            with self.assertNumQueries(0):
+                resenas.pagina(self.libro)
+            vistas, cursor = list(primera), primera.siguiente
+            while cursor:
+                respuesta = self.client.get(reverse('app_tienda:resenas_libro', args=[self.libro.slug]), {'despues': cursor})
+                vistas.extend(respuesta.context['resenas'])
+                cursor = respuesta.context['resenas'].siguiente
+        esperado = Resena.objects.filter(aprobada=True).order_by('-fecha_creacion', '-id').values_list('pk', flat=True)
+        self.assertEqual([r.pk for r in vistas], list(esperado))
+
+    def test_moderacion_en_bloque(self):
+        self.crear_resenas(aprobada=False)
+        resenas.pagina(self.libro)  # primera página vacía en caché
+        self.client.force_login(self.admin)
+        url = reverse('app_tienda:admin_resenas')
+        self.client.get(url)
+        ids = list(Resena.objects.order_by('pk').values_list('pk', flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as consultas:
+            self.client.post(url, {'accion': 'aprobar', 'resenas': ids[:20]})
+        self.assertEqual(sum(c['sql'].startswith('UPDATE "app_tienda_resena"') for c in consultas), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'accion': 'rechazar', 'resenas': ids[20:]})
+
+        self.assertEqual(Resena.objects.count(), 20)
+        self.assertEqual(calificaciones.recalcular(), 0)
+        self.assertEqual(len(resenas.pagina(self.libro)), 10)
+        self.assertEqual(len(self.client.get(url).context['pagina']), 0)
+
+
+class CalificacionesTests(TestCase):
+    """Los agregados de valoración siguen a cualquier alta, cambio o borrado de reseñas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.libro = crear_libros(1)[0]
+        cls.lectores = Usuario.objects.bulk_create([
+            Usuario(username=f'valora{i}', email=f'valora{i}@example.com') for i in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def valoracion(self):
+        libro = Libro.objects.get(pk=self.libro.pk)
+        return libro.num_resenas, libro.calificacion_media
+
+    def test_aprobar_editar_y_borrar_con_save(self):
+        resena = Resena.objects.create(libro=self.libro, usuario=self.lectores[0], calificacion=5, comentario='x')
+        self.assertEqual(self.valoracion(), (0, 0))
+        resena.aprobada = True
+        resena.save()
+        Resena.objects.create(libro=self.libro, usuario=self.lectores[1], calificacion=3, comentario='y', aprobada=True)
+        self.assertEqual(self.valoracion(), (2, 4.0))
+
+        resena.calificacion = 1
+        resena.save()
+        self.assertEqual(self.valoracion(), (2, 2.0))
+        resena.aprobada = False
+        resena.save()
+        self.assertEqual(self.valoracion(), (1, 3.0))
+        resena.delete()
+        self.assertEqual(self.valoracion(), (1, 3.0))
+        self.assertEqual(calificaciones.recalcular(), 0)
+
+    def test_borrado_en_cascada_y_por_queryset(self):
+        for i, lector in enumerate(self.lectores):
+            Resena.objects.create(libro=self.libro, usuario=lector, calificacion=i + 3, comentario='x', aprobada=True)
+        self.assertEqual(self.valoracion(), (3, 4.0))
+
+        self.lectores[2].delete()
+        self.assertEqual(self.valoracion(), (2, 3.5))
+        Resena.objects.filter(usuario=self.lectores[1]).delete()
+        self.assertEqual(self.valoracion(), (1, 3.0))
+        resenas.rechazar(Resena.objects.all())
+        self.assertEqual(self.valoracion(), (0, 0))
+        self.assertEqual(calificaciones.recalcular(), 0)
+
+    def test_carga_diferida_sin_consultas_extra(self):
+        for lector in self.lectores:
+            Resena.objects.create(libro=self.libro, usuario=lector, calificacion=4, comentario='x')
+        with self.assertNumQueries(1):
+            self.assertEqual([r.comentario for r in Resena.objects.only('comentario')], ['x'] * 3)
+
+
+def crear_cupon(**kwargs):
+    ahora = timezone.now()
+    datos = dict(
+        codigo='LECTOR10', tipo_descuento='porcentaje', valor=Decimal('10'), uso_maximo=1,
+        fecha_inicio=ahora - timedelta(days=1), fecha_fin=ahora + timedelta(days=1),
+    )
+    datos.update(kwargs)
+    return Cupon.objects.create(**datos)
+
+
+class CuponesTests(TestCase):
+    """Cupón en el checkout, canje condicional y caché negativa de códigos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        cls.libro = crear_libros(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+        CarritoItem.objects.create(usuario=self.usuario, libro=self.libro, cantidad=2)
+
+    def test_checkout_con_cupon(self):
+        cupon = crear_cupon()
+        respuesta = self.client.get(reverse('app_tienda:checkout'), {'cupon': 'LECTOR10'})
+        self.assertEqual(respuesta.context['descuento'], Decimal('2.00'))
+
+        self.client.post(reverse('app_tienda:checkout'), {'cupon': 'LECTOR10'})
+        pedido = Pedido.objects.get(usuario=self.usuario)
+        self.assertEqual((pedido.cupon, pedido.descuento, pedido.total), (cupon, Decimal('2.00'), Decimal('20.88')))
+        cupon.refresh_from_db()
+        self.assertEqual(cupon.usos_realizados, 1)
+
+    def test_cupon_agotado_no_crea_pedido(self):
+        cupon = crear_cupon()
+        Cupon.objects.filter(pk=cupon.pk).update(usos_realizados=1)  # otro cliente lo canjeó antes
+        with self.assertRaises(cupones.CuponInvalido):
+            cupones.canjear(cupon)
+        respuesta = self.client.post(reverse('app_tienda:checkout'), {'cupon': 'LECTOR10'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['error_cupon'])
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_cache_negativa(self):
+        with self.assertRaises(cupones.CuponInvalido):
+            cupones.buscar('NOEXISTE')
+        with self.assertNumQueries(0), self.assertRaises(cupones.CuponInvalido):
+            cupones.buscar('NOEXISTE')
+        with self.assertNumQueries(0), self.assertRaises(cupones.CuponInvalido):
+            cupones.buscar("' OR 1=1 --")
+
+        # Crear el cupón olvida el código recordado como inválido
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_cupon(codigo='NOEXISTE')
+        self.assertEqual(cupones.buscar('NOEXISTE').codigo, 'NOEXISTE')
+
+
+class CanjeConcurrenteTests(TransactionTestCase):
+    """Prueba de carga: 500 canjes simultáneos de un cupón de 50 usos."""
+
+    PETICIONES = 500
+    USOS = 50
+
+    def test_sin_sobrecanje(self):
+        cupon = crear_cupon(uso_maximo=self.USOS)
+        barrera = threading.Barrier(self.PETICIONES)
+        resultados = []
+
+        def canjear():
+            try:
+                barrera.wait()
+                while True:
+                    try:
+                        cupones.canjear(cupon)
+                        resultados.append(True)
+                        return
+                    except cupones.CuponInvalido:
+                        resultados.append(False)
+                        return
+                    except OperationalError:
+                        # SQLite bloquea la tabla entera durante cada escritura: reintentar
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=canjear) for _ in range(self.PETICIONES)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        cupon.refresh_from_db()
+        self.assertEqual(len(resultados), self.PETICIONES)
+        self.assertEqual(resultados.count(True), self.USOS)
+        self.assertEqual(cupon.usos_realizados, self.USOS)
+
+
+class PurgarCaducadosTests(TestCase):
+    """Limpieza por tramos de PK: solo borra lo caducado y se reanuda tras interrumpirse."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        cls.libros = crear_libros(10)
+        cls.pedido = Pedido.objects.create(usuario=cls.usuario, numero_pedido='PED-LIMPIEZA')
+
+    def test_borrado_por_lotes_reanudable(self):
+        ahora = timezone.now()
+        CarritoItem.objects.bulk_create([CarritoItem(usuario=self.usuario, libro=libro) for libro in self.libros])
+        # Los pares se abandonaron hace 100 días; los impares siguen vivos
+        viejos = [item.pk for item in CarritoItem.objects.order_by('pk')][::2]
+        CarritoItem.objects.filter(pk__in=viejos).update(fecha_actualizado=ahora - timedelta(days=100))
+        EntregaDigital.objects.bulk_create([
+            EntregaDigital(pedido=self.pedido, libro=libro, usuario=self.usuario,
+                           expiracion=ahora - timedelta(days=60 if i < 3 else -300))
+            for i, libro in enumerate(self.libros)
+        ])
+
+        salida = io.StringIO()
+        call_command('purgar_caducados', 'carritos', 'entregas', lote=2, pausa=0, max_lotes=2, stdout=salida)
+        self.assertIn('Detenido tras 2 lotes', salida.getvalue())
+        self.assertEqual(CarritoItem.objects.count(), 8)
+
+        call_command('purgar_caducados', lote=2, pausa=0, stdout=salida)
+        self.assertIn('Reanudando', salida.getvalue())
+        self.assertFalse(CarritoItem.objects.filter(pk__in=viejos).exists())
+        self.assertEqual(CarritoItem.objects.count(), 5)
+        self.assertEqual(EntregaDigital.objects.count(), 7)
+        datos = PuntoControl.objects.get(nombre='purgar_caducados').datos
+        self.assertEqual((datos['fase'], datos['borrados']), ('completada', {'carritos': 5, 'entregas': 3}))
+
+
+class CacheHttpTests(TestCase):
+    """GET condicional de las páginas públicas: 304 sin ejecutar la vista para anónimos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.libro = crear_libros(1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidar(self, url, respuesta, consultas):
+        with self.assertNumQueries(consultas):
+            repetida = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        return repetida
+
+    def test_listados_dependen_de_la_version_del_catalogo(self):
+        for nombre in ('index', 'catalogo', 'ofertas'):
+            url = reverse(f'app_tienda:{nombre}')
+            respuesta = self.client.get(url)
+            self.assertIn('public', respuesta['Cache-Control'])
+            self.assertIn('Cookie', respuesta['Vary'])
+            self.assertTrue(respuesta.has_header('Last-Modified'))
+            self.assertEqual(self.revalidar(url, respuesta, 0).status_code, 304)
+
+        url = reverse('app_tienda:catalogo')
+        respuesta = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Libro.objects.get(pk=self.libro.pk).save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+    def test_detalle_libro(self):
+        url = reverse('app_tienda:detalle_libro', args=[self.libro.slug])
+        respuesta = self.client.get(url)
+        repetida = self.revalidar(url, respuesta, 1)
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida['ETag'], respuesta['ETag'])
+
+        # Una reseña aprobada cambia la ficha aunque no toque fecha_actualizacion,
+        # pero solo la de su libro: el catálogo y las demás fichas siguen valiendo
+        otro = crear_libros(1, inicio=1)[0]
+        url_otro = reverse('app_tienda:detalle_libro', args=[otro.slug])
+        respuesta_otro = self.client.get(url_otro)
+        version = version_catalogo()
+        usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            Resena.objects.create(libro=self.libro, usuario=usuario, calificacion=5, comentario='.', aprobada=True)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(url_otro, HTTP_IF_NONE_MATCH=respuesta_otro['ETag']).status_code, 304)
+        self.assertEqual(version_catalogo(), version)
+
+        self.assertEqual(self.client.get(reverse('app_tienda:detalle_libro', args=['no-existe'])).status_code, 404)
+
+    def test_pagina_anonima_con_token_csrf(self):
+        modificacion = timezone.now().replace(microsecond=0)
+
+        @cache_publico(lambda request: (('v1',), modificacion))
+        def vista(request):
+            return HttpResponse(Template('{% csrf_token %}').render(RequestContext(request)))
+
+        pagina = CsrfViewMiddleware(vista)
+        respuesta = pagina(RequestFactory().get('/'))
+        self.assertIn('csrftoken', respuesta.cookies)
+        self.assertIn('private', respuesta['Cache-Control'])
+        self.assertNotIn('public', respuesta['Cache-Control'])
+        self.assertTrue(respuesta.has_header('ETag'))
+        self.assertTrue(respuesta.has_header('Last-Modified'))
+
+        # La siguiente visita ya lleva la cookie de CSRF (sin sesión) y revalida
+        peticion = RequestFactory().get('/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        peticion.COOKIES['csrftoken'] = respuesta.cookies['csrftoken'].value
+        self.assertEqual(pagina(peticion).status_code, 304)
+
+    def test_con_sesion_no_se_comparte(self):
+        usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('app_tienda:index'))
+        self.assertIn('private', respuesta['Cache-Control'])
+        self.assertFalse(respuesta.has_header('ETag'))
+
+
+class FragmentosPlantillaTests(TestCase):
+    """Tarjetas de libro, menú y listado de categorías cacheados con {% cache %}."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.libro = crear_libros(1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tarjeta_se_regenera_al_cambiar_el_libro(self):
+        url = reverse('app_tienda:catalogo')
+        self.assertContains(self.client.get(url), 'Libro 0')
+
+        # Sin tocar fecha_actualizacion se sirve la tarjeta cacheada
+        Libro.objects.filter(pk=self.libro.pk).update(titulo='Cambiado')
+        self.assertNotContains(self.client.get(url), 'Cambiado')
+
+        Libro.objects.filter(pk=self.libro.pk).update(fecha_actualizacion=timezone.now() + timedelta(seconds=1))
+        self.assertContains(self.client.get(url), 'Cambiado')
+
+    def test_menu_depende_de_la_version_del_catalogo(self):
+        url = reverse('app_tienda:index')
+        self.assertNotContains(self.client.get(url), 'Poesía')
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria = Categoria.objects.create(nombre='Poesía', slug='poesia')
+        # En el menú de navegación y en el listado de categorías del inicio
+        self.assertContains(self.client.get(url), f'?categoria={categoria.pk}', count=2)
+
+
+class EstaticosTests(TestCase):
+    """collectstatic con nombres con hash y copias .gz, servidas por EstaticosMiddleware."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(
+            STATIC_ROOT=directorio.name,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'app_tienda.estaticos.AlmacenEstaticos'},
+            },
+            ESTATICOS_SERVIR=True,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def descargar(self, url, **cabeceras):
+        respuesta = self.client.get(url, **cabeceras)
+        return respuesta, b''.join(respuesta.streaming_content)
+
+    def test_nombre_con_hash_comprimido_e_inmutable(self):
+        url = static('app_tienda/css/styles.css')
+        self.assertRegex(url, r'styles\.[0-9a-f]{12}\.css$')
+
+        respuesta, original = self.descargar(url)
+        self.assertIsNone(respuesta.get('Content-Encoding'))
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+
+        respuesta, comprimido = self.descargar(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(respuesta['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(comprimido), original)
+        self.assertLess(len(comprimido), len(original))
+
+    def test_sin_hash_revalida_y_no_sale_de_static_root(self):
+        respuesta, _ = self.descargar('/static/app_tienda/css/styles.css')
+        self.assertNotIn('immutable', respuesta['Cache-Control'])
+        repetida = self.client.get('/static/app_tienda/css/styles.css', HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified'])
+        self.assertEqual(repetida.status_code, 304)
+
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/static/no-existe.css').status_code, 404)
+
+
+class KpisTests(TestCase):
+    """Resúmenes diarios: actualizar_kpis corrige los días de pedidos antiguos modificados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Usuario.objects.create_user(username='cliente', email='cliente@example.com', password='x')
+        cls.libro = crear_libros(1)[0]
+
+    def crear_pedido(self, estado, hace_dias):
+        pedido = Pedido.objects.create(usuario=self.cliente, estado=estado, total=Decimal('11.60'))
+        DetallePedido.objects.create(
+            pedido=pedido, libro=self.libro, cantidad=2, precio_unitario=Decimal('5.00'), precio_total=Decimal('10.00'),
+        )
+        fecha = timezone.now() - timedelta(days=hace_dias)
+        Pedido.objects.filter(pk=pedido.pk).update(fecha_creacion=fecha, fecha_actualizacion=fecha)
+        pedido.refresh_from_db()
+        return pedido
+
+    def test_reembolso_de_un_pedido_antiguo(self):
+        pedido = self.crear_pedido('completado', hace_dias=7)
+        dia = timezone.localdate(pedido.fecha_creacion)
+        call_command('backfill_kpis', desde=dia.isoformat(), stdout=io.StringIO())
+        self.assertEqual(ResumenDiario.objects.get(fecha=dia).ingresos, Decimal('11.60'))
+
+        # El reembolso toca fecha_actualizacion, no fecha_creacion
+        Pedido.objects.filter(pk=pedido.pk).update(estado='reembolsado', fecha_actualizacion=timezone.now())
+        call_command('actualizar_kpis', stdout=io.StringIO())
+
+        resumen = ResumenDiario.objects.get(fecha=dia)
+        self.assertEqual((resumen.pedidos, resumen.ingresos, resumen.unidades), (0, Decimal('0'), 0))
+        self.assertEqual(
+            dict(PedidosEstadoDiario.objects.filter(fecha=dia).values_list('estado', 'cantidad')), {'reembolsado': 1},
+        )
+        self.assertFalse(VentaLibroDiaria.objects.filter(fecha=dia).exists())
+
+    def test_dias_sin_cambios_no_se_recalculan(self):
+        self.crear_pedido('completado', hace_dias=7)
+        hoy = timezone.localdate()
+        self.assertEqual(kpis.dias_modificados(hoy - timedelta(days=1), hoy), [])
+
+
+class ExportacionesTests(TestCase):
+    """Exportación CSV sin fórmulas en los campos que escribe el cliente."""
+
+    def exportar(self, recurso, formato):
+        queryset = exportaciones.construir_queryset(recurso)
+        return ''.join(exportaciones.filas(recurso, queryset, formato))
+
+    def test_celdas_con_formula_se_neutralizan(self):
+        Usuario.objects.create_user(
+            username='@malicioso', email='m@example.com', password='x',
+            first_name='=HYPERLINK("http://example.com")', last_name='-2+3',
+        )
+        fila = list(csv.DictReader(io.StringIO(self.exportar('usuarios', 'csv'))))[0]
+        self.assertEqual(fila['username'], "'@malicioso")
+        self.assertEqual(fila['first_name'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(fila['last_name'], "'-2+3")
+        self.assertEqual(fila['email'], 'm@example.com')
+
+        # JSONL no lo interpreta una hoja de cálculo: se exporta sin tocar
+        self.assertEqual(json.loads(self.exportar('usuarios', 'jsonl'))['username'], '@malicioso')
+
+    def test_pedidos_con_cupon_y_descuento(self):
+        usuario = Usuario.objects.create_user(username='cliente', email='c@example.com', password='x')
+        cupon = crear_cupon(codigo='VERANO')
+        Pedido.objects.create(usuario=usuario, numero_pedido='PED-1', subtotal=Decimal('20.00'))
+        Pedido.objects.create(
+            usuario=usuario, numero_pedido='PED-2', subtotal=Decimal('20.00'), cupon=cupon, descuento=Decimal('5.00'),
+        )
+        with self.assertNumQueries(1):
+            filas = list(csv.DictReader(io.StringIO(self.exportar('pedidos', 'csv'))))
+        self.assertEqual([(f['cupon'], f['descuento']) for f in filas], [('', '0.00'), ('VERANO', '5.00')])
+        self.assertEqual(
+            [(f['cupon'], f['descuento']) for f in map(json.loads, self.exportar('pedidos', 'jsonl').splitlines())],
+            [(None, '0.00'), ('VERANO', '5.00')],
+        )
+
+
+class ImportacionTests(TestCase):
+    """Importación del catálogo: los medios no pueden salir del directorio indicado."""
+
+    def setUp(self):
+        raiz = tempfile.TemporaryDirectory()
+        self.addCleanup(raiz.cleanup)
+        self.medios = os.path.join(raiz.name, 'medios')
+        os.makedirs(self.medios)
+        with open(os.path.join(self.medios, 'portada.jpg'), 'wb') as f:
+            f.write(b'jpg')
+        with open(os.path.join(raiz.name, 'secreto.txt'), 'w') as f:
+            f.write('secreto')
+        os.symlink(os.path.join(raiz.name, 'secreto.txt'), os.path.join(self.medios, 'enlace.jpg'))
+        ajustes = override_settings(MEDIA_ROOT=os.path.join(raiz.name, 'media'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def importar(self, portadas):
+        filas = ['isbn,titulo,autor,descripcion,precio,portada']
+        filas += [f'978000000000{i},Libro {i},Autor,-,10.00,{portada}' for i, portada in enumerate(portadas)]
+        return ImportadorCatalogo(medios_dir=self.medios, hilos=1).importar(io.StringIO('\n'.join(filas)))
+
+    def test_rutas_fuera_del_directorio_de_medios(self):
+        informe = self.importar(['portada.jpg', '../secreto.txt', '/etc/passwd', 'enlace.jpg'])
+
+        self.assertEqual(informe.creadas, 1)
+        self.assertEqual([isbn for _, isbn, _ in informe.invalidas], ['9780000000001', '9780000000002', '9780000000003'])
+        self.assertIn('sale del directorio de medios', informe.invalidas[0][2])
+        portada = Libro.objects.get().portada.name
+        self.assertRegex(portada, r'^portadas/portada\.[0-9a-f]{16}\.jpg$')
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'portadas')), [os.path.basename(portada)])
+
+    def test_mismo_nombre_y_tamanio_con_distinto_contenido(self):
+        for carpeta, contenido in (('a', b'aaa'), ('b', b'bbb')):
+            os.makedirs(os.path.join(self.medios, carpeta))
+            with open(os.path.join(self.medios, carpeta, 'cover.jpg'), 'wb') as f:
+                f.write(contenido)
+        self.importar(['a/cover.jpg', 'b/cover.jpg'])
+        # Reimportar reutiliza los archivos ya copiados
+        self.importar(['a/cover.jpg', 'b/cover.jpg'])
+
+        contenidos = [libro.portada.read() for libro in Libro.objects.order_by('isbn')]
+        self.assertEqual(contenidos, [b'aaa', b'bbb'])
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'portadas'))), 2)
+
+
+class PromocionesTests(TestCase):
+    """Aplicar y revertir campañas, y límites del descuento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sin_oferta, cls.oferta_mejor, cls.oferta_peor = crear_libros(3)
+        Libro.objects.filter(pk=cls.oferta_mejor.pk).update(precio_descuento=Decimal('5.00'), en_oferta=True)
+        Libro.objects.filter(pk=cls.oferta_peor.pk).update(precio_descuento=Decimal('9.00'), en_oferta=True)
+
+    def crear_campania(self, valor, tipo='porcentaje'):
+        ahora = timezone.now()
+        campania = Campania.objects.create(
+            nombre='Campaña', tipo_descuento=tipo, valor=valor,
+            fecha_inicio=ahora - timedelta(hours=1), fecha_fin=ahora + timedelta(days=1),
+        )
+        campania.libros.set([self.sin_oferta, self.oferta_mejor, self.oferta_peor])
+        return campania
+
+    def ofertas(self):
+        return {
+            libro.pk: (libro.precio_descuento, libro.en_oferta)
+            for libro in Libro.objects.only('precio_descuento', 'en_oferta')
+        }
+
+    def test_aplicar_y_revertir(self):
+        antes = self.ofertas()
+        campania = self.crear_campania(Decimal('20'))
+
+        self.assertEqual(promociones.aplicar(campania), 2)
+        despues = self.ofertas()
+        self.assertEqual(despues[self.sin_oferta.pk], (Decimal('8.00'), True))
+        self.assertEqual(despues[self.oferta_peor.pk], (Decimal('8.00'), True))
+        # La oferta previa era mejor que la de la campaña
+        self.assertEqual(despues[self.oferta_mejor.pk], (Decimal('5.00'), True))
+
+        self.assertEqual(promociones.revertir(campania), 2)
+        self.assertEqual(self.ofertas(), antes)
+        campania.refresh_from_db()
+        self.assertEqual(campania.estado, 'finalizada')
+
+    def test_precio_de_campania_no_positivo_se_omite(self):
+        # 99.99% de 10.00 redondea a 0.00
+        campania = self.crear_campania(Decimal('99.99'))
+        self.assertFalse(promociones.libros_objetivo(campania).exists())
+        self.assertEqual(promociones.aplicar(campania), 0)
+
+    def test_limites(self):
+        ahora = timezone.now()
+        campania = Campania(
+            nombre='Mal', tipo_descuento='porcentaje', valor=Decimal('150'),
+            fecha_inicio=ahora, fecha_fin=ahora - timedelta(days=1),
+        )
+        with self.assertRaises(ValidationError) as error:
+            campania.full_clean()
+        self.assertEqual(set(error.exception.message_dict), {'valor', 'fecha_fin'})
+
+        # Un descuento fijo sí puede pasar de 100
+        Campania(
+            nombre='Fijo', tipo_descuento='fijo', valor=Decimal('150'),
+            fecha_inicio=ahora, fecha_fin=ahora + timedelta(days=1),
+        ).full_clean()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.crear_campania(Decimal('100'))
+
+
+class AutenticacionTests(TestCase):
+    """Login por correo o usuario sin distinguir mayúsculas, y registro sin duplicados por mayúsculas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='Lector', email='Lector@Example.com', password='clave-1234')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_login_por_correo_y_por_usuario(self):
+        for identificador in ('lector@example.com', 'LECTOR@EXAMPLE.COM', ' lector ', 'LeCtOr'):
+            with self.subTest(identificador=identificador):
+                self.assertEqual(authenticate(username=identificador, password='clave-1234'), self.usuario)
+        self.assertIsNone(authenticate(username='lector', password='otra'))
+        self.assertIsNone(authenticate(username='nadie@example.com', password='clave-1234'))
+
+        respuesta = self.client.post(reverse('app_tienda:login'), {'email': 'LECTOR', 'password': 'clave-1234'})
+        self.assertRedirects(respuesta, reverse('app_tienda:index'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.usuario.pk)
+
+    def test_registro_rechaza_duplicado_por_mayusculas(self):
+        datos = {'password': 'clave-1234', 'password_confirm': 'clave-1234', 'telefono': ''}
+        for email, username in (('LECTOR@example.com', 'otro'), ('otro@example.com', 'lECTOR')):
+            with self.subTest(email=email, username=username):
+                form = RegistroForm({**datos, 'email': email, 'username': username})
+                self.assertFalse(form.is_valid())
+                respuesta = self.client.post(reverse('app_tienda:registro'), {**datos, 'email': email, 'username': username})
+                self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(Usuario.objects.count(), 1)
+
+
+class RateLimitTests(TestCase):
+    """Algoritmos del almacén local, respuesta 429 y retirada de claves."""
+
+    def test_token_bucket(self):
+        almacen = ratelimit.AlmacenLocal()
+        self.assertEqual(almacen.token_bucket('k', 2, 10, 1000), (True, 0))
+        self.assertEqual(almacen.token_bucket('k', 2, 10, 1000), (True, 0))
+        self.assertEqual(almacen.token_bucket('k', 2, 10, 1000), (False, 5.0))
+        # Se repone un token cada periodo / limite segundos
+        self.assertEqual(almacen.token_bucket('k', 2, 10, 1005), (True, 0))
+        self.assertFalse(almacen.token_bucket('k', 2, 10, 1005)[0])
+
+    def test_ventana_deslizante(self):
+        almacen = ratelimit.AlmacenLocal()
+        self.assertTrue(almacen.ventana('k', 2, 10, 1000)[0])
+        self.assertTrue(almacen.ventana('k', 2, 10, 1000)[0])
+        self.assertEqual(almacen.ventana('k', 2, 10, 1000), (False, 10))
+        # Al empezar la ventana siguiente aún pesan enteras las 3 de la anterior
+        self.assertFalse(almacen.ventana('k', 2, 10, 1010)[0])
+
+        almacen = ratelimit.AlmacenLocal()
+        for _ in range(3):
+            almacen.ventana('k', 2, 10, 1000)
+        # Al 80 % de la siguiente solo cuenta un 20 %: 3 * 0.2 + 1 <= 2
+        self.assertTrue(almacen.ventana('k', 2, 10, 1018)[0])
+
+    def test_retirada_de_claves(self):
+        almacen = ratelimit.AlmacenLocal()
+        almacen.MAX_CLAVES = 3
+        for clave in 'abc':
+            almacen.ventana(clave, 5, 10, 0)
+        almacen.ventana('a', 5, 10, 1)
+        # Lleno: sale la clave usada hace más tiempo, no la primera insertada
+        almacen.ventana('d', 5, 10, 2)
+        self.assertEqual(list(almacen._estado), ['c', 'a', 'd'])
+        # Las caducadas salen por delante al escribir
+        almacen.ventana('e', 5, 10, 21.5)
+        self.assertEqual(list(almacen._estado), ['d', 'e'])
+
+    @override_settings(
+        RATELIMIT_ACTIVO=True, RATELIMIT_ALMACEN='local',
+        RATELIMIT_POLITICAS={'login': [{'clave': 'ip', 'limite': 1, 'periodo': 60, 'metodos': ['POST']}]},
+    )
+    def test_respuesta_429(self):
+        ratelimit._almacenes.clear()
+        url = reverse('app_tienda:login')
+        datos = {'email': 'nadie@example.com', 'password': 'x'}
+        self.assertEqual(self.client.post(url, datos).status_code, 200)
+        with self.assertNumQueries(0), self.assertLogs('app_tienda.ratelimit', 'WARNING'):
+            respuesta = self.client.post(url, datos)
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertTrue(1 <= int(respuesta['Retry-After']) <= 60)
+        # Las otras IPs y los GET no cuentan
+        self.assertEqual(self.client.post(url, datos, REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_login_por_cuenta_no_bloquea_otras_ips(self):
+        ratelimit._almacenes.clear()
+        url = reverse('app_tienda:login')
+        datos = {'email': 'Victima@example.com', 'password': 'x'}
+        # Política por defecto: 5 intentos por (IP, cuenta) cada 5 minutos
+        for _ in range(5):
+            self.client.post(url, datos, REMOTE_ADDR='10.0.0.66')
+        with self.assertLogs('app_tienda.ratelimit', 'WARNING'):
+            self.assertEqual(self.client.post(url, datos, REMOTE_ADDR='10.0.0.66').status_code, 429)
+            datos['email'] = 'victima@example.com'
+            self.assertEqual(self.client.post(url, datos, REMOTE_ADDR='10.0.0.66').status_code, 429)
+        # La víctima sigue pudiendo intentarlo desde su IP
+        self.assertEqual(self.client.post(url, datos, REMOTE_ADDR='10.0.0.7').status_code, 200)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+        'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-sesiones'},
+    },
+    SESSION_CACHE_ALIAS='sesiones', SESSION_ESCRITURA_DB_SEGUNDOS=300,
+)
+class SesionesTests(TestCase):
+    """Motor de sesiones: lectura desde caché, escritura diferida y login inmediato."""
+
+    def setUp(self):
+        sesion = SessionStore()
+        sesion['visitas'] = 1
+        sesion.save()
+        self.clave = sesion.session_key
+
+    def en_db(self):
+        return Session.objects.get(pk=self.clave).get_decoded()
+
+    def test_lectura_desde_cache(self):
+        sesion = SessionStore(self.clave)
+        with self.assertNumQueries(0):
+            self.assertEqual(sesion.load(), {'visitas': 1})
+            # Marcada como modificada pero con los mismos datos: no se escribe nada
+            sesion['visitas'] = 1
+            sesion.save()
+
+    def test_escritura_diferida(self):
+        sesion = SessionStore(self.clave)
+        sesion['visitas'] = 2
+        with self.assertNumQueries(0):
+            sesion.save()
+        self.assertEqual(SessionStore(self.clave).load(), {'visitas': 2})
+        self.assertEqual(self.en_db(), {'visitas': 1})
+
+        sesion = SessionStore(self.clave)
+        sesion['visitas'] = 3
+        with mock.patch('app_tienda.sesiones.time.time', return_value=time.time() + 301):
+            sesion.save()
+        self.assertEqual(self.en_db(), {'visitas': 3})
+
+    def test_login_se_escribe_al_momento(self):
+        sesion = SessionStore(self.clave)
+        sesion[SESSION_KEY] = '1'
+        sesion[HASH_SESSION_KEY] = 'hash'
+        sesion.save()
+        self.assertEqual(self.en_db()[SESSION_KEY], '1')
+
+        usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='clave-1234')
+        self.client.post(reverse('app_tienda:login'), {'email': 'lector', 'password': 'clave-1234'})
+        clave = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertEqual(Session.objects.get(pk=clave).get_decoded()[SESSION_KEY], str(usuario.pk))
+
+    @override_settings(SESSION_CACHE_ALIAS='default')
+    def test_con_la_cache_general_se_escribe_siempre(self):
+        sesion = SessionStore()
+        sesion.create()
+        sesion['visitas'] = 5
+        sesion.save()
+        self.assertEqual(Session.objects.get(pk=sesion.session_key).get_decoded(), {'visitas': 5})
+
+
+class AccesoAdminTests(TestCase):
+    """El middleware deja entrar en /admin/ solo a administradores y no se fía de una decisión obsoleta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Usuario.objects.create_user(username='cliente', email='cliente@example.com', password='x')
+        cls.staff = Usuario.objects.create_user(
+            username='staff', email='staff@example.com', password='x', is_staff=True,
+        )
+
+    def setUp(self):
+        self.url = reverse('admin:index')
+        self.login = f"{reverse(settings.LOGIN_URL)}?next={self.url}"
+
+    def test_anonimo_y_no_administrador(self):
+        self.assertRedirects(self.client.get(self.url), self.login, fetch_redirect_response=False)
+        self.client.force_login(self.cliente)
+        self.assertRedirects(self.client.get(self.url), self.login, fetch_redirect_response=False)
+
+    def test_administrador_y_revocacion(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        # Dentro de la vigencia de la decisión, pero el usuario ha cambiado
+        self.staff.is_staff = False
+        self.staff.save(update_fields=['is_staff'])
+        self.assertRedirects(self.client.get(self.url), self.login, fetch_redirect_response=False)
+
+    def test_cambio_de_usuario_en_la_sesion(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.force_login(self.cliente)
+        self.assertRedirects(self.client.get(self.url), self.login, fetch_redirect_response=False)
+
+
+class VistasAsyncTests(TestCase):
+    """Vistas async: login obligatorio, errores genéricos y descargas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        cls.libro, = crear_libros(1)
+        cls.item = Wishlist.objects.create(usuario=cls.usuario, libro=cls.libro)
+        cls.pedido = Pedido.objects.create(usuario=cls.usuario, numero_pedido='PED-ASYNC')
+        cls.entrega = EntregaDigital.objects.create(
+            pedido=cls.pedido, libro=cls.libro, usuario=cls.usuario, expiracion=timezone.now() + timedelta(days=1),
+        )
+
+    async def post_json(self, nombre, cuerpo):
+        respuesta = await self.async_client.post(
+            reverse(f'app_tienda:{nombre}'), cuerpo, content_type='application/json',
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        return respuesta.json()
+
+    async def test_login_obligatorio(self):
+        url = reverse('app_tienda:mover_wishlist_a_carrito')
+        respuesta = await self.async_client.post(url, {}, content_type='application/json')
+        self.assertRedirects(respuesta, f"{reverse(settings.LOGIN_URL)}?next={url}", fetch_redirect_response=False)
+        self.assertTrue(await Wishlist.objects.filter(pk=self.item.pk).aexists())
+
+    async def test_errores_genericos(self):
+        await self.async_client.aforce_login(self.usuario)
+        for nombre in ('mover_wishlist_a_carrito', 'eliminar_wishlist_lote'):
+            for cuerpo in ('{', '[1]', {'item_ids': ['x']}, {'item_id': None}, {}):
+                with self.subTest(nombre=nombre, cuerpo=cuerpo):
+                    datos = await self.post_json(nombre, cuerpo)
+                    self.assertEqual(datos, {'success': False, 'error': 'No se pudo procesar la solicitud.'})
+        self.assertTrue(await Wishlist.objects.filter(pk=self.item.pk).aexists())
+
+        datos = await self.post_json('eliminar_wishlist_lote', {'item_ids': [self.item.pk]})
+        self.assertEqual((datos['success'], datos['eliminados']), (True, 1))
+
+    async def test_catalogo_con_categoria_no_valida(self):
+        respuesta = await self.async_client.get(reverse('app_tienda:catalogo'), {'categoria': 'abc'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, self.libro.titulo)
+
+    async def test_descarga(self):
+        await self.async_client.aforce_login(self.usuario)
+        url = reverse('app_tienda:descargar_libro', args=[self.entrega.token])
+        with tempfile.TemporaryDirectory() as medios, override_settings(MEDIA_ROOT=medios):
+            # Sin el archivo no se consume la descarga
+            respuesta = await self.async_client.get(url)
+            self.assertEqual(respuesta.status_code, 404)
+            await self.entrega.arefresh_from_db()
+            self.assertEqual(self.entrega.descargas_realizadas, 0)
+
+            os.makedirs(os.path.join(medios, 'libros_digitales'))
+            with open(os.path.join(medios, 'libros_digitales', 'libro.pdf'), 'wb') as archivo:
+                archivo.write(b'%PDF contenido')
+            respuesta = await self.async_client.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(b''.join([bloque async for bloque in respuesta.streaming_content]), b'%PDF contenido')
+            self.assertEqual(respuesta['Content-Length'], '14')
+            await self.entrega.arefresh_from_db()
+            self.assertEqual(self.entrega.descargas_realizadas, 1)
+
+
+def _tarea_que_falla():
+    Categoria.objects.create(nombre='Creada por una tarea fallida')
+    raise RuntimeError('SMTP caído')
+
+
+class TareasTests(TestCase):
+    """Cola de tareas: reclamación, reintentos, transacciones y entregas de pedidos grandes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+
+    def test_reclamar(self):
+        ahora = timezone.now()
+        Tarea.objects.bulk_create([
+            Tarea(nombre='crear_entregas', prioridad=2, ejecutar_despues=ahora),
+            Tarea(nombre='crear_entregas', prioridad=0, ejecutar_despues=ahora),
+            Tarea(nombre='crear_entregas', prioridad=0, ejecutar_despues=ahora + timedelta(hours=1)),
+        ])
+        reclamadas = tareas.reclamar('w1', limite=5)
+        self.assertEqual([t.prioridad for t in reclamadas], [0, 2])
+        self.assertEqual({(t.estado, t.trabajador) for t in reclamadas}, {('en_proceso', 'w1')})
+        self.assertEqual(tareas.reclamar('w2', limite=5), [])
+
+        # Un trabajador caído: al vencer el bloqueo otro la recupera
+        Tarea.objects.filter(pk=reclamadas[0].pk).update(bloqueada_hasta=ahora - timedelta(seconds=1))
+        self.assertEqual([t.pk for t in tareas.reclamar('w2', limite=5)], [reclamadas[0].pk])
+
+    @mock.patch('app_tienda.tareas.random.uniform', return_value=1)
+    def test_espera_exponencial_con_tope(self, _):
+        self.assertEqual([tareas.espera_reintento(i) for i in (1, 2, 3, 8, 20)], [30, 60, 120, 3600, 3600])
+
+    @mock.patch.dict(tareas.REGISTRO, {'falla': (_tarea_que_falla, 1, 2)})
+    def test_reintento_y_fallida(self):
+        tarea = tareas.encolar('falla')
+        antes = timezone.now()
+        with mock.patch('app_tienda.tareas.random.uniform', return_value=1):
+            self.assertEqual(tareas.procesar_pendientes('w1'), (0, 1))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('pendiente', 1))
+        self.assertAlmostEqual((tarea.ejecutar_despues - antes).total_seconds(), 30, delta=2)
+        self.assertIn('SMTP caído', tarea.ultimo_error)
+        # Lo que hizo la tarea antes de fallar se deshace
+        self.assertFalse(Categoria.objects.exists())
+        self.assertEqual(tareas.procesar_pendientes('w1'), (0, 0))
+
+        Tarea.objects.filter(pk=tarea.pk).update(ejecutar_despues=timezone.now())
+        with self.assertLogs('app_tienda.tareas', 'ERROR'):
+            self.assertEqual(tareas.procesar_pendientes('w1'), (0, 1))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+        self.assertIsNotNone(tarea.fecha_finalizacion)
+        self.assertEqual(tareas.reclamar('w1'), [])
+
+    def test_rollback_no_deja_tarea(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            tareas.encolar('enviar_confirmacion', pedido_id=1)
+            raise RuntimeError
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_entregas_asincronas_de_pedido_grande(self):
+        libros = crear_libros(settings.TAREAS_ENTREGAS_ASINCRONAS_DESDE)
+        CarritoItem.objects.bulk_create([CarritoItem(usuario=self.usuario, libro=libro) for libro in libros])
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('app_tienda:checkout'))
+        pedido = Pedido.objects.get()
+        self.assertFalse(EntregaDigital.objects.exists())
+        self.assertEqual(list(Tarea.objects.values_list('nombre', flat=True)), ['crear_entregas'])
+
+        self.assertEqual(tareas.procesar_pendientes('w1'), (1, 0))
+        self.assertEqual(EntregaDigital.objects.filter(pedido=pedido).count(), len(libros))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(tareas.procesar_pendientes('w1'), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(pedido.numero_pedido, mail.outbox[0].subject)
+        self.assertEqual(mail.outbox[0].body.count('/descargar/'), len(libros))
+
+
+class HistorialTests(TestCase):
+    """Historial de pedidos: inserción transaccional, agrupación y consulta por meses."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        cls.pedido = Pedido.objects.create(usuario=cls.usuario, numero_pedido='PED-HISTORIAL')
+
+    def acciones(self):
+        return list(HistorialPedido.objects.order_by('id').values_list('accion', flat=True))
+
+    def test_rollback_descarta_eventos(self):
+        with transaction.atomic():
+            historial.registrar(self.pedido, 'creado', usuario=self.usuario)
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                historial.registrar(self.pedido, 'descartado')
+                raise RuntimeError
+        self.assertEqual(self.acciones(), ['creado'])
+
+    def test_agrupar(self):
+        with self.assertNumQueries(1), historial.agrupar():
+            for accion in ('a', 'b', 'c'):
+                historial.registrar(self.pedido, accion)
+            with historial.agrupar():
+                historial.registrar(self.pedido, 'd')
+        self.assertEqual(self.acciones(), ['a', 'b', 'c', 'd'])
+
+        with self.assertRaises(RuntimeError), historial.agrupar():
+            historial.registrar(self.pedido, 'e')
+            raise RuntimeError
+        self.assertEqual(len(self.acciones()), 4)
+
+    def test_checkout_registra_creado_y_pagado(self):
+        libro, = crear_libros(1)
+        CarritoItem.objects.create(usuario=self.usuario, libro=libro)
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('app_tienda:checkout'))
+        pedido = Pedido.objects.exclude(pk=self.pedido.pk).get()
+        self.assertEqual(
+            list(pedido.historial.order_by('id').values_list('accion', 'usuario_id')),
+            [('creado', self.usuario.pk), ('pagado', self.usuario.pk)],
+        )
+
+    def test_eventos_por_meses(self):
+        fechas = [timezone.make_aware(datetime(2026, mes, dia, 12)) for mes, dia in ((1, 31), (2, 1), (3, 15), (4, 1))]
+        for i, fecha in enumerate(fechas):
+            historial.registrar(self.pedido, f'evento-{i}')
+            HistorialPedido.objects.filter(accion=f'evento-{i}').update(fecha_registro=fecha)
+
+        self.assertEqual(
+            [inicio for inicio, _ in historial.particiones(date(2026, 1, 31), date(2026, 3, 15))],
+            [date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1)],
+        )
+        self.assertEqual(
+            [e.accion for e in historial.eventos(date(2026, 1, 31), date(2026, 3, 15))],
+            ['evento-0', 'evento-1', 'evento-2'],
+        )
+        self.assertEqual(historial.particion_mas_antigua(), date(2026, 1, 1))
+
+
+class EstadosTests(TestCase):
+    """Transiciones de estado: reglas, historial y resúmenes de KPIs al día sin recalcular."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin', email='admin@example.com', password='x')
+        cls.libro = crear_libros(1)[0]
+
+    def crear_pedido(self, estado='pendiente_pago'):
+        pedido = Pedido.objects.create(usuario=self.admin, estado=estado, total=Decimal('11.60'))
+        DetallePedido.objects.create(
+            pedido=pedido, libro=self.libro, cantidad=2, precio_unitario=Decimal('5.00'), precio_total=Decimal('10.00'),
+        )
+        kpis.registrar_pedido(pedido, [(self.libro.pk, 2, Decimal('10.00'))])
+        return pedido
+
+    def resumenes(self):
+        hoy = timezone.localdate()
+        resumen = ResumenDiario.objects.filter(fecha=hoy).values('pedidos', 'ingresos', 'unidades').first()
+        return (
+            resumen,
+            dict(PedidosEstadoDiario.objects.filter(fecha=hoy, cantidad__gt=0).values_list('estado', 'cantidad')),
+            list(VentaLibroDiaria.objects.filter(fecha=hoy, unidades__gt=0).values_list('libro_id', 'unidades', 'ingresos')),
+        )
+
+    def assertCoincideConRecalculo(self):
+        incremental = self.resumenes()
+        hoy = timezone.localdate()
+        kpis.recalcular_rango(hoy, hoy)
+        self.assertEqual(incremental, self.resumenes())
+
+    def test_transicion_permitida(self):
+        pedido = self.crear_pedido()
+        estados.transicionar(pedido, 'pagado', usuario=self.admin)
+        pedido.refresh_from_db()
+        self.assertEqual((pedido.estado, pedido.pagado), ('pagado', True))
+        self.assertIsNotNone(pedido.fecha_pago)
+        self.assertEqual(
+            list(pedido.historial.values_list('accion', 'descripcion')), [('pagado', 'pendiente_pago -> pagado')],
+        )
+        resumen, por_estado, ventas = self.resumenes()
+        self.assertEqual(resumen, {'pedidos': 1, 'ingresos': Decimal('11.60'), 'unidades': 2})
+        self.assertEqual(por_estado, {'pagado': 1})
+        self.assertEqual(ventas, [(self.libro.pk, 2, Decimal('10.00'))])
+
+        estados.transicionar(pedido, 'reembolsado')
+        self.assertEqual(self.resumenes()[0], {'pedidos': 0, 'ingresos': Decimal('0'), 'unidades': 0})
+        self.assertCoincideConRecalculo()
+
+    def test_transicion_prohibida(self):
+        pedido = self.crear_pedido('reembolsado')
+        antes = self.resumenes()
+        for destino in ('pagado', 'inventado'):
+            with self.subTest(destino=destino), self.assertRaises(estados.TransicionInvalida):
+                estados.transicionar(pedido, destino)
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).estado, 'reembolsado')
+        self.assertFalse(pedido.historial.exists())
+        self.assertEqual(self.resumenes(), antes)
+
+    def test_lote(self):
+        pagados = [self.crear_pedido('pagado') for _ in range(3)]
+        cancelado = self.crear_pedido('cancelado')
+        pendiente = self.crear_pedido()
+
+        # Consultas agrupadas por día y estado: no dependen del número de pedidos
+        with self.assertNumQueries(14):
+            cambiados = estados.transicionar_lote(Pedido.objects.all(), 'reembolsado', usuario=self.admin)
+        self.assertEqual(cambiados, 3)
+        self.assertEqual(
+            set(Pedido.objects.values_list('pk', 'estado')),
+            {*((p.pk, 'reembolsado') for p in pagados), (cancelado.pk, 'cancelado'), (pendiente.pk, 'pendiente_pago')},
+        )
+        self.assertEqual(
+            sorted(HistorialPedido.objects.values_list('pedido_id', 'accion', 'usuario_id')),
+            [(p.pk, 'reembolsado', self.admin.pk) for p in pagados],
+        )
+        self.assertEqual(self.resumenes()[1], {'reembolsado': 3, 'cancelado': 1, 'pendiente_pago': 1})
+        self.assertCoincideConRecalculo()
+
+        self.assertEqual(estados.transicionar_lote(Pedido.objects.filter(pk=pendiente.pk), 'pagado'), 1)
+        self.assertCoincideConRecalculo()
+
+    def test_pedido_fuera_de_los_resumenes(self):
+        # Pedido anterior a los resúmenes: restar no deja contadores negativos
+        pedido = Pedido.objects.create(usuario=self.admin, estado='pagado', total=Decimal('5.00'))
+        estados.transicionar(pedido, 'cancelado')
+        resumen, por_estado, _ = self.resumenes()
+        self.assertEqual(resumen, {'pedidos': 0, 'ingresos': Decimal('0'), 'unidades': 0})
+        self.assertEqual(por_estado, {'cancelado': 1})
+
+
+class CarritoTests(TestCase):
+    """Mover de la wishlist al carrito con INSERT ... SELECT ... ON CONFLICT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='lector', email='lector@example.com', password='x')
+        cls.otro = Usuario.objects.create_user(username='otro', email='otro@example.com', password='x')
+        cls.libros = crear_libros(4)
+        Libro.objects.filter(pk=cls.libros[3].pk).update(activo=False)
+        Libro.objects.filter(pk=cls.libros[1].pk).update(en_oferta=True, precio_descuento=Decimal('8.00'))
+
+    def setUp(self):
+        self.items = Wishlist.objects.bulk_create([Wishlist(usuario=self.usuario, libro=libro) for libro in self.libros])
+        self.ajeno = Wishlist.objects.create(usuario=self.otro, libro=self.libros[0])
+        # El libro 0 ya estaba dos veces en el carrito
+        CarritoItem.objects.create(usuario=self.usuario, libro=self.libros[0], cantidad=2)
+
+    def carrito(self, usuario):
+        return dict(CarritoItem.objects.filter(usuario=usuario).values_list('libro_id', 'cantidad'))
+
+    def test_mover_todo(self):
+        with self.assertNumQueries(5):
+            movidos = mover_a_carrito(self.usuario)
+        self.assertEqual(sorted(movidos), [item.pk for item in self.items[:3]])
+        # Sin filas duplicadas: la línea existente suma una unidad
+        self.assertEqual(self.carrito(self.usuario), {self.libros[0].pk: 3, self.libros[1].pk: 1, self.libros[2].pk: 1})
+        # El libro inactivo se queda en la wishlist
+        self.assertEqual(list(Wishlist.objects.filter(usuario=self.usuario).values_list('pk', flat=True)), [self.items[3].pk])
+
+    def test_solo_elementos_propios(self):
+        self.assertEqual(mover_a_carrito(self.usuario, [self.ajeno.pk, self.items[2].pk]), [self.items[2].pk])
+        self.assertTrue(Wishlist.objects.filter(pk=self.ajeno.pk).exists())
+        self.assertEqual(self.carrito(self.otro), {})
+        self.assertEqual(mover_a_carrito(self.usuario, [self.ajeno.pk]), [])
+
+    def test_resumen_devuelto(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(
+            reverse('app_tienda:mover_wishlist_a_carrito'), {'item_ids': [self.items[0].pk, self.items[1].pk]},
+            content_type='application/json', headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        datos = respuesta.json()
+        self.assertEqual(sorted(datos['movidos']), [self.items[0].pk, self.items[1].pk])
+        # 3 x 10.00 + 1 x 8.00 (oferta), más el 16 % de IVA
+        self.assertEqual(datos['carrito'], {
+            'items': 2, 'unidades': 4, 'subtotal': '38.00', 'impuestos': '6.08', 'total': '44.08', 'wishlist': 2,
+        })
+        self.assertEqual(resumen_carrito(self.usuario)['total'], Decimal('44.08'))
+
+
+class AvisosPrecioTests(TestCase):
+    """Avisos de bajada de precio: primera ejecución, solo bajadas reales y reanudación."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [
+            Usuario.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x') for i in range(3)
+        ]
+        cls.baja, cls.sube, cls.oferta, cls.igual = crear_libros(4)
+
+    def ejecutar(self, **opciones):
+        salida = io.StringIO()
+        call_command('avisar_bajadas_precio', stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def avisos(self):
+        return {
+            tarea.argumentos['usuario_id']: [libro_id for libro_id, _, _ in tarea.argumentos['libros']]
+            for tarea in Tarea.objects.filter(nombre='enviar_aviso_precios')
+        }
+
+    def test_primera_ejecucion_no_avisa(self):
+        Wishlist.objects.create(usuario=self.usuarios[0], libro=self.baja)
+        self.ejecutar()
+        self.assertEqual(PrecioObservado.objects.count(), 4)
+        self.assertEqual(self.avisos(), {})
+
+    def test_solo_bajadas_reales(self):
+        u0, u1, u2 = self.usuarios
+        Wishlist.objects.bulk_create([
+            Wishlist(usuario=u0, libro=self.baja), Wishlist(usuario=u0, libro=self.sube),
+            Wishlist(usuario=u1, libro=self.oferta), Wishlist(usuario=u1, libro=self.igual),
+            Wishlist(usuario=u2, libro=self.sube),
+        ])
+        self.ejecutar()
+        Libro.objects.filter(pk=self.baja.pk).update(precio=Decimal('8.00'))
+        Libro.objects.filter(pk=self.sube.pk).update(precio=Decimal('12.00'))
+        Libro.objects.filter(pk=self.oferta.pk).update(en_oferta=True, precio_descuento=Decimal('9.00'))
+        # Un descuento sin oferta activa no cambia el precio efectivo
+        Libro.objects.filter(pk=self.igual.pk).update(precio_descuento=Decimal('1.00'))
+
+        self.ejecutar()
+        self.assertEqual(self.avisos(), {u0.pk: [self.baja.pk], u1.pk: [self.oferta.pk]})
+
+        tareas.procesar_pendientes('w1')
+        self.assertEqual(sorted(correo.to[0] for correo in mail.outbox), [u0.email, u1.email])
+
+        # La bajada ya avisada es la nueva referencia: no se repite
+        Tarea.objects.all().delete()
+        self.ejecutar()
+        self.assertEqual(self.avisos(), {})
+
+    def test_reanudable(self):
+        Wishlist.objects.bulk_create([Wishlist(usuario=u, libro=self.baja) for u in self.usuarios])
+        self.ejecutar()
+        Libro.objects.filter(pk=self.baja.pk).update(precio=Decimal('8.00'))
+
+        self.assertIn('Detenido tras 1 lotes', self.ejecutar(usuarios=1, max_lotes=1))
+        self.assertEqual(list(self.avisos()), [self.usuarios[0].pk])
+
+        salida = self.ejecutar(usuarios=1)
+        self.assertIn('Reanudando', salida)
+        self.assertEqual(sorted(self.avisos()), [u.pk for u in self.usuarios])
+        self.assertEqual(Tarea.objects.count(), 3)
+        self.assertEqual(PuntoControl.objects.get(nombre='avisar_bajadas_precio').datos['fase'], 'completada')
@@ -9,6 +9,8 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('catalogo/', views.catalogo, name='catalogo'),
     path('libro/<slug:slug>/', views.detalle_libro, name='detalle_libro'),
+    path('libro/<slug:slug>/resenas/', views.resenas_libro, name='resenas_libro'),
+    path('libro/<slug:slug>/resena/', views.enviar_resena, name='enviar_resena'),
     path('registro/', views.registro, name='registro'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -32,14 +34,18 @@ urlpatterns = [
     path('wishlist/agregar/<int:libro_id>/', views.agregar_wishlist, name='agregar_wishlist'),
     path('wishlist/eliminar/<int:libro_id>/', views.eliminar_wishlist, name='eliminar_wishlist'),
     path('wishlist/mover-a-carrito/', views.mover_wishlist_a_carrito, name='mover_wishlist_a_carrito'),
+    path('wishlist/eliminar-lote/', views.eliminar_wishlist_lote, name='eliminar_wishlist_lote'),
 
     # Vistas de Administración
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-pedidos/', views.admin_pedidos, name='admin_pedidos'),
     path('admin-pedidos/<str:numero_pedido>/', views.admin_detalle_pedido, name='admin_detalle_pedido'),
+    path('admin-resenas/', views.admin_resenas, name='admin_resenas'),
     path('admin-libros/', views.admin_libros, name='admin_libros'),
     path('admin-libros/crear/', views.admin_libro_form, name='admin_libro_crear'),
+    path('admin-libros/importar/', views.admin_importar_libros, name='admin_importar_libros'),
     path('admin-libros/editar/<slug:slug>/', views.admin_libro_form, name='admin_libro_editar'),
     path('admin-libros/eliminar/<slug:slug>/', views.admin_eliminar_libro, name='admin_eliminar_libro'),
     path('admin-usuarios/', views.admin_usuarios, name='admin_usuarios'),
+    path('admin-exportar/<str:recurso>/', views.admin_exportar, name='admin_exportar'),
 ]
@@ -1,26 +1,81 @@
 
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404, resolve_url
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth import login, logout, authenticate
-from django.http import JsonResponse, HttpResponseForbidden, FileResponse
+from django.http import JsonResponse, HttpResponseForbidden, FileResponse, StreamingHttpResponse, HttpResponseBadRequest, Http404
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import Prefetch, Q, Sum
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.conf import settings
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 import json
 import uuid
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.urls import reverse
 from decimal import Decimal
-from django.db import transaction
+from django.db import transaction, router
+from django.utils.dateparse import parse_date
+from django.utils.http import content_disposition_header
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from functools import wraps
+import mimetypes
+import os
 
 from .models import *
 from .forms import *
+from . import cupones, estados, kpis, exportaciones, historial, resenas, tareas
+from .cache import cache_publico, modificacion_catalogo, version_catalogo, version_libro
+from .carrito import eliminar_de_wishlist, mover_a_carrito, resumen as resumen_carrito
+from .importacion import ImportadorCatalogo
+from .paginacion import CursorInvalido, paginar
+from .ratelimit import limitar
+from .routers import usar_primario, usar_replica
+
+def login_required_async(view_func):
+    """login_required para vistas async (el de Django 5.0 solo admite vistas síncronas)."""
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        user = await request.auser()
+        if user.is_authenticated:
+            return await view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path(), resolve_url(settings.LOGIN_URL))
+    return _wrapped_view
+
+
+async def _leer_archivo(ruta, tamanio_bloque=64 * 1024):
+    """Lee el archivo por bloques en un hilo aparte sin bloquear el event loop."""
+    en_hilo = lambda funcion: sync_to_async(funcion, thread_sensitive=False)
+    archivo = await en_hilo(open)(ruta, 'rb')
+    try:
+        while bloque := await en_hilo(archivo.read)(tamanio_bloque):
+            yield bloque
+    finally:
+        await en_hilo(archivo.close)()
+
 
 # ========== VISTAS PÚBLICAS ==========#
 
+def _validadores_catalogo(request, *args, **kwargs):
+    # Listados de libros y categorías: cambian con cualquier cambio del catálogo
+    return (version_catalogo(),), modificacion_catalogo()
+
+def _validadores_libro(request, slug):
+    fila = Libro.objects.filter(slug=slug, activo=True).values_list('pk', 'fecha_actualizacion').first()
+    if fila is None:
+        return None
+    libro_id, fecha = fila
+    # Relacionados y categoría dependen de la versión del catálogo; reseñas y
+    # valoraciones, de la del propio libro
+    version, modificacion = version_libro(libro_id)
+    return (version_catalogo(), version, slug, fecha.isoformat()), max(fecha, modificacion_catalogo(), modificacion)
+
+@usar_replica
+@cache_publico(_validadores_catalogo)
 def index(request):
     libros_destacados = Libro.objects.filter(destacado=True, activo=True)[:8]
     libros_nuevos = Libro.objects.filter(nuevo=True, activo=True)[:8]
@@ -36,14 +91,16 @@ def index(request):
     }
     return render(request, 'app_tienda/public/index.html', context)
 
-def catalogo(request):
+@usar_replica
+@cache_publico(_validadores_catalogo)
+async def catalogo(request):
     libros = Libro.objects.filter(activo=True)
     
     # Crear una copia mutable de request.GET para poder modificarla
     filtros_mutables = request.GET.copy()
 
     categoria_id = filtros_mutables.get('categoria')
-    if categoria_id:
+    if categoria_id and categoria_id.isdigit():
         libros = libros.filter(categoria_id=categoria_id)
     
     q = filtros_mutables.get('q')
@@ -73,6 +130,8 @@ def catalogo(request):
         libros = libros.order_by('-precio')
     elif orden == 'titulo':
         libros = libros.order_by('titulo')
+    elif orden == 'valoracion':
+        libros = libros.order_by('-calificacion_media', '-num_resenas')
     else:
         libros = libros.order_by('-fecha_creacion')
     
@@ -80,67 +139,104 @@ def catalogo(request):
     if 'page' in filtros_mutables:
         del filtros_mutables['page']
 
+    # Paginator es síncrono: el total y la página se resuelven antes con el ORM async.
     paginator = Paginator(libros, 12)
+    paginator.count = await libros.acount()
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = [libro async for libro in page_obj.object_list]
     
-    categorias = Categoria.objects.filter(activa=True)
+    categorias = [categoria async for categoria in Categoria.objects.filter(activa=True)]
     
     context = {
         'page_obj': page_obj,
         'categorias': categorias,
         'filtros': filtros_mutables.urlencode(),
     }
-    return render(request, 'app_tienda/public/catalogo.html', context)
+    # La plantilla usa request.user y relaciones perezosas: se renderiza en un hilo.
+    return await sync_to_async(render)(request, 'app_tienda/public/catalogo.html', context)
 
-def detalle_libro(request, slug):
-    libro = get_object_or_404(Libro, slug=slug, activo=True)
+def _ha_comprado(usuario, libro):
+    return Pedido.objects.filter(
+        usuario=usuario,
+        detalles__libro=libro,
+        estado__in=['pagado', 'completado']
+    ).exists()
+
+def _contexto_detalle_libro(request, libro, form_resena=None):
     libros_relacionados = Libro.objects.filter(categoria=libro.categoria).exclude(id=libro.id)[:4]
-    
-    ya_comprado = False
-    if request.user.is_authenticated:
-        ya_comprado = Pedido.objects.filter(
-            usuario=request.user,
-            detalles__libro=libro,
-            estado__in=['pagado', 'completado']
-        ).exists()
-    
-    context = {
+
+    ya_comprado = request.user.is_authenticated and _ha_comprado(request.user, libro)
+    if ya_comprado and form_resena is None:
+        # Quien ya reseñó el libro edita su reseña (una por usuario y libro)
+        form_resena = ResenaForm(instance=Resena.objects.filter(libro=libro, usuario=request.user).first())
+
+    return {
         'libro': libro,
         'libros_relacionados': libros_relacionados,
         'ya_comprado': ya_comprado,
+        'resenas': resenas.pagina(libro),
+        'form_resena': form_resena,
+        'resena_enviada': request.GET.get('resena') == 'enviada',
     }
-    return render(request, 'app_tienda/public/detalle_libro.html', context)
+
+@usar_replica
+@cache_publico(_validadores_libro)
+def detalle_libro(request, slug):
+    libro = get_object_or_404(Libro, slug=slug, activo=True)
+    return render(request, 'app_tienda/public/detalle_libro.html', _contexto_detalle_libro(request, libro))
+
+@usar_replica
+def resenas_libro(request, slug):
+    # Páginas siguientes del listado ("Ver más"): un fragmento HTML por cursor
+    libro = get_object_or_404(Libro.objects.only('pk', 'slug'), slug=slug, activo=True)
+    try:
+        pagina = resenas.pagina(libro, request.GET.get('despues'))
+    except CursorInvalido as e:
+        return HttpResponseBadRequest(str(e))
+    return render(request, 'app_tienda/partials/resenas.html', {'libro': libro, 'resenas': pagina})
+
+@login_required
+def enviar_resena(request, slug):
+    libro = get_object_or_404(Libro, slug=slug, activo=True)
+    if request.method != 'POST':
+        return redirect('app_tienda:detalle_libro', slug=slug)
+    if not _ha_comprado(request.user, libro):
+        return HttpResponseForbidden("Solo puedes reseñar libros que has comprado.")
+
+    resena = Resena.objects.filter(libro=libro, usuario=request.user).first() or Resena(libro=libro, usuario=request.user)
+    form = ResenaForm(request.POST, instance=resena)
+    if form.is_valid():
+        resena = form.save(commit=False)
+        # Toda reseña nueva o editada vuelve a la cola de moderación
+        resena.aprobada = False
+        # Con el ajuste de valoraciones de post_save (resenas.py) en la misma transacción
+        with transaction.atomic():
+            resena.save()
+        return redirect(reverse('app_tienda:detalle_libro', args=[slug]) + '?resena=enviada#resenas')
+    return render(request, 'app_tienda/public/detalle_libro.html', _contexto_detalle_libro(request, libro, form))
 
 def registro(request):
     if request.method == 'POST':
         form = RegistroForm(request.POST)
         if form.is_valid():
             user = form.save()
+            kpis.registrar_nuevo_usuario(user)
             login(request, user)
             return redirect('app_tienda:index')
     else:
         form = RegistroForm()
     return render(request, 'app_tienda/registration/registro.html', {'form': form})
 
+@limitar('login')
 def login_view(request):
     if request.method == 'POST':
         # Los datos pueden ser email o username
         identifier = request.POST.get('email') 
         password = request.POST.get('password')
         
-        # Intentamos autenticar usando el email como username
+        # El backend resuelve correo o nombre de usuario en una sola consulta
         user = authenticate(request, username=identifier, password=password)
-        
-        # Si falla, intentamos encontrar el usuario por email y luego autenticar con su username real
-        if user is None:
-            try:
-                # El campo de entrada 'email' se usa para el identificador
-                q = Q(email__iexact=identifier) | Q(username__iexact=identifier)
-                user_obj = Usuario.objects.get(q)
-                user = authenticate(request, username=user_obj.username, password=password)
-            except Usuario.DoesNotExist:
-                user = None
 
         if user is not None:
             login(request, user)
@@ -157,6 +253,8 @@ def logout_view(request):
     logout(request)
     return redirect('app_tienda:index')
 
+@usar_replica
+@cache_publico(_validadores_catalogo)
 def ofertas(request):
     libros_oferta = Libro.objects.filter(
         en_oferta=True, 
@@ -200,7 +298,7 @@ def perfil(request):
 
 @login_required
 def carrito(request):
-    items = CarritoItem.objects.filter(usuario=request.user)
+    items = CarritoItem.objects.filter(usuario=request.user).para_listado()
     subtotal = sum(item.subtotal() for item in items)
     context = {'items': items, 'subtotal': subtotal}
     return render(request, 'app_tienda/user/carrito.html', context)
@@ -233,56 +331,84 @@ def actualizar_carrito(request):
 
 @login_required
 def checkout(request):
-    items = CarritoItem.objects.filter(usuario=request.user)
-    if not items.exists():
+    items = CarritoItem.objects.filter(usuario=request.user).para_listado()
+    if not items:
         return redirect('app_tienda:carrito')
     
     subtotal = sum(item.subtotal() for item in items)
-    impuestos = subtotal * Decimal('0.16')
-    total = subtotal + impuestos
-    
-    if request.method == 'POST':
-        with transaction.atomic():
-            pedido = Pedido.objects.create(
-                usuario=request.user,
-                subtotal=subtotal,
-                impuestos=impuestos,
-                total=total,
-                metodo_pago='simulado'
-            )
-            
-            for item in items:
-                DetallePedido.objects.create(
-                    pedido=pedido,
-                    libro=item.libro,
-                    cantidad=item.cantidad,
-                    precio_unitario=item.libro.precio_actual(),
-                    precio_total=item.subtotal(),
-                )
-            
-            pedido.marcar_como_pagado()
 
-            for detalle in pedido.detalles.all():
-                EntregaDigital.objects.create(
-                    pedido=pedido,
-                    libro=detalle.libro,
+    # El cupón llega por GET al aplicarlo y por POST al confirmar el pedido
+    codigo = (request.POST if request.method == 'POST' else request.GET).get('cupon', '').strip()
+    cupon, error_cupon = None, None
+    if codigo:
+        try:
+            cupon = cupones.buscar(codigo)
+        except cupones.CuponInvalido as e:
+            error_cupon = str(e)
+    descuento = cupon.calcular_descuento(subtotal) if cupon else Decimal('0')
+    impuestos = (subtotal - descuento) * Decimal('0.16')
+    total = subtotal - descuento + impuestos
+    
+    if request.method == 'POST' and not error_cupon:
+        try:
+            # Los eventos de historial del pedido se insertan juntos al final.
+            with transaction.atomic(), historial.agrupar():
+                if cupon:
+                    cupones.canjear(cupon)
+                pedido = Pedido.objects.create(
                     usuario=request.user,
-                    expiracion=timezone.now() + timedelta(days=365)
+                    subtotal=subtotal,
+                    cupon=cupon,
+                    descuento=descuento,
+                    impuestos=impuestos,
+                    total=total,
+                    metodo_pago='simulado'
                 )
-
-            CarritoItem.objects.filter(usuario=request.user).delete()
-        
-        return redirect(reverse('app_tienda:pedido_confirmacion', kwargs={'numero_pedido': pedido.numero_pedido}))
+                
+                lineas = []
+                for item in items:
+                    DetallePedido.objects.create(
+                        pedido=pedido,
+                        libro=item.libro,
+                        cantidad=item.cantidad,
+                        precio_unitario=item.libro.precio_actual(),
+                        precio_total=item.subtotal(),
+                    )
+                    lineas.append((item.libro_id, item.cantidad, item.subtotal()))
+                
+                historial.registrar(pedido, 'creado', f'{len(lineas)} libro(s)' + (f', cupón {cupon.codigo}' if cupon else ''), request.user)
+                # Se cuenta como pendiente de pago; la transición a pagado suma los ingresos.
+                kpis.registrar_pedido(pedido, lineas)
+                pedido.marcar_como_pagado(usuario=request.user)
+
+                # El correo y las entregas de pedidos grandes los hace procesar_tareas.
+                if len(lineas) < settings.TAREAS_ENTREGAS_ASINCRONAS_DESDE:
+                    tareas.crear_entregas_pedido(pedido)
+                    tareas.encolar('enviar_confirmacion', pedido_id=pedido.id)
+                else:
+                    tareas.encolar('crear_entregas', pedido_id=pedido.id)
+
+                CarritoItem.objects.filter(usuario=request.user).delete()
+        except cupones.CuponInvalido as e:
+            # Se agotó o caducó entre la vista previa y la confirmación
+            error_cupon, cupon = str(e), None
+        else:
+            return redirect(reverse('app_tienda:pedido_confirmacion', kwargs={'numero_pedido': pedido.numero_pedido}))
     
     context = {
         'items': items,
         'subtotal': subtotal,
+        'cupon': cupon,
+        'codigo_cupon': codigo,
+        'error_cupon': error_cupon,
+        'descuento': descuento,
         'impuestos': impuestos,
         'total': total,
     }
     return render(request, 'app_tienda/user/checkout.html', context)
 
 @login_required
+@usar_primario
 def pedido_confirmacion(request, numero_pedido):
     pedido = get_object_or_404(Pedido, numero_pedido=numero_pedido, usuario=request.user)
     context = {'pedido': pedido}
@@ -298,32 +424,56 @@ def mis_pedidos(request):
 @login_required
 def detalle_pedido(request, numero_pedido):
     pedido = get_object_or_404(Pedido, numero_pedido=numero_pedido, usuario=request.user)
-    context = {'pedido': pedido}
+    context = {'pedido': pedido, 'detalles': pedido.detalles.para_listado()}
     return render(request, 'app_tienda/user/detalle_pedido.html', context)
 
 @login_required
 def mis_descargas(request):
-    descargas = EntregaDigital.objects.filter(usuario=request.user).order_by('-fecha_creacion')
+    descargas = EntregaDigital.objects.filter(usuario=request.user).para_listado().order_by('-fecha_creacion')
     context = {'descargas': descargas}
     return render(request, 'app_tienda/user/mis_descargas.html', context)
 
-@login_required
-def descargar_libro(request, token):
-    entrega = get_object_or_404(EntregaDigital, token=token, usuario=request.user)
+def _registrar_descarga(entrega, ip):
+    entrega.registrar_descarga(ip)
+    kpis.registrar_descarga()
+
+@limitar('descarga')
+@login_required_async
+@usar_primario
+async def descargar_libro(request, token):
+    user = await request.auser()
+    entrega = await aget_object_or_404(
+        EntregaDigital.objects.select_related('libro'), token=token, usuario=user
+    )
     if not entrega.es_valido():
         return HttpResponseForbidden("El enlace de descarga ha expirado o no es válido.")
 
-    entrega.registrar_descarga(request.META.get('REMOTE_ADDR'))
-
     file_path = entrega.libro.archivo_digital.path
     file_name = f'{entrega.libro.slug}.{entrega.libro.formato}'
+    try:
+        # Antes de contar la descarga: un archivo que falta no la consume.
+        tamanio = await sync_to_async(os.path.getsize, thread_sensitive=False)(file_path)
+    except OSError:
+        raise Http404("El archivo del libro no está disponible.")
 
-    return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=file_name)
+    await sync_to_async(_registrar_descarga)(entrega, request.META.get('REMOTE_ADDR'))
+
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI el servidor puede usar sendfile con FileResponse.
+        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=file_name)
+
+    response = StreamingHttpResponse(
+        _leer_archivo(file_path),
+        content_type=mimetypes.guess_type(file_name)[0] or 'application/octet-stream',
+    )
+    response['Content-Length'] = str(tamanio)
+    response['Content-Disposition'] = content_disposition_header(True, file_name)
+    return response
 
 
 @login_required
 def wishlist(request):
-    items = Wishlist.objects.filter(usuario=request.user)
+    items = Wishlist.objects.filter(usuario=request.user).para_listado()
     context = {'items': items}
     return render(request, 'app_tienda/user/wishlist.html', context)
 
@@ -338,31 +488,47 @@ def eliminar_wishlist(request, libro_id):
     Wishlist.objects.filter(usuario=request.user, libro_id=libro_id).delete()
     return redirect('app_tienda:wishlist')
 
-@login_required
-def mover_wishlist_a_carrito(request):
+def _ids_wishlist(data):
+    """'item_ids': [..] o 'item_id' para unos elementos; 'todos': true para toda la wishlist (None)."""
+    if not isinstance(data, dict):
+        raise ValueError("Se esperaba un objeto JSON.")
+    if data.get('todos'):
+        return None
+    try:
+        if 'item_ids' in data:
+            return [int(item_id) for item_id in data['item_ids']]
+        return [int(data['item_id'])]
+    except (KeyError, TypeError) as e:
+        raise ValueError("Identificadores de wishlist no válidos.") from e
+
+ERROR_WISHLIST = 'No se pudo procesar la solicitud.'
+
+@login_required_async
+async def mover_wishlist_a_carrito(request):
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
-            data = json.loads(request.body)
-            item_id = data.get('item_id')
-            wishlist_item = get_object_or_404(Wishlist, id=item_id, usuario=request.user)
-            libro = wishlist_item.libro
-
-            # Agregar al carrito
-            carrito_item, created = CarritoItem.objects.get_or_create(
-                usuario=request.user,
-                libro=libro,
-                defaults={'cantidad': 1}
-            )
-            if not created:
-                carrito_item.cantidad += 1
-                carrito_item.save()
-
-            # Eliminar de la wishlist
-            wishlist_item.delete()
+            ids = _ids_wishlist(json.loads(request.body))
+            user = await request.auser()
+            movidos = await sync_to_async(mover_a_carrito)(user, ids)
+            if ids is not None and not movidos:
+                return JsonResponse({'success': False, 'error': 'Ninguno de los libros está disponible.'})
+            resumen = await sync_to_async(resumen_carrito)(user)
+            return JsonResponse({'success': True, 'movidos': movidos, 'carrito': resumen})
+        except (ValueError, ObjectDoesNotExist):
+            return JsonResponse({'success': False, 'error': ERROR_WISHLIST})
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
 
-            return JsonResponse({'success': True})
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+@login_required_async
+async def eliminar_wishlist_lote(request):
+    if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        try:
+            ids = _ids_wishlist(json.loads(request.body))
+            user = await request.auser()
+            eliminados = await sync_to_async(eliminar_de_wishlist)(user, ids)
+            resumen = await sync_to_async(resumen_carrito)(user)
+            return JsonResponse({'success': True, 'eliminados': eliminados, 'carrito': resumen})
+        except (ValueError, ObjectDoesNotExist):
+            return JsonResponse({'success': False, 'error': ERROR_WISHLIST})
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
@@ -372,22 +538,115 @@ def es_administrador(user):
     return user.is_authenticated and user.es_administrador()
 
 @user_passes_test(es_administrador)
+@usar_replica
 def admin_dashboard(request):
-    return render(request, 'app_tienda/admin/dashboard.html')
+    context = kpis.panel(dias=30)
+    return render(request, 'app_tienda/admin/dashboard.html', context)
 
 @user_passes_test(es_administrador)
+@usar_replica
 def admin_pedidos(request):
-    pedidos = Pedido.objects.all().order_by('-fecha_creacion')
-    context = {'pedidos': pedidos}
+    # Dos consultas por página sea cual sea el volumen: pedidos + usuario con
+    # LIMIT por cursor (sin OFFSET ni COUNT) y las líneas + libro de esa página.
+    form = FiltroPedidosForm(request.GET)
+    filtros = form.cleaned_data if form.is_valid() else {}
+
+    pedidos = Pedido.objects.select_related('usuario').prefetch_related(
+        Prefetch('detalles', queryset=DetallePedido.objects.para_listado())
+    )
+    if filtros.get('estado'):
+        pedidos = pedidos.filter(estado=filtros['estado'])
+    if filtros.get('desde'):
+        pedidos = pedidos.filter(fecha_creacion__gte=timezone.make_aware(datetime.combine(filtros['desde'], time.min)))
+    if filtros.get('hasta'):
+        pedidos = pedidos.filter(
+            fecha_creacion__lt=timezone.make_aware(datetime.combine(filtros['hasta'] + timedelta(days=1), time.min))
+        )
+    if filtros.get('email'):
+        # Subconsulta sobre el índice único Lower('email') de Usuario
+        pedidos = pedidos.filter(usuario__in=Usuario.objects.alias(
+            email_normalizado=Lower('email')).filter(email_normalizado=filtros['email'].lower()))
+    if filtros.get('total_min') is not None:
+        pedidos = pedidos.filter(total__gte=filtros['total_min'])
+    if filtros.get('total_max') is not None:
+        pedidos = pedidos.filter(total__lte=filtros['total_max'])
+
+    try:
+        pagina = paginar(
+            pedidos,
+            FiltroPedidosForm.ORDENES[filtros.get('orden') or 'recientes'],
+            por_pagina=settings.ADMIN_PEDIDOS_POR_PAGINA,
+            despues=request.GET.get('despues'),
+            antes=request.GET.get('antes'),
+        )
+    except CursorInvalido as e:
+        return HttpResponseBadRequest(str(e))
+
+    parametros = request.GET.copy()
+    parametros.pop('despues', None)
+    parametros.pop('antes', None)
+    context = {
+        'form': form,
+        'pedidos': pagina,
+        'pagina': pagina,
+        'parametros': parametros.urlencode(),
+    }
     return render(request, 'app_tienda/admin/pedidos.html', context)
 
+@user_passes_test(es_administrador)
+def admin_resenas(request):
+    # Cola de moderación: pendientes de la más antigua a la más reciente
+    if request.method == 'POST':
+        seleccion = Resena.objects.filter(
+            pk__in=[int(pk) for pk in request.POST.getlist('resenas') if pk.isdigit()], aprobada=False,
+        )
+        accion = request.POST.get('accion')
+        if accion == 'aprobar':
+            resenas.aprobar(seleccion)
+        elif accion == 'rechazar':
+            resenas.rechazar(seleccion)
+        else:
+            return HttpResponseBadRequest("Acción no válida.")
+        # Las moderadas salen de la cola; el cursor de la página sigue siendo válido
+        return redirect(request.get_full_path())
+
+    try:
+        pagina = paginar(
+            resenas.pendientes(),
+            resenas.ORDEN_MODERACION,
+            por_pagina=settings.RESENAS_MODERACION_POR_PAGINA,
+            despues=request.GET.get('despues'),
+            antes=request.GET.get('antes'),
+        )
+    except CursorInvalido as e:
+        return HttpResponseBadRequest(str(e))
+    return render(request, 'app_tienda/admin/resenas.html', {'pagina': pagina})
+
 @user_passes_test(es_administrador)
 def admin_detalle_pedido(request, numero_pedido):
-    pedido = get_object_or_404(Pedido, numero_pedido=numero_pedido)
-    context = {'pedido': pedido}
+    pedido = get_object_or_404(
+        Pedido.objects.select_related('usuario').prefetch_related(
+            Prefetch('detalles', queryset=DetallePedido.objects.para_listado())
+        ),
+        numero_pedido=numero_pedido,
+    )
+    error = None
+    if request.method == 'POST':
+        try:
+            estados.transicionar(pedido, request.POST.get('estado', ''), usuario=request.user)
+            return redirect('app_tienda:admin_detalle_pedido', numero_pedido=pedido.numero_pedido)
+        except estados.TransicionInvalida as e:
+            error = str(e)
+            pedido.refresh_from_db()
+    context = {
+        'pedido': pedido,
+        'error': error,
+        'transiciones': [(estado, estados.ESTADOS[estado]) for estado in estados.siguientes(pedido.estado)],
+    }
     return render(request, 'app_tienda/admin/detalle_pedido.html', context)
 
 @user_passes_test(es_administrador)
+@usar_replica
 def admin_libros(request):
     libros = Libro.objects.all()
     context = {'libros': libros}
@@ -414,6 +673,22 @@ def admin_libro_form(request, slug=None):
     }
     return render(request, 'app_tienda/admin/libro_form.html', context)
 
+@user_passes_test(es_administrador)
+def admin_importar_libros(request):
+    informe = None
+    if request.method == 'POST':
+        form = ImportarCatalogoForm(request.POST, request.FILES)
+        if form.is_valid():
+            importador = ImportadorCatalogo(
+                medios_dir=getattr(settings, 'IMPORTACION_MEDIOS_DIR', None),
+                dry_run=form.cleaned_data['dry_run'],
+            )
+            informe = importador.importar(request.FILES['archivo'].file, form.cleaned_data['formato'])
+    else:
+        form = ImportarCatalogoForm()
+    context = {'form': form, 'informe': informe}
+    return render(request, 'app_tienda/admin/importar_libros.html', context)
+
 @user_passes_test(es_administrador)
 def admin_eliminar_libro(request, slug):
     libro = get_object_or_404(Libro, slug=slug)
@@ -424,7 +699,38 @@ def admin_eliminar_libro(request, slug):
     return render(request, 'app_tienda/admin/eliminar_libro.html', context)
 
 @user_passes_test(es_administrador)
+@usar_replica
 def admin_usuarios(request):
     usuarios = Usuario.objects.all()
     context = {'usuarios': usuarios}
     return render(request, 'app_tienda/admin/usuarios.html', context)
+
+@user_passes_test(es_administrador)
+@usar_replica
+def admin_exportar(request, recurso):
+    formato = request.GET.get('formato', 'csv')
+    comprimir = request.GET.get('gzip') == '1'
+    try:
+        desde = parse_date(request.GET['desde']) if request.GET.get('desde') else None
+        hasta = parse_date(request.GET['hasta']) if request.GET.get('hasta') else None
+        if formato not in exportaciones.FORMATOS:
+            raise exportaciones.ErrorExportacion(f"Formato desconocido: {formato}")
+        # La respuesta se consume después de salir de la vista: se fija aquí la base de datos.
+        queryset = exportaciones.construir_queryset(
+            recurso, desde=desde, hasta=hasta, estado=request.GET.get('estado') or None,
+            using=router.db_for_read(Pedido),
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    contenido = exportaciones.codificar(exportaciones.filas(recurso, queryset, formato), comprimir)
+    if comprimir:
+        content_type = 'application/gzip'
+    elif formato == 'csv':
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        content_type = 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    nombre = exportaciones.nombre_archivo(recurso, formato, comprimir)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
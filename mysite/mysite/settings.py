@@ -26,8 +26,16 @@ CSRF_COOKIE_SAMESITE = 'None'
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 
+# Sesiones en caché con escritura diferida en base de datos (app_tienda/sesiones.py).
+SESSION_ENGINE = 'app_tienda.sesiones'
+# Intervalo máximo entre escrituras en django_session de una sesión que cambia.
+# Solo se aplica con un SESSION_CACHE_ALIAS propio (ver settings_production);
+# aquí las sesiones comparten la caché 'default' y se escriben siempre.
+SESSION_ESCRITURA_DB_SEGUNDOS = int(os.environ.get('SESSION_ESCRITURA_DB_SEGUNDOS', 300))
+
 
 AUTH_USER_MODEL = 'app_tienda.Usuario'
+AUTHENTICATION_BACKENDS = ['app_tienda.backends.EmailOUsuarioBackend']
 LOGIN_URL = 'app_tienda:login'
 LOGIN_REDIRECT_URL = 'app_tienda:index'
 LOGOUT_REDIRECT_URL = 'app_tienda:index'
@@ -47,6 +55,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app_tienda.middleware.estaticos_middleware.EstaticosMiddleware',
+    'app_tienda.middleware.replica_middleware.ReplicaStickinessMiddleware',
+    'app_tienda.middleware.ratelimit_middleware.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +98,55 @@ DATABASES = {
     }
 }
 
+# Réplica de lectura opcional. En local basta con una copia del archivo:
+#   cp db.sqlite3 db_replica.sqlite3 && SQLITE_REPLICA_PATH=db_replica.sqlite3 python manage.py runserver
+if os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['SQLITE_REPLICA_PATH'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['app_tienda.routers.ReplicaRouter']
+REPLICA_DB_ALIAS = 'replica'
+
+# Segundos durante los que un cliente lee del primario tras escribir.
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+REPLICA_STICKY_COOKIE = 'primario_hasta'
+
+# Limitación de peticiones (app_tienda/ratelimit.py).
+# 'local' guarda los contadores en memoria del proceso; con varios workers usar 'cache'.
+RATELIMIT_ACTIVO = os.environ.get('RATELIMIT_ACTIVO', '1') == '1'
+RATELIMIT_ALMACEN = os.environ.get('RATELIMIT_ALMACEN', 'local')
+RATELIMIT_CONFIAR_PROXY = False
+RATELIMIT_POLITICAS = {
+    'login': [
+        {'clave': 'ip', 'limite': 30, 'periodo': 60, 'metodos': ['POST']},
+        # Por (IP, cuenta): solo por cuenta, cualquiera podría bloquear el login de otro
+        {'clave': 'ip_usuario', 'limite': 5, 'periodo': 300, 'algoritmo': 'token_bucket', 'metodos': ['POST']},
+    ],
+    'descarga': [
+        {'clave': 'ip', 'limite': 60, 'periodo': 60},
+        {'clave': 'token', 'limite': 10, 'periodo': 3600},
+    ],
+    'registro': [
+        {'clave': 'ip', 'limite': 10, 'periodo': 3600, 'metodos': ['POST']},
+    ],
+    'checkout': [
+        {'clave': 'usuario', 'limite': 30, 'periodo': 600},
+    ],
+    'resena': [
+        {'clave': 'ip', 'limite': 20, 'periodo': 3600, 'metodos': ['POST']},
+        {'clave': 'usuario', 'limite': 5, 'periodo': 3600, 'metodos': ['POST']},
+    ],
+}
+# Políticas aplicadas por RateLimitMiddleware según el nombre de la URL.
+RATELIMIT_RUTAS = {
+    'app_tienda:registro': 'registro',
+    'app_tienda:checkout': 'checkout',
+    'app_tienda:enviar_resena': 'resena',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -123,11 +183,70 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = 'static/'
+# Destino de collectstatic (nombres con hash y copias .gz/.br en producción).
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+# Estáticos precomprimidos (app_tienda/estaticos.py). EstaticosMiddleware solo
+# los sirve si ESTATICOS_SERVIR; en desarrollo lo hace runserver.
+ESTATICOS_SERVIR = False
+ESTATICOS_EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+# Por debajo de este tamaño la cabecera Content-Encoding cuesta más de lo que ahorra.
+ESTATICOS_TAMANIO_MINIMO = 256
+# Cache-Control de los estáticos sin hash en el nombre.
+ESTATICOS_MAX_AGE_SIN_HASH = 3600
 
 # Media files (user-uploaded content)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR.parent, 'media')
 
+# Correo: en desarrollo se imprime en consola.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Librería Cancino <no-responder@libreriacancino.com>')
+# URL pública del sitio para los enlaces absolutos de los correos.
+SITIO_URL = os.environ.get('SITIO_URL', 'http://localhost:8000')
+
+# Cola de tareas (app_tienda/tareas.py, comando procesar_tareas).
+# Pedidos con al menos este número de libros crean sus entregas en segundo plano.
+TAREAS_ENTREGAS_ASINCRONAS_DESDE = 10
+# Segundos que una tarea reclamada queda bloqueada antes de poder reintentarse en otro trabajador.
+TAREAS_BLOQUEO_SEGUNDOS = 300
+TAREAS_BACKOFF_BASE = 30
+TAREAS_BACKOFF_MAXIMO = 3600
+
+# Directorio de los archivos .jsonl.gz generados por archivar_historial.
+HISTORIAL_ARCHIVO_DIR = os.environ.get('HISTORIAL_ARCHIVO_DIR', os.path.join(BASE_DIR, 'archivo', 'historial'))
+
+# Pedidos por página en la consola de pedidos (paginación por cursor).
+ADMIN_PEDIDOS_POR_PAGINA = 50
+
+# Reseñas por página en la ficha del libro y en la cola de moderación; la
+# primera página de cada libro se sirve desde la caché.
+RESENAS_POR_PAGINA = 10
+RESENAS_MODERACION_POR_PAGINA = 50
+RESENAS_CACHE_SEGUNDOS = 600
+
+# Segundos que se recuerda un código de cupón inexistente o no válido.
+CUPONES_CACHE_INVALIDO_SEGUNDOS = 60
+
+# Caché HTTP de las páginas públicas para visitantes anónimos (ETag/Last-Modified
+# y Cache-Control). El navegador revalida siempre (304 si no ha cambiado nada);
+# un proxy inverso puede servir la copia CACHE_HTTP_S_MAXAGE segundos. Cambiar
+# CACHE_HTTP_REVISION al desplegar cambios de plantillas invalida todos los ETag.
+CACHE_HTTP_MAX_AGE = 0
+CACHE_HTTP_S_MAXAGE = 30
+CACHE_HTTP_REVISION = os.environ.get('CACHE_HTTP_REVISION', '1')
+
+# Días que se conservan los datos caducados antes de que los borre purgar_caducados:
+# carritos sin tocar, entregas digitales ya caducadas y sesiones vencidas.
+LIMPIEZA_RETENCION_DIAS = {
+    'carritos': 90,
+    'entregas': 30,
+    'sesiones': 0,
+}
+
+# Directorio local donde las editoriales dejan portadas y archivos para la importación del catálogo
+IMPORTACION_MEDIOS_DIR = os.environ.get('IMPORTACION_MEDIOS_DIR')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -0,0 +1,196 @@
+"""
+Configuración de producción para mysite.
+
+Se selecciona con la variable de entorno:
+
+    DJANGO_SETTINGS_MODULE=mysite.settings_production
+
+y necesita SECRET_KEY, ALLOWED_HOSTS y REDIS_URL en el entorno.
+
+Hereda todo de ``mysite.settings`` y solo sobrescribe lo que cambia al
+desplegar: DEBUG desactivado, plantillas compiladas en caché, conexiones
+persistentes, SQLite afinado (o PostgreSQL si se define POSTGRES_DB), un
+backend de caché real y estáticos con hash y precomprimidos (requiere
+``manage.py collectstatic``).
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, TEMPLATES
+
+
+def _env_bool(nombre, default=False):
+    valor = os.environ.get(nombre)
+    if valor is None:
+        return default
+    return valor.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_obligatoria(nombre):
+    valor = os.environ.get(nombre, '').strip()
+    if not valor:
+        raise ImproperlyConfigured(f'Define la variable de entorno {nombre} para usar settings_production.')
+    return valor
+
+
+DEBUG = _env_bool('DEBUG', False)
+
+# Todos los workers deben firmar con la misma clave: sin ella las sesiones,
+# las cookies firmadas y los enlaces de recuperación fallan según el worker.
+SECRET_KEY = _env_obligatoria('SECRET_KEY')
+
+ALLOWED_HOSTS = [h.strip() for h in _env_obligatoria('ALLOWED_HOSTS').split(',') if h.strip()]
+
+
+# Plantillas: el loader en caché compila cada plantilla una sola vez por proceso.
+# APP_DIRS debe ser False cuando se declaran los loaders explícitamente.
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+
+# Base de datos
+# PostgreSQL si se define POSTGRES_DB; en otro caso SQLite en modo WAL.
+
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 60))
+
+if os.environ.get('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Espera del driver de Python antes de lanzar "database is locked".
+                'timeout': 20,
+            },
+        }
+    }
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': os.environ['SQLITE_REPLICA_PATH'],
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# PRAGMAs aplicados a cada conexión SQLite nueva (ver app_tienda/db.py).
+# journal_mode=WAL es persistente en el archivo; el resto es por conexión.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
+
+# Estáticos: collectstatic genera nombres con hash y copias .gz (y .br si
+# está instalado el paquete brotli); EstaticosMiddleware los sirve con
+# Cache-Control immutable. Hay que ejecutar collectstatic en cada despliegue.
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'app_tienda.estaticos.AlmacenEstaticos'},
+}
+ESTATICOS_SERVIR = _env_bool('ESTATICOS_SERVIR', True)
+
+
+# Caché
+# Sesiones y contadores de rate limit tienen su propio alias: al llenarse, la
+# caché general descarta entradas al azar y no debe llevarse por delante una
+# sesión o un contador por hacer sitio a un fragmento de plantilla.
+# Esos dos alias exigen un Redis (REDIS_URL, requiere el paquete redis) con
+# maxmemory-policy noeviction: las sesiones difieren su escritura en base de
+# datos (app_tienda/sesiones.py) y no pueden perder entradas, y el rate limit
+# escribe en cada petición. No hay alternativa en archivos: FileBasedCache
+# recorre el directorio entero en cada set para decidir si purga y purga al
+# azar.
+# La caché general ('default') sí puede expulsar: Redis si se define
+# REDIS_CACHE_URL (p. ej. otra instancia con allkeys-lru); si no, caché en
+# archivos para que todos los workers del mismo host la compartan.
+
+CACHE_DIR = os.environ.get('CACHE_DIR', BASE_DIR / '.cache')
+REDIS_URL = _env_obligatoria('REDIS_URL')
+
+
+def _cache_redis(alias, url):
+    # El prefijo separa los alias que comparten instancia.
+    return {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': url,
+        'KEY_PREFIX': alias,
+        'TIMEOUT': 300,
+    }
+
+
+if os.environ.get('REDIS_CACHE_URL'):
+    _cache_general = _cache_redis('default', os.environ['REDIS_CACHE_URL'])
+else:
+    _cache_general = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRADAS', 10000)),
+        },
+    }
+
+CACHES = {
+    'default': _cache_general,
+    'sesiones': _cache_redis('sesiones', REDIS_URL),
+    'ratelimit': _cache_redis('ratelimit', REDIS_URL),
+}
+SESSION_CACHE_ALIAS = 'sesiones'
+RATELIMIT_CACHE = 'ratelimit'
+
+
+# Los contadores de rate limit se comparten entre workers a través de la caché.
+RATELIMIT_ALMACEN = os.environ.get('RATELIMIT_ALMACEN', 'cache')
+RATELIMIT_CONFIAR_PROXY = _env_bool('RATELIMIT_CONFIAR_PROXY', False)
+
+
+# Correo saliente por SMTP (lo envía el trabajador procesar_tareas, no la petición).
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = _env_bool('EMAIL_USE_TLS', False)
+EMAIL_TIMEOUT = 10